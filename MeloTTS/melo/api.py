@@ -13,7 +13,11 @@ import torch
 from . import utils
 from . import commons
 from .models import SynthesizerTrn
-from .split_utils import split_sentence
+from .split_utils import split_sentence, split_sentence_by_phones
+from . import split_utils
+from .text import cleaner
+from .stream_utils import write_stream
+from .speaker_cache import SpeakerEmbeddingCache, file_hash, tensor_hash
 from .mel_processing import spectrogram_torch, spectrogram_torch_conv
 from .download_utils import load_or_download_config, load_or_download_model
 
@@ -23,7 +27,9 @@ class TTS(nn.Module):
                 device='auto',
                 use_hf=True,
                 config_path=None,
-                ckpt_path=None):
+                ckpt_path=None,
+                speaker_cache_dir=None,
+                onnx_dir=None):
         super().__init__()
         if device == 'auto':
             device = 'cpu'
@@ -61,68 +67,221 @@ class TTS(nn.Module):
         
         language = language.split('_')[0]
         self.language = 'ZH_MIX_EN' if language == 'ZH' else language # we support a ZH_MIX_EN model
+        # text front-ends are imported lazily; load ours now rather than on the first request
+        cleaner.preload([self.language])
+        self.speaker_cache = SpeakerEmbeddingCache(cache_dir=speaker_cache_dir)
+        # graphs written by `melo.export_onnx`; when set, synthesis runs on onnxruntime (CPU)
+        self.onnx_backend = None
+        if onnx_dir is not None:
+            from .onnx_backend import OnnxSynthesizer
+            self.onnx_backend = OnnxSynthesizer(onnx_dir)
+        self._ref_enc_hash = None
 
     @staticmethod
     def audio_numpy_concat(segment_data_list, sr, speed=1.):
-        audio_segments = []
-        for segment_data in segment_data_list:
-            audio_segments += segment_data.reshape(-1).tolist()
-            audio_segments += [0] * int((sr * 0.05) / speed)
-        audio_segments = np.array(audio_segments).astype(np.float32)
+        # size the output once and copy segments in place; the silence gaps are the zeros left untouched
+        gap = int((sr * 0.05) / speed)
+        segments = [np.asarray(segment_data).reshape(-1) for segment_data in segment_data_list]
+        audio_segments = np.zeros(sum(len(seg) for seg in segments) + gap * len(segments), dtype=np.float32)
+        offset = 0
+        for seg in segments:
+            audio_segments[offset:offset + len(seg)] = seg
+            offset += len(seg) + gap
         return audio_segments
 
     @staticmethod
-    def split_sentences_into_pieces(text, language, quiet=False):
-        texts = split_sentence(text, language_str=language)
+    def split_sentences_into_pieces(text, language, quiet=False, phone_window=None):
+        """Split `text` for synthesis; with `phone_window=(min_phones, max_phones)` pieces are sized by phone count."""
+        if phone_window is not None:
+            texts, _ = split_sentence_by_phones(text, language_str=language, min_phones=phone_window[0], max_phones=phone_window[1])
+        else:
+            texts = split_sentence(text, language_str=language)
         if not quiet:
             print(" > Text split to sentences.")
             print('\n'.join(texts))
             print(" > ===========================")
         return texts
 
-    def tts_to_file(self, text, speaker_id, output_path=None, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0, pbar=None, format=None, position=None, quiet=False,):
+    @staticmethod
+    def length_buckets(lengths, batch_size):
+        """Group item indices into batches of similar length so padding stays small."""
+        return split_utils.length_buckets(lengths, batch_size)
+
+    def get_text_inputs(self, text):
         language = self.language
-        texts = self.split_sentences_into_pieces(text, language, quiet)
+        if language in ['EN', 'ZH_MIX_EN']:
+            text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
+        return utils.get_text_for_tts_infer(text, language, self.hps, self.device, self.symbol_to_id)
+
+    def get_text_inputs_batch(self, texts):
+        language = self.language
+        if language in ['EN', 'ZH_MIX_EN']:
+            texts = [re.sub(r'([a-z])([A-Z])', r'\1 \2', t) for t in texts]
+        return utils.get_text_for_tts_infer_batch(texts, language, self.hps, self.device, self.symbol_to_id)
+
+    def compute_speaker_embedding(self, ref_wav):
+        if not hasattr(self.model, 'ref_enc'):
+            raise ValueError('This checkpoint has no reference encoder (n_speakers > 0); voice cloning is not supported.')
+        hps = self.hps
+        wav, _ = librosa.load(ref_wav, sr=hps.data.sampling_rate, mono=True)
+        wav_tensor = torch.FloatTensor(wav).unsqueeze(0).to(self.device)
+        win_len = getattr(hps.data, 'win_length', hps.data.filter_length)
+        with torch.no_grad():
+            spec = spectrogram_torch(
+                wav_tensor,
+                hps.data.filter_length,
+                hps.data.sampling_rate,
+                hps.data.hop_length,
+                win_len,
+                center=False,
+            )
+            return self.model.ref_enc(spec.transpose(1, 2)).unsqueeze(-1)
+
+    def get_speaker_embedding(self, ref_wav):
+        """Cached `ref_enc` embedding for a reference wav, keyed by file content and encoder weights."""
+        if self._ref_enc_hash is None:
+            self._ref_enc_hash = tensor_hash(self.model.ref_enc.state_dict().values())[:16]
+        key = f'{self._ref_enc_hash}-{file_hash(ref_wav)}'
+        return self.speaker_cache.get_or_compute(key, lambda: self.compute_speaker_embedding(ref_wav), device=self.device)
+
+    def infer_batch(self, batch, speaker_id, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0, g=None, dec_chunk_frames=None):
+        """Run a single padded forward pass over several sentences.
+
+        Args:
+            batch: list of (bert, ja_bert, phones, tones, lang_ids) as returned by `get_text_inputs`.
+            g: optional speaker embedding [1, gin_channels, 1] used instead of `speaker_id`.
+            dec_chunk_frames: decode the waveform in chunks of this many latent frames to bound memory.
+
+        Returns:
+            List of float32 numpy arrays, one unpadded waveform per input sentence.
+        """
+        device = self.device
+        n = len(batch)
+        lengths = [phones.size(0) for _, _, phones, _, _ in batch]
+        max_len = max(lengths)
+        x_tst = torch.zeros(n, max_len, dtype=torch.long)
+        tones = torch.zeros(n, max_len, dtype=torch.long)
+        lang_ids = torch.zeros(n, max_len, dtype=torch.long)
+        bert = torch.zeros(n, batch[0][0].size(0), max_len)
+        ja_bert = torch.zeros(n, batch[0][1].size(0), max_len)
+        for i, (b, jb, p, t, l) in enumerate(batch):
+            x_tst[i, :lengths[i]] = p
+            tones[i, :lengths[i]] = t
+            lang_ids[i, :lengths[i]] = l
+            bert[i, :, :lengths[i]] = b
+            ja_bert[i, :, :lengths[i]] = jb
+        with torch.no_grad():
+            x_tst = x_tst.to(device)
+            tones = tones.to(device)
+            lang_ids = lang_ids.to(device)
+            bert = bert.to(device)
+            ja_bert = ja_bert.to(device)
+            x_tst_lengths = torch.LongTensor(lengths).to(device)
+            speakers = torch.LongTensor([speaker_id] * n).to(device)
+            if g is not None:
+                g = g.to(device).expand(n, -1, -1)
+            backend = self.onnx_backend if self.onnx_backend is not None else self.model
+            extra = {'dec_chunk_frames': dec_chunk_frames} if dec_chunk_frames and self.onnx_backend is None else {}
+            o, _, y_mask, _ = backend.infer(
+                    x_tst,
+                    x_tst_lengths,
+                    speakers,
+                    tones,
+                    lang_ids,
+                    bert,
+                    ja_bert,
+                    sdp_ratio=sdp_ratio,
+                    noise_scale=noise_scale,
+                    noise_scale_w=noise_scale_w,
+                    length_scale=1. / speed,
+                    g=g,
+                    **extra,
+                )
+            # the decoder upsamples every latent frame by hop_length samples
+            audio_lengths = (y_mask.sum([1, 2]).long() * self.hps.data.hop_length).tolist()
+            audio = o[:, 0].data.cpu().float().numpy()
+            del x_tst, tones, lang_ids, bert, ja_bert, x_tst_lengths, speakers, o, y_mask
+        return [audio[i, :audio_lengths[i]] for i in range(n)]
+
+    def tts_stream(self, text, speaker_id, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0, quiet=True, ref_wav=None, g=None, chunk_frames=None, phone_window=None):
+        """Synthesize `text` sentence by sentence, yielding float32 PCM as soon as each sentence is done.
+
+        Every chunk is followed by the same 50 ms of silence `tts_to_file` inserts between sentences,
+        so concatenating the chunks gives the same layout as the non-streaming output.
+        `ref_wav` (a reference recording) or `g` (a precomputed embedding) clone a voice instead of `speaker_id`.
+        With `chunk_frames` the vocoder output of each sentence is yielded every `chunk_frames` latent
+        frames instead of once per sentence (not available with the ONNX backend).
+        `phone_window` splits the text as in `tts_to_file`.
+        """
+        if ref_wav is not None and g is None:
+            g = self.get_speaker_embedding(ref_wav)
+        texts = self.split_sentences_into_pieces(text, self.language, quiet, phone_window=phone_window)
+        silence = np.zeros(int((self.hps.data.sampling_rate * 0.05) / speed), dtype=np.float32)
+        for t in texts:
+            if chunk_frames and self.onnx_backend is None:
+                yield from self._stream_sentence(t, speaker_id, chunk_frames, g=g, sdp_ratio=sdp_ratio, noise_scale=noise_scale, noise_scale_w=noise_scale_w, length_scale=1. / speed)
+                yield silence
+                continue
+            audio = self.infer_batch([self.get_text_inputs(t)], speaker_id, sdp_ratio=sdp_ratio, noise_scale=noise_scale, noise_scale_w=noise_scale_w, speed=speed, g=g)[0]
+            yield np.concatenate([audio.reshape(-1).astype(np.float32), silence])
+
+    def _stream_sentence(self, text, speaker_id, chunk_frames, g=None, **kwargs):
+        device = self.device
+        bert, ja_bert, phones, tones, lang_ids = self.get_text_inputs(text)
+        if g is not None:
+            g = g.to(device)
+        chunks = self.model.infer_stream(
+            phones.to(device).unsqueeze(0),
+            torch.LongTensor([phones.size(0)]).to(device),
+            torch.LongTensor([speaker_id]).to(device),
+            tones.to(device).unsqueeze(0),
+            lang_ids.to(device).unsqueeze(0),
+            bert.to(device).unsqueeze(0),
+            ja_bert.to(device).unsqueeze(0),
+            chunk_frames=chunk_frames,
+            g=g,
+            **kwargs,
+        )
+        for audio in chunks:
+            yield audio[0, 0].cpu().float().numpy()
+
+    def tts_to_stream(self, text, speaker_id, output, format='wav', **kwargs):
+        """Write `tts_stream` output to a path or binary file object chunk by chunk (`format` is 'wav' or 'raw')."""
+        return write_stream(self.tts_stream(text, speaker_id, **kwargs), output, self.hps.data.sampling_rate, format=format)
+
+    def tts_to_file(self, text, speaker_id, output_path=None, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0, pbar=None, format=None, position=None, quiet=False, batch_size=1, ref_wav=None, g=None, phone_window=None):
+        language = self.language
+        if ref_wav is not None and g is None:
+            g = self.get_speaker_embedding(ref_wav)
+        texts = self.split_sentences_into_pieces(text, language, quiet, phone_window=phone_window)
         audio_list = []
-        if pbar:
-            tx = pbar(texts)
-        else:
+
+        def progress(items):
+            if pbar:
+                return pbar(items)
             if position:
-                tx = tqdm(texts, position=position)
-            elif quiet:
-                tx = texts
-            else:
-                tx = tqdm(texts)
-        for t in tx:
-            if language in ['EN', 'ZH_MIX_EN']:
-                t = re.sub(r'([a-z])([A-Z])', r'\1 \2', t)
-            device = self.device
-            bert, ja_bert, phones, tones, lang_ids = utils.get_text_for_tts_infer(t, language, self.hps, device, self.symbol_to_id)
-            with torch.no_grad():
-                x_tst = phones.to(device).unsqueeze(0)
-                tones = tones.to(device).unsqueeze(0)
-                lang_ids = lang_ids.to(device).unsqueeze(0)
-                bert = bert.to(device).unsqueeze(0)
-                ja_bert = ja_bert.to(device).unsqueeze(0)
-                x_tst_lengths = torch.LongTensor([phones.size(0)]).to(device)
-                del phones
-                speakers = torch.LongTensor([speaker_id]).to(device)
-                audio = self.model.infer(
-                        x_tst,
-                        x_tst_lengths,
-                        speakers,
-                        tones,
-                        lang_ids,
-                        bert,
-                        ja_bert,
-                        sdp_ratio=sdp_ratio,
-                        noise_scale=noise_scale,
-                        noise_scale_w=noise_scale_w,
-                        length_scale=1. / speed,
-                    )[0][0, 0].data.cpu().float().numpy()
-                del x_tst, tones, lang_ids, bert, ja_bert, x_tst_lengths, speakers
-                # 
-            audio_list.append(audio)
+                return tqdm(items, position=position)
+            if quiet:
+                return items
+            return tqdm(items)
+
+        if batch_size > 1:
+            # batched path: run the text front-end (with batched BERT) for every sentence
+            # first, then call `infer` once per bucket of similar-length sentences; progress
+            # is reported per bucket as it is synthesized
+            inputs = []
+            for i in range(0, len(texts), batch_size):
+                inputs += self.get_text_inputs_batch(texts[i:i + batch_size])
+            audio_list = [None] * len(inputs)
+            lengths = [phones.size(0) for _, _, phones, _, _ in inputs]
+            for bucket in progress(self.length_buckets(lengths, batch_size)):
+                audios = self.infer_batch([inputs[i] for i in bucket], speaker_id, sdp_ratio=sdp_ratio, noise_scale=noise_scale, noise_scale_w=noise_scale_w, speed=speed, g=g)
+                for i, audio in zip(bucket, audios):
+                    audio_list[i] = audio
+        else:
+            for t in progress(texts):
+                audio = self.infer_batch([self.get_text_inputs(t)], speaker_id, sdp_ratio=sdp_ratio, noise_scale=noise_scale, noise_scale_w=noise_scale_w, speed=speed, g=g)[0]
+                audio_list.append(audio)
         torch.cuda.empty_cache()
         audio = self.audio_numpy_concat(audio_list, sr=self.hps.data.sampling_rate, speed=speed)
 
@@ -0,0 +1,43 @@
+# Time text-encoder self-attention with and without the cached relative-position gathers:
+#
+#   python -m melo.attention_benchmark
+import time
+
+import click
+import torch
+
+from .attentions import MultiHeadAttention
+
+
+def run(attn, x, mask, repeats):
+    with torch.no_grad():
+        attn(x, x, mask)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            attn(x, x, mask)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+@click.command()
+@click.option('--lengths', default='16,32,64,128,256', help='Comma separated phone sequence lengths')
+@click.option('--batch-size', '-b', default=1)
+@click.option('--repeats', default=50)
+@click.option('--threads', default=None, type=int)
+def main(lengths, batch_size, repeats, threads):
+    if threads:
+        torch.set_num_threads(threads)
+    # shape of the MeloTTS text encoder layers
+    attn = MultiHeadAttention(192, 192, 2, window_size=4).eval()
+    print(f'{"length":>6} {"reference ms":>13} {"cached ms":>10} {"speedup":>8}')
+    for length in [int(i) for i in lengths.split(',')]:
+        x = torch.randn(batch_size, 192, length)
+        mask = torch.ones(batch_size, 1, length, length)
+        attn.use_cached_relative = False
+        ref = run(attn, x, mask, repeats)
+        attn.use_cached_relative = True
+        fused = run(attn, x, mask, repeats)
+        print(f'{length:>6} {ref:>13.3f} {fused:>10.3f} {ref / fused:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# (length, window_size, device) -> gather indices for the windowed relative attention
+_relative_index_cache = {}
+
 
 class LayerNorm(nn.Module):
     def __init__(self, channels, eps=1e-5):
@@ -202,6 +205,9 @@ class Decoder(nn.Module):
 
 
 class MultiHeadAttention(nn.Module):
+    # in eval mode, replace the pad/reshape relative<->absolute transforms with cached gathers
+    use_cached_relative = True
+
     def __init__(
         self,
         channels,
@@ -277,12 +283,17 @@ class MultiHeadAttention(nn.Module):
             assert (
                 t_s == t_t
             ), "Relative attention is only available for self-attention."
-            key_relative_embeddings = self._get_relative_embeddings(self.emb_rel_k, t_s)
-            rel_logits = self._matmul_with_relative_keys(
-                query / math.sqrt(self.k_channels), key_relative_embeddings
-            )
-            scores_local = self._relative_position_to_absolute_position(rel_logits)
-            scores = scores + scores_local
+            if self._fused_relative():
+                scores = scores + self._relative_scores_fused(
+                    query / math.sqrt(self.k_channels)
+                )
+            else:
+                key_relative_embeddings = self._get_relative_embeddings(self.emb_rel_k, t_s)
+                rel_logits = self._matmul_with_relative_keys(
+                    query / math.sqrt(self.k_channels), key_relative_embeddings
+                )
+                scores_local = self._relative_position_to_absolute_position(rel_logits)
+                scores = scores + scores_local
         if self.proximal_bias:
             assert t_s == t_t, "Proximal bias is only available for self-attention."
             scores = scores + self._attention_bias_proximal(t_s).to(
@@ -303,7 +314,9 @@ class MultiHeadAttention(nn.Module):
         p_attn = F.softmax(scores, dim=-1)  # [b, n_h, t_t, t_s]
         p_attn = self.drop(p_attn)
         output = torch.matmul(p_attn, value)
-        if self.window_size is not None:
+        if self.window_size is not None and self._fused_relative():
+            output = output + self._relative_values_fused(p_attn)
+        elif self.window_size is not None:
             relative_weights = self._absolute_position_to_relative_position(p_attn)
             value_relative_embeddings = self._get_relative_embeddings(
                 self.emb_rel_v, t_s
@@ -316,6 +329,60 @@ class MultiHeadAttention(nn.Module):
         )  # [b, n_h, t_t, d_k] -> [b, d, t_t]
         return output, p_attn
 
+    def _fused_relative(self):
+        # traced graphs (ONNX export) must not bake in indices for the example length
+        return (
+            self.use_cached_relative
+            and not self.training
+            and not torch.jit.is_tracing()
+            and not torch.jit.is_scripting()
+        )
+
+    def _relative_indices(self, length, device):
+        """Gather indices between [l, l] attention and the [l, 2*window+1] relative window.
+
+        key_index[i, j] is the window column of offset j - i and value_index[i, r] the key
+        position at window column r; the masks drop offsets outside the window or sequence,
+        which the padded embeddings of the reference path make zero.
+        """
+        cache_key = (length, self.window_size, device)
+        if cache_key not in _relative_index_cache:
+            if len(_relative_index_cache) > 1024:
+                _relative_index_cache.clear()
+            window = self.window_size
+            pos = torch.arange(length, device=device)
+            offset = pos.unsqueeze(0) - pos.unsqueeze(1)
+            key_index = (offset + window).clamp(0, 2 * window)
+            key_mask = offset.abs() <= window
+            value_index = pos.unsqueeze(1) + torch.arange(2 * window + 1, device=device) - window
+            value_mask = (value_index >= 0) & (value_index < length)
+            value_index = value_index.clamp(0, length - 1)
+            _relative_index_cache[cache_key] = (key_index, key_mask, value_index, value_mask)
+        return _relative_index_cache[cache_key]
+
+    def _relative_scores_fused(self, query):
+        """
+        query: [b, h, l, d], already scaled
+        ret: [b, h, l, l], same as `_relative_position_to_absolute_position` of the relative logits
+        """
+        b, h, length, _ = query.size()
+        key_index, key_mask, _, _ = self._relative_indices(length, query.device)
+        # logits against the 2*window+1 embeddings only, instead of 2*l-1 zero-padded ones
+        rel_logits = self._matmul_with_relative_keys(query, self.emb_rel_k)
+        scores_local = rel_logits.gather(-1, key_index.expand(b, h, length, length))
+        return scores_local.masked_fill(~key_mask, 0)
+
+    def _relative_values_fused(self, p_attn):
+        """
+        p_attn: [b, h, l, l]
+        ret: [b, h, l, d], same as the relative-value term of the reference path
+        """
+        b, h, length, _ = p_attn.size()
+        _, _, value_index, value_mask = self._relative_indices(length, p_attn.device)
+        band = p_attn.gather(-1, value_index.expand(b, h, length, value_index.size(-1)))
+        band = band.masked_fill(~value_mask, 0)
+        return self._matmul_with_relative_values(band, self.emb_rel_v)
+
     def _matmul_with_relative_values(self, x, y):
         """
         x: [b, h, l, m]
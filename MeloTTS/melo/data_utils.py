@@ -1,5 +1,8 @@
 import os
+import json
 import random
+import hashlib
+import multiprocessing
 import torch
 import torch.utils.data
 from tqdm import tqdm
@@ -13,6 +16,44 @@ import numpy as np
 
 """Multi speaker version"""
 
+# bump when the spectrogram computation changes in a way the cache parameters don't capture
+SPEC_CACHE_VERSION = 1
+
+# layout written by pack_dataset.py; one int64 row per utterance in index.npy
+PACK_FORMAT_VERSION = 1
+PACK_INDEX_FIELDS = (
+    "shard",
+    "audio_offset",
+    "audio_len",
+    "spec_offset",
+    "spec_frames",
+    "bert_offset",
+    "bert_kind",
+    "text_offset",
+    "text_len",
+    "sid",
+)
+
+
+def spec_params(hparams):
+    """Everything a spectrogram computed for `hparams` (a config's data section) depends on besides the wav."""
+    use_mel = getattr(hparams, "use_mel_posterior_encoder", False)
+    params = {
+        "version": SPEC_CACHE_VERSION,
+        "mel": use_mel,
+        "sampling_rate": hparams.sampling_rate,
+        "filter_length": hparams.filter_length,
+        "hop_length": hparams.hop_length,
+        "win_length": hparams.win_length,
+    }
+    if use_mel:
+        params.update(
+            n_mel_channels=getattr(hparams, "n_mel_channels", 80),
+            mel_fmin=hparams.mel_fmin,
+            mel_fmax=hparams.mel_fmax,
+        )
+    return params
+
 
 class TextAudioSpeakerLoader(torch.utils.data.Dataset):
     """
@@ -44,6 +85,7 @@ class TextAudioSpeakerLoader(torch.utils.data.Dataset):
         self.add_blank = hparams.add_blank
         self.min_text_len = getattr(hparams, "min_text_len", 1)
         self.max_text_len = getattr(hparams, "max_text_len", 300)
+        self._spec_cache_tag = None
 
         random.seed(1234)
         random.shuffle(self.audiopaths_sid_text)
@@ -115,37 +157,100 @@ class TextAudioSpeakerLoader(torch.utils.data.Dataset):
         # NOTE: normalize has been achieved by torchaudio
         # audio_norm = audio / self.max_wav_value
         audio_norm = audio_norm.unsqueeze(0)
-        spec_filename = filename.replace(".wav", ".spec.pt")
-        if self.use_mel_spec_posterior:
-            spec_filename = spec_filename.replace(".spec.pt", ".mel.pt")
+        spec_filename = self.spec_cache_path(filename)
+        spec = self.load_cached_spec(filename, spec_filename)
+        if spec is None:
+            spec = self.compute_spec(audio_norm)
+            self.save_cached_spec(filename, spec_filename, spec)
+        return spec, audio_norm
+
+    def spec_cache_params(self):
+        """Everything the cached spectrogram depends on besides the wav itself."""
+        return spec_params(self.hparams)
+
+    def spec_cache_path(self, filename):
+        # the parameter hash is part of the name so runs with different STFT settings never clobber each other
+        if self._spec_cache_tag is None:
+            payload = json.dumps(self.spec_cache_params(), sort_keys=True)
+            self._spec_cache_tag = hashlib.sha1(payload.encode()).hexdigest()[:8]
+        suffix = ".mel" if self.use_mel_spec_posterior else ".spec"
+        return f"{os.path.splitext(filename)[0]}{suffix}.{self._spec_cache_tag}.pt"
+
+    def load_cached_spec(self, filename, spec_filename):
+        """Return the cached spectrogram, or None if it is missing or stale."""
+        if not os.path.exists(spec_filename):
+            return None
         try:
-            spec = torch.load(spec_filename)
-            assert False
-        except:
-            if self.use_mel_spec_posterior:
-                spec = mel_spectrogram_torch(
-                    audio_norm,
-                    self.filter_length,
-                    self.n_mel_channels,
-                    self.sampling_rate,
-                    self.hop_length,
-                    self.win_length,
-                    self.hparams.mel_fmin,
-                    self.hparams.mel_fmax,
-                    center=False,
-                )
-            else:
-                spec = spectrogram_torch(
-                    audio_norm,
-                    self.filter_length,
-                    self.sampling_rate,
-                    self.hop_length,
-                    self.win_length,
-                    center=False,
+            cached = torch.load(spec_filename, map_location="cpu")
+        except Exception as e:
+            logger.warning(f"Unreadable spectrogram cache {spec_filename}: {e}")
+            return None
+        if (
+            not isinstance(cached, dict)
+            or cached.get("params") != self.spec_cache_params()
+            or cached.get("wav_mtime") != os.path.getmtime(filename)
+        ):
+            return None
+        return cached["spec"]
+
+    def save_cached_spec(self, filename, spec_filename, spec):
+        cached = {
+            "params": self.spec_cache_params(),
+            "wav_mtime": os.path.getmtime(filename),
+            "spec": spec,
+        }
+        # DataLoader workers may race on the same file; publish it atomically
+        tmp_filename = f"{spec_filename}.{os.getpid()}.tmp"
+        try:
+            torch.save(cached, tmp_filename)
+            os.replace(tmp_filename, spec_filename)
+        except OSError as e:
+            logger.warning(f"Could not write spectrogram cache {spec_filename}: {e}")
+
+    def compute_spec(self, audio_norm):
+        if self.use_mel_spec_posterior:
+            spec = mel_spectrogram_torch(
+                audio_norm,
+                self.filter_length,
+                self.n_mel_channels,
+                self.sampling_rate,
+                self.hop_length,
+                self.win_length,
+                self.hparams.mel_fmin,
+                self.hparams.mel_fmax,
+                center=False,
+            )
+        else:
+            spec = spectrogram_torch(
+                audio_norm,
+                self.filter_length,
+                self.sampling_rate,
+                self.hop_length,
+                self.win_length,
+                center=False,
+            )
+        return torch.squeeze(spec, 0)
+
+    def precompute_specs(self, num_workers=None):
+        """Fill the spectrogram cache for every utterance in the filelist.
+
+        Runs in a process pool so a fresh dataset doesn't pay for the STFTs in the first epoch.
+        Returns the number of spectrograms that had to be computed.
+        """
+        filenames = [item[0] for item in self.audiopaths_sid_text]
+        num_workers = num_workers or os.cpu_count() or 1
+        logger.info(f"Precomputing spectrograms with {num_workers} workers...")
+        if num_workers <= 1:
+            _init_spec_worker(self)
+            computed = [_precompute_spec(f) for f in tqdm(filenames)]
+        else:
+            # the dataset is handed to each worker once instead of being pickled with every task
+            with multiprocessing.Pool(num_workers, initializer=_init_spec_worker, initargs=(self,)) as pool:
+                computed = list(
+                    tqdm(pool.imap(_precompute_spec, filenames, chunksize=16), total=len(filenames))
                 )
-            spec = torch.squeeze(spec, 0)
-            torch.save(spec, spec_filename)
-        return spec, audio_norm
+        logger.info(f"computed: {sum(computed)}, cached: {len(computed) - sum(computed)}")
+        return sum(computed)
 
     def get_text(self, text, word2ph, phone, tone, language_str, wav_path):
         phone, tone, language = cleaned_text_to_sequence(phone, tone, language_str)
@@ -197,6 +302,132 @@ class TextAudioSpeakerLoader(torch.utils.data.Dataset):
         return len(self.audiopaths_sid_text)
 
 
+class PackedTextAudioSpeakerLoader(torch.utils.data.Dataset):
+    """
+    Reads utterances packed by pack_dataset.py.
+
+    Every shard holds flat `audio`, `spec`, `bert` and `text` files which are memory-mapped on
+    first access in each worker, so items are views into the page cache rather than per-file
+    loads. `lengths` are the true spectrogram frame counts, for DistributedBucketSampler.
+    Returns the same tuples as TextAudioSpeakerLoader. The pack must have been written with the
+    spectrogram parameters of `hparams`.
+    """
+
+    def __init__(self, pack_dir, hparams):
+        self.pack_dir = pack_dir
+        with open(os.path.join(pack_dir, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != PACK_FORMAT_VERSION:
+            raise ValueError(
+                "{} was packed with format version {}, expected {}".format(
+                    pack_dir, self.meta["version"], PACK_FORMAT_VERSION
+                )
+            )
+        if self.meta["spec_params"] != spec_params(hparams):
+            raise ValueError(
+                "{} was packed with spectrogram parameters {}, the config needs {}".format(
+                    pack_dir, self.meta["spec_params"], spec_params(hparams)
+                )
+            )
+        self.index = np.load(os.path.join(pack_dir, "index.npy"))
+        self.fields = {name: i for i, name in enumerate(self.meta["fields"])}
+        self.spec_channels = self.meta["spec_channels"]
+        self.bert_dtype = np.dtype(self.meta["bert_dtype"])
+        # packs written before bert_dims was recorded hold the widths of the published BERT models
+        self.bert_dim, self.ja_bert_dim = self.meta.get("bert_dims") or (1024, 768)
+        self.lengths = self.index[:, self.fields["spec_frames"]].tolist()
+        self._shards = {}
+        logger.info(f"Packed dataset {pack_dir}: {len(self.index)} utterances, {self.meta['num_shards']} shards")
+
+    def _open(self, shard, name, dtype):
+        path = os.path.join(self.pack_dir, f"shard_{shard:05d}", f"{name}.bin")
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        # copy-on-write so torch.from_numpy gets a writable view without touching the file
+        return np.memmap(path, dtype=dtype, mode="c")
+
+    def _shard(self, shard):
+        if shard not in self._shards:
+            self._shards[shard] = {
+                "audio": self._open(shard, "audio", np.float32),
+                "spec": self._open(shard, "spec", np.float32),
+                "bert": self._open(shard, "bert", self.bert_dtype),
+                "text": self._open(shard, "text", np.int16),
+            }
+        return self._shards[shard]
+
+    def _field(self, row, name):
+        return int(row[self.fields[name]])
+
+    def __getitem__(self, index):
+        row = self.index[index]
+        arrays = self._shard(self._field(row, "shard"))
+
+        offset, length = self._field(row, "audio_offset"), self._field(row, "audio_len")
+        wav = torch.from_numpy(arrays["audio"][offset : offset + length]).unsqueeze(0)
+
+        offset, frames = self._field(row, "spec_offset"), self._field(row, "spec_frames")
+        spec = torch.from_numpy(
+            arrays["spec"][offset : offset + self.spec_channels * frames].reshape(self.spec_channels, frames)
+        )
+
+        offset, text_len = self._field(row, "text_offset"), self._field(row, "text_len")
+        text = torch.from_numpy(
+            arrays["text"][offset : offset + 3 * text_len].reshape(3, text_len).astype(np.int64)
+        )
+        phones, tone, language = text[0], text[1], text[2]
+
+        bert = torch.zeros(self.bert_dim, text_len)
+        ja_bert = torch.zeros(self.ja_bert_dim, text_len)
+        bert_kind = self._field(row, "bert_kind")
+        if bert_kind:
+            dim = self.bert_dim if bert_kind == 1 else self.ja_bert_dim
+            offset = self._field(row, "bert_offset")
+            feature = torch.from_numpy(
+                arrays["bert"][offset : offset + dim * text_len].reshape(dim, text_len)
+            ).float()
+            if bert_kind == 1:
+                bert = feature
+            else:
+                ja_bert = feature
+
+        sid = torch.LongTensor([self._field(row, "sid")])
+        return (phones, spec, wav, sid, tone, language, bert, ja_bert)
+
+    def __getstate__(self):
+        # memory maps are reopened in each DataLoader worker
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+    def __len__(self):
+        return len(self.index)
+
+
+def build_dataset(path, hparams):
+    """A packed dataset if `path` is a directory written by pack_dataset.py, else a filelist."""
+    if os.path.isdir(path):
+        return PackedTextAudioSpeakerLoader(path, hparams)
+    return TextAudioSpeakerLoader(path, hparams)
+
+
+_spec_worker_dataset = None
+
+
+def _init_spec_worker(dataset):
+    global _spec_worker_dataset
+    _spec_worker_dataset = dataset
+    torch.set_num_threads(1)
+
+
+def _precompute_spec(filename):
+    dataset = _spec_worker_dataset
+    if dataset.load_cached_spec(filename, dataset.spec_cache_path(filename)) is not None:
+        return False
+    dataset.get_audio(filename)
+    return True
+
+
 class TextAudioSpeakerCollate:
     """Zero-pads model inputs and targets"""
 
@@ -0,0 +1,152 @@
+import os
+import json
+import click
+import numpy as np
+import torch
+from torch import nn
+from torch.nn.utils import remove_weight_norm
+
+
+def fold_weight_norm(model):
+    """Bake every weight-normed layer (decoder, WN, resblocks, ref_enc) into a plain weight."""
+    for module in model.modules():
+        if hasattr(module, 'weight_g'):
+            remove_weight_norm(module)
+    return model
+
+
+class EncoderStage(nn.Module):
+    """Text encoder plus the sdp/dp duration mix of `SynthesizerTrn.infer`.
+
+    The stochastic duration predictor's noise is an explicit input (`noise_w`, [b, 2, t], passed
+    through `StochasticDurationPredictor`'s `noise` argument) so the graph is deterministic and
+    can be checked against eager execution.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x, x_lengths, tone, language, bert, ja_bert, g, noise_w, noise_scale_w, sdp_ratio, length_scale):
+        model = self.model
+        g_p = None if model.use_vc else g
+        x, m_p, logs_p, x_mask = model.enc_p(x, x_lengths, tone, language, bert, ja_bert, g=g_p)
+
+        logw_sdp = model.sdp(x, x_mask, g=g, reverse=True, noise_scale=noise_scale_w, noise=noise_w)
+        logw = logw_sdp * sdp_ratio + model.dp(x, x_mask, g=g) * (1 - sdp_ratio)
+        w_ceil = torch.ceil(torch.exp(logw) * x_mask * length_scale)
+        return m_p, logs_p, x_mask, w_ceil
+
+
+class DecoderStage(nn.Module):
+    """Reverse flow followed by the HiFi-GAN generator."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, z_p, y_mask, g):
+        z = self.model.flow(z_p, y_mask, g=g, reverse=True)
+        return self.model.dec(z * y_mask, g=g)
+
+
+def expand_prior(m_p, logs_p, w_ceil):
+    """Numpy equivalent of `commons.generate_path` + the prior expansion in `SynthesizerTrn.infer`.
+
+    Returns m_p, logs_p repeated to frame level, padded to the longest item, and y_mask.
+    """
+    durations = w_ceil[:, 0].astype(np.int64)
+    y_lengths = np.maximum(durations.sum(-1), 1)
+    b, d, _ = m_p.shape
+    t_y = int(y_lengths.max())
+    m_out = np.zeros((b, d, t_y), dtype=m_p.dtype)
+    logs_out = np.zeros((b, d, t_y), dtype=logs_p.dtype)
+    y_mask = np.zeros((b, 1, t_y), dtype=m_p.dtype)
+    for i in range(b):
+        m = np.repeat(m_p[i], durations[i], axis=-1)
+        logs = np.repeat(logs_p[i], durations[i], axis=-1)
+        m_out[i, :, :m.shape[-1]] = m
+        logs_out[i, :, :logs.shape[-1]] = logs
+        y_mask[i, :, :y_lengths[i]] = 1
+    return m_out, logs_out, y_mask
+
+
+def dummy_inputs(model, t=20):
+    hidden = model.gin_channels
+    return (
+        torch.randint(1, model.n_vocab, (1, t)),
+        torch.LongTensor([t]),
+        torch.zeros(1, t, dtype=torch.long),
+        torch.zeros(1, t, dtype=torch.long),
+        torch.randn(1, 1024, t),
+        torch.randn(1, 768, t),
+        torch.randn(1, hidden, 1),
+        torch.randn(1, 2, t),
+        torch.FloatTensor([0.8]),
+        torch.FloatTensor([0.2]),
+        torch.FloatTensor([1.0]),
+    )
+
+
+def export(model, output_dir, opset=15):
+    """Fold weight norm and write encoder.onnx, decoder.onnx and the speaker table to `output_dir`."""
+    os.makedirs(output_dir, exist_ok=True)
+    model = fold_weight_norm(model.cpu().eval())
+    encoder, decoder = EncoderStage(model).eval(), DecoderStage(model).eval()
+
+    enc_inputs = dummy_inputs(model)
+    with torch.no_grad():
+        torch.onnx.export(
+            encoder,
+            enc_inputs,
+            os.path.join(output_dir, 'encoder.onnx'),
+            input_names=['x', 'x_lengths', 'tone', 'language', 'bert', 'ja_bert', 'g', 'noise_w',
+                         'noise_scale_w', 'sdp_ratio', 'length_scale'],
+            output_names=['m_p', 'logs_p', 'x_mask', 'w_ceil'],
+            dynamic_axes={
+                'x': {0: 'batch', 1: 'phones'}, 'x_lengths': {0: 'batch'},
+                'tone': {0: 'batch', 1: 'phones'}, 'language': {0: 'batch', 1: 'phones'},
+                'bert': {0: 'batch', 2: 'phones'}, 'ja_bert': {0: 'batch', 2: 'phones'},
+                'g': {0: 'batch'}, 'noise_w': {0: 'batch', 2: 'phones'},
+                'm_p': {0: 'batch', 2: 'phones'}, 'logs_p': {0: 'batch', 2: 'phones'},
+                'x_mask': {0: 'batch', 2: 'phones'}, 'w_ceil': {0: 'batch', 2: 'phones'},
+            },
+            opset_version=opset,
+        )
+        m_p, logs_p, _, w_ceil = encoder(*enc_inputs)
+        m_p, logs_p, y_mask = expand_prior(m_p.numpy(), logs_p.numpy(), w_ceil.numpy())
+        torch.onnx.export(
+            decoder,
+            (torch.from_numpy(m_p), torch.from_numpy(y_mask), enc_inputs[6]),
+            os.path.join(output_dir, 'decoder.onnx'),
+            input_names=['z_p', 'y_mask', 'g'],
+            output_names=['audio'],
+            dynamic_axes={
+                'z_p': {0: 'batch', 2: 'frames'}, 'y_mask': {0: 'batch', 2: 'frames'},
+                'g': {0: 'batch'}, 'audio': {0: 'batch', 2: 'samples'},
+            },
+            opset_version=opset,
+        )
+    if model.n_speakers > 0:
+        np.save(os.path.join(output_dir, 'speakers.npy'), model.emb_g.weight.detach().numpy())
+    with open(os.path.join(output_dir, 'export.json'), 'w') as f:
+        json.dump({'opset': opset, 'gin_channels': model.gin_channels, 'n_speakers': model.n_speakers}, f)
+    return output_dir
+
+
+@click.command()
+@click.option('--ckpt_path', '-m', type=str, default=None, help="Path to the checkpoint file, defaults to the published model for --language")
+@click.option('--language', '-l', type=str, default="EN", help="Language of the model")
+@click.option('--output_dir', '-o', type=str, default="onnx_export", help="Directory for the exported graphs")
+@click.option('--opset', type=int, default=15)
+def main(ckpt_path, language, output_dir, opset):
+    from melo.api import TTS
+
+    config_path = os.path.join(os.path.dirname(ckpt_path), 'config.json') if ckpt_path else None
+    tts = TTS(language=language, device='cpu', config_path=config_path, ckpt_path=ckpt_path)
+    export(tts.model, output_dir, opset=opset)
+    print(f'Exported to {output_dir}. Load with TTS(language={language!r}, onnx_dir={output_dir!r}).')
+
+
+if __name__ == "__main__":
+    main()
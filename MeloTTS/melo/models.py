@@ -203,7 +203,8 @@ class StochasticDurationPredictor(nn.Module):
         if gin_channels != 0:
             self.cond = nn.Conv1d(gin_channels, filter_channels, 1)
 
-    def forward(self, x, x_mask, w=None, g=None, reverse=False, noise_scale=1.0):
+    def forward(self, x, x_mask, w=None, g=None, reverse=False, noise_scale=1.0, noise=None):
+        # `noise` ([b, 2, t]) replaces the sampled prior noise when reverse=True, e.g. for export
         x = torch.detach(x)
         x = self.pre(x)
         if g is not None:
@@ -254,10 +255,9 @@ class StochasticDurationPredictor(nn.Module):
         else:
             flows = list(reversed(self.flows))
             flows = flows[:-2] + [flows[-1]]  # remove a useless vflow
-            z = (
-                torch.randn(x.size(0), 2, x.size(2)).to(device=x.device, dtype=x.dtype)
-                * noise_scale
-            )
+            if noise is None:
+                noise = torch.randn(x.size(0), 2, x.size(2)).to(device=x.device, dtype=x.dtype)
+            z = noise * noise_scale
             for flow in flows:
                 z = flow(z, x_mask, g=x, reverse=reverse)
             z0, z1 = torch.split(z, [1, 1], 1)
@@ -515,6 +515,64 @@ class Generator(torch.nn.Module):
 
         if gin_channels != 0:
             self.cond = nn.Conv1d(gin_channels, upsample_initial_channel, 1)
+        self.upsample_factor = math.prod(upsample_rates)
+
+    def receptive_field(self):
+        """Latent frames on each side that can influence an output sample."""
+
+        def context(module):
+            return sum(
+                (m.kernel_size[0] - 1) * m.dilation[0] / 2
+                for m in module.modules()
+                if isinstance(m, nn.Conv1d)
+            )
+
+        frames = context(self.conv_pre)
+        scale = 1
+        for i, up in enumerate(self.ups):
+            frames += up.kernel_size[0] / up.stride[0] / 2 / scale
+            scale *= up.stride[0]
+            frames += max(
+                context(self.resblocks[i * self.num_kernels + j])
+                for j in range(self.num_kernels)
+            ) / scale
+        frames += context(self.conv_post) / scale
+        return math.ceil(frames)
+
+    def iter_chunks(self, x, g=None, chunk_frames=64, context_frames=None, overlap_frames=2):
+        """Decode `x` [b, c, t] in pieces of `chunk_frames` latent frames, yielding audio in order.
+
+        Each piece is decoded with `context_frames` (default: the receptive field) of extra
+        latent on both sides, which is dropped again, and consecutive pieces share
+        `overlap_frames` frames that are linearly cross-faded. Peak memory depends on
+        `chunk_frames` rather than on the length of `x`.
+        """
+        assert overlap_frames < chunk_frames
+        if context_frames is None:
+            context_frames = self.receptive_field()
+        hop = self.upsample_factor
+        length = x.size(2)
+        tail = None
+        for start in range(0, length, chunk_frames):
+            end = min(start + chunk_frames, length)
+            end_ext = min(end + overlap_frames, length)
+            lo = max(start - context_frames, 0)
+            hi = min(end_ext + context_frames, length)
+            audio = self(x[:, :, lo:hi], g=g)[:, :, (start - lo) * hop : (end_ext - lo) * hop]
+            if tail is not None:
+                n = tail.size(-1)
+                fade = torch.linspace(0, 1, n, device=audio.device, dtype=audio.dtype)
+                audio = torch.cat(
+                    [audio[:, :, :n] * fade + tail * (1 - fade), audio[:, :, n:]], dim=-1
+                )
+            own = (end - start) * hop
+            tail = audio[:, :, own:] if end_ext > end else None
+            yield audio[:, :, :own]
+
+    def forward_chunked(self, x, g=None, chunk_frames=64, context_frames=None, overlap_frames=2):
+        return torch.cat(
+            list(self.iter_chunks(x, g, chunk_frames, context_frames, overlap_frames)), dim=-1
+        )
 
     def forward(self, x, g=None):
         x = self.conv_pre(x)
@@ -979,6 +1037,40 @@ class SynthesizerTrn(nn.Module):
         sdp_ratio=0,
         y=None,
         g=None,
+        dec_chunk_frames=None,
+    ):
+        z, attn, y_mask, (z_p, m_p, logs_p), g = self.infer_latent(
+            x, x_lengths, sid, tone, language, bert, ja_bert,
+            noise_scale=noise_scale, length_scale=length_scale, noise_scale_w=noise_scale_w,
+            sdp_ratio=sdp_ratio, y=y, g=g,
+        )
+        if dec_chunk_frames:
+            o = self.dec.forward_chunked((z * y_mask)[:, :, :max_len], g=g, chunk_frames=dec_chunk_frames)
+        else:
+            o = self.dec((z * y_mask)[:, :, :max_len], g=g)
+        return o, attn, y_mask, (z, z_p, m_p, logs_p)
+
+    @torch.no_grad()
+    def infer_stream(self, x, x_lengths, sid, tone, language, bert, ja_bert, chunk_frames=64, **kwargs):
+        """`infer` for a single sentence that yields [1, 1, samples] audio chunks as they are decoded."""
+        z, _, y_mask, _, g = self.infer_latent(x, x_lengths, sid, tone, language, bert, ja_bert, **kwargs)
+        yield from self.dec.iter_chunks(z * y_mask, g=g, chunk_frames=chunk_frames)
+
+    def infer_latent(
+        self,
+        x,
+        x_lengths,
+        sid,
+        tone,
+        language,
+        bert,
+        ja_bert,
+        noise_scale=0.667,
+        length_scale=1,
+        noise_scale_w=0.8,
+        sdp_ratio=0,
+        y=None,
+        g=None,
     ):
         # x, m_p, logs_p, x_mask = self.enc_p(x, x_lengths, tone, language, bert)
         # g = self.gst(y)
@@ -1016,9 +1108,7 @@ class SynthesizerTrn(nn.Module):
 
         z_p = m_p + torch.randn_like(m_p) * torch.exp(logs_p) * noise_scale
         z = self.flow(z_p, y_mask, g=g, reverse=True)
-        o = self.dec((z * y_mask)[:, :, :max_len], g=g)
-        # print('max/min of o:', o.max(), o.min())
-        return o, attn, y_mask, (z, z_p, m_p, logs_p)
+        return z, attn, y_mask, (z_p, m_p, logs_p), g
 
     def voice_conversion(self, y, y_lengths, sid_src, sid_tgt, tau=1.0):        
         g_src = sid_src
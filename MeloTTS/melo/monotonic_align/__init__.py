@@ -1,10 +1,24 @@
+import torch
 from numpy import zeros, int32, float32
 from torch import from_numpy
 
-from .core import maximum_path_jit
+from .core import maximum_path_jit, maximum_path_jit_parallel
 
+# "numba" runs the batch in parallel on CPU threads, "torch" keeps the search on neg_cent's device
+default_backend = "numba"
 
-def maximum_path(neg_cent, mask):
+
+def maximum_path(neg_cent, mask, backend=None):
+    """Monotonic alignment search.
+
+    neg_cent: [b, t_t, t_s]
+    mask: [b, t_t, t_s]
+    """
+    backend = backend or default_backend
+    if backend == "torch":
+        return maximum_path_torch(neg_cent, mask)
+    if backend not in ("numba", "numba_serial"):
+        raise ValueError(f"Unknown MAS backend {backend}")
     device = neg_cent.device
     dtype = neg_cent.dtype
     neg_cent = neg_cent.data.cpu().numpy().astype(float32)
@@ -12,5 +26,58 @@ def maximum_path(neg_cent, mask):
 
     t_t_max = mask.sum(1)[:, 0].data.cpu().numpy().astype(int32)
     t_s_max = mask.sum(2)[:, 0].data.cpu().numpy().astype(int32)
-    maximum_path_jit(path, neg_cent, t_t_max, t_s_max)
+    if backend == "numba":
+        maximum_path_jit_parallel(path, neg_cent, t_t_max, t_s_max)
+    else:
+        maximum_path_jit(path, neg_cent, t_t_max, t_s_max)
     return from_numpy(path).to(device=device, dtype=dtype)
+
+
+@torch.no_grad()
+def maximum_path_torch(neg_cent, mask):
+    """Same search as `maximum_path_jit`, vectorized over the batch and text axis.
+
+    A wavefront sweep processes all cells whose dependencies are done in one step. In MAS a cell
+    of frame y depends only on cells of frame y - 1 (never on its left neighbour in the same
+    frame), so the wavefront is the frame itself rather than an anti-diagonal: the forward pass
+    updates one whole row per step and the backtrack follows all paths at once. Cells outside
+    the reachable band are set to -1e9, as in `maximum_path_each`. Nothing leaves neg_cent's
+    device.
+    """
+    b, t_y_max, t_x_max = neg_cent.shape
+    device = neg_cent.device
+    max_neg_val = -1e9
+    t_ys = mask.sum(1)[:, 0].long()
+    t_xs = mask.sum(2)[:, 0].long()
+
+    value = neg_cent.float().clone()
+    xs = torch.arange(t_x_max, device=device)
+    neg = torch.full((b, 1), max_neg_val, device=device)
+    for y in range(t_y_max):
+        if y == 0:
+            v_prev = torch.full((b, t_x_max), max_neg_val, device=device)
+            v_prev[:, 0] = 0.0
+            v_cur = torch.full((b, t_x_max), max_neg_val, device=device)
+        else:
+            row = value[:, y - 1]
+            v_cur = row.masked_fill(xs == y, max_neg_val)
+            v_prev = torch.cat([neg, row[:, :-1]], dim=1)
+        # only the band reachable by a monotonic path ending at (t_y - 1, t_x - 1) is kept
+        lo = (t_xs + y - t_ys).unsqueeze(1)
+        hi = torch.clamp(t_xs, max=y + 1).unsqueeze(1)
+        valid = (xs >= lo) & (xs < hi)
+        value[:, y] = (value[:, y] + torch.maximum(v_prev, v_cur)).masked_fill(~valid, max_neg_val)
+
+    path = torch.zeros(b, t_y_max, t_x_max, dtype=neg_cent.dtype, device=device)
+    batch = torch.arange(b, device=device)
+    index = t_xs - 1
+    for y in range(t_y_max - 1, -1, -1):
+        active = y < t_ys
+        path[batch, y, index.clamp(min=0)] = active.to(path.dtype)
+        if y == 0:
+            break
+        v_same = value[batch, y - 1, index.clamp(min=0)]
+        v_left = value[batch, y - 1, (index - 1).clamp(min=0)]
+        move = active & (index != 0) & ((index == y) | (v_same < v_left))
+        index = index - move.long()
+    return path
@@ -0,0 +1,54 @@
+# Compare MAS backends on training-sized batches:
+#
+#   python -m melo.monotonic_align.benchmark --batch-size 32
+import time
+
+import click
+import torch
+
+from . import maximum_path
+
+
+def make_batch(batch_size, max_frames, max_phones, device):
+    # lengths spread like a bucketed training batch: frames ~ 4-8x phones
+    t_s = torch.randint(max_phones // 2, max_phones + 1, (batch_size,))
+    t_t = torch.clamp(t_s * torch.randint(4, 9, (batch_size,)), max=max_frames)
+    t_t = torch.maximum(t_t, t_s)
+    neg_cent = torch.randn(batch_size, int(t_t.max()), int(t_s.max())) * 10
+    x_mask = (torch.arange(neg_cent.size(2))[None] < t_s[:, None]).float()
+    y_mask = (torch.arange(neg_cent.size(1))[None] < t_t[:, None]).float()
+    mask = y_mask.unsqueeze(-1) * x_mask.unsqueeze(1)
+    return neg_cent.to(device), mask.to(device)
+
+
+def timeit(fn, repeats, device):
+    fn()  # warm up (jit compile, cuda init)
+    if device.startswith("cuda"):
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    if device.startswith("cuda"):
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+@click.command()
+@click.option("--batch-size", "-b", default=32)
+@click.option("--max-frames", default=800, help="Longest spectrogram in the batch")
+@click.option("--max-phones", default=150, help="Longest phone sequence in the batch")
+@click.option("--repeats", default=10)
+def main(batch_size, max_frames, max_phones, repeats):
+    devices = ["cpu"] + (["cuda"] if torch.cuda.is_available() else [])
+    for device in devices:
+        neg_cent, mask = make_batch(batch_size, max_frames, max_phones, device)
+        ref = maximum_path(neg_cent, mask, backend="numba_serial")
+        print(f"{device}: neg_cent {tuple(neg_cent.shape)}")
+        for backend in ["numba_serial", "numba", "torch"]:
+            ms = timeit(lambda: maximum_path(neg_cent, mask, backend=backend), repeats, device)
+            same = torch.equal(maximum_path(neg_cent, mask, backend=backend), ref)
+            print(f"  {backend:<13} {ms:9.2f} ms  matches serial: {same}")
+
+
+if __name__ == "__main__":
+    main()
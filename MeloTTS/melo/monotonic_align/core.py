@@ -1,6 +1,50 @@
 import numba
 
 
+@numba.jit(
+    numba.void(
+        numba.int32[:, ::1],
+        numba.float32[:, ::1],
+        numba.int32,
+        numba.int32,
+    ),
+    nopython=True,
+    nogil=True,
+)
+def maximum_path_each(path, value, t_y, t_x):
+    max_neg_val = -1e9
+    v_prev = v_cur = 0.0
+    index = t_x - 1
+
+    for y in range(t_y):
+        lo, hi = max(0, t_x + y - t_y), min(t_x, y + 1)
+        # cells no monotonic path to (t_y - 1, t_x - 1) can reach; masked like maximum_path_torch
+        for x in range(lo):
+            value[y, x] = max_neg_val
+        for x in range(hi, t_x):
+            value[y, x] = max_neg_val
+        for x in range(lo, hi):
+            if x == y:
+                v_cur = max_neg_val
+            else:
+                v_cur = value[y - 1, x]
+            if x == 0:
+                if y == 0:
+                    v_prev = 0.0
+                else:
+                    v_prev = max_neg_val
+            else:
+                v_prev = value[y - 1, x - 1]
+            value[y, x] += max(v_prev, v_cur)
+
+    for y in range(t_y - 1, -1, -1):
+        path[y, index] = 1
+        if index != 0 and (
+            index == y or value[y - 1, index] < value[y - 1, index - 1]
+        ):
+            index = index - 1
+
+
 @numba.jit(
     numba.void(
         numba.int32[:, :, ::1],
@@ -13,34 +57,23 @@ import numba
 )
 def maximum_path_jit(paths, values, t_ys, t_xs):
     b = paths.shape[0]
-    max_neg_val = -1e9
     for i in range(int(b)):
-        path = paths[i]
-        value = values[i]
-        t_y = t_ys[i]
-        t_x = t_xs[i]
-
-        v_prev = v_cur = 0.0
-        index = t_x - 1
-
-        for y in range(t_y):
-            for x in range(max(0, t_x + y - t_y), min(t_x, y + 1)):
-                if x == y:
-                    v_cur = max_neg_val
-                else:
-                    v_cur = value[y - 1, x]
-                if x == 0:
-                    if y == 0:
-                        v_prev = 0.0
-                    else:
-                        v_prev = max_neg_val
-                else:
-                    v_prev = value[y - 1, x - 1]
-                value[y, x] += max(v_prev, v_cur)
-
-        for y in range(t_y - 1, -1, -1):
-            path[y, index] = 1
-            if index != 0 and (
-                index == y or value[y - 1, index] < value[y - 1, index - 1]
-            ):
-                index = index - 1
+        maximum_path_each(paths[i], values[i], t_ys[i], t_xs[i])
+
+
+@numba.jit(
+    numba.void(
+        numba.int32[:, :, ::1],
+        numba.float32[:, :, ::1],
+        numba.int32[::1],
+        numba.int32[::1],
+    ),
+    nopython=True,
+    nogil=True,
+    parallel=True,
+)
+def maximum_path_jit_parallel(paths, values, t_ys, t_xs):
+    # batch items are independent; numba spreads them over NUMBA_NUM_THREADS threads
+    b = paths.shape[0]
+    for i in numba.prange(int(b)):
+        maximum_path_each(paths[i], values[i], t_ys[i], t_xs[i])
@@ -0,0 +1,75 @@
+import os
+import numpy as np
+import torch
+
+from .export_onnx import expand_prior
+
+
+class OnnxSynthesizer:
+    """Runs graphs written by `melo.export_onnx` with onnxruntime on CPU.
+
+    Exposes the same `infer` signature and return layout as `SynthesizerTrn.infer`, so it can
+    stand in for the eager model inside `TTS`.
+    """
+
+    def __init__(self, export_dir, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        providers = ['CPUExecutionProvider']
+        self.encoder = ort.InferenceSession(os.path.join(export_dir, 'encoder.onnx'), options, providers=providers)
+        self.decoder = ort.InferenceSession(os.path.join(export_dir, 'decoder.onnx'), options, providers=providers)
+        speakers_path = os.path.join(export_dir, 'speakers.npy')
+        self.speakers = np.load(speakers_path) if os.path.exists(speakers_path) else None
+
+    def infer(
+        self,
+        x,
+        x_lengths,
+        sid,
+        tone,
+        language,
+        bert,
+        ja_bert,
+        noise_scale=0.667,
+        length_scale=1,
+        noise_scale_w=0.8,
+        max_len=None,
+        sdp_ratio=0,
+        y=None,
+        g=None,
+        noise_w=None,
+        noise_z=None,
+    ):
+        if g is None:
+            if self.speakers is None:
+                raise ValueError('This export has no speaker table; pass a reference embedding `g`.')
+            g = self.speakers[sid.cpu().numpy()][:, :, None]
+        else:
+            g = g.detach().cpu().numpy()
+        b, t = x.shape
+        if noise_w is None:
+            noise_w = np.random.randn(b, 2, t).astype(np.float32)
+        m_p, logs_p, x_mask, w_ceil = self.encoder.run(None, {
+            'x': x.cpu().numpy().astype(np.int64),
+            'x_lengths': x_lengths.cpu().numpy().astype(np.int64),
+            'tone': tone.cpu().numpy().astype(np.int64),
+            'language': language.cpu().numpy().astype(np.int64),
+            'bert': bert.cpu().float().numpy(),
+            'ja_bert': ja_bert.cpu().float().numpy(),
+            'g': g.astype(np.float32),
+            'noise_w': noise_w,
+            'noise_scale_w': np.array([noise_scale_w], dtype=np.float32),
+            'sdp_ratio': np.array([sdp_ratio], dtype=np.float32),
+            'length_scale': np.array([length_scale], dtype=np.float32),
+        })
+        m_p, logs_p, y_mask = expand_prior(m_p, logs_p, w_ceil)
+        if noise_z is None:
+            noise_z = np.random.randn(*m_p.shape).astype(np.float32)
+        z_p = m_p + noise_z * np.exp(logs_p) * noise_scale
+        (o,) = self.decoder.run(None, {'z_p': z_p.astype(np.float32), 'y_mask': y_mask, 'g': g.astype(np.float32)})
+        if max_len is not None:
+            o = o[:, :, :max_len * (o.shape[-1] // y_mask.shape[-1])]
+        return torch.from_numpy(o), None, torch.from_numpy(y_mask), None
@@ -0,0 +1,54 @@
+# Real-time factor of eager PyTorch vs. the onnxruntime backend on CPU:
+#
+#   python -m melo.onnx_benchmark --language EN --text-file article.txt --threads 4
+import tempfile
+import time
+
+import click
+import torch
+
+from .api import TTS
+from .export_onnx import export
+from .onnx_backend import OnnxSynthesizer
+
+
+def run(tts, text, speaker_id, repeats, batch_size):
+    tts.tts_to_file(text, speaker_id, quiet=True, batch_size=batch_size)
+    elapsed, seconds = 0., 0.
+    for _ in range(repeats):
+        start = time.perf_counter()
+        audio = tts.tts_to_file(text, speaker_id, quiet=True, batch_size=batch_size)
+        elapsed += time.perf_counter() - start
+        seconds += len(audio) / tts.hps.data.sampling_rate
+    return elapsed / repeats, elapsed / seconds
+
+
+@click.command()
+@click.option('--language', '-l', default='EN')
+@click.option('--text-file', '-f', required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--speaker', '-s', default=None, help='Defaults to the first speaker of the model')
+@click.option('--batch-size', '-b', default=1)
+@click.option('--repeats', default=3)
+@click.option('--threads', default=None, type=int)
+def main(language, text_file, speaker, batch_size, repeats, threads):
+    if threads:
+        torch.set_num_threads(threads)
+    with open(text_file, encoding='utf-8') as f:
+        text = f.read()
+    tts = TTS(language=language, device='cpu')
+    speaker_id = tts.hps.data.spk2id[speaker] if speaker else next(iter(tts.hps.data.spk2id.values()))
+
+    with tempfile.TemporaryDirectory() as onnx_dir:
+        # export folds weight norm into the eager model too, so both backends run the same weights
+        export(tts.model, onnx_dir)
+        print(f'{"backend":<8} {"seconds":>8} {"RTF":>7}')
+        eager_time, eager_rtf = run(tts, text, speaker_id, repeats, batch_size)
+        print(f'{"torch":<8} {eager_time:>8.2f} {eager_rtf:>7.3f}')
+        tts.onnx_backend = OnnxSynthesizer(onnx_dir, num_threads=threads)
+        onnx_time, onnx_rtf = run(tts, text, speaker_id, repeats, batch_size)
+        print(f'{"onnx":<8} {onnx_time:>8.2f} {onnx_rtf:>7.3f}')
+    print(f'speedup: {eager_rtf / onnx_rtf:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
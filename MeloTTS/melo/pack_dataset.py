@@ -0,0 +1,135 @@
+# Pack a training filelist into contiguous, memory-mapped shards.
+#
+#   python pack_dataset.py -c data/example/config.json -o data/example/packed_train
+#
+# Then point `training_files` in the config at the output directory.
+import os
+import json
+
+import click
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from tqdm import tqdm
+
+import utils
+from data_utils import TextAudioSpeakerLoader, PACK_FORMAT_VERSION, PACK_INDEX_FIELDS
+
+# bert_kind values in the index
+BERT_NONE, BERT_ZH, BERT_JA = 0, 1, 2
+
+
+class ShardWriter:
+    """Appends items to the `audio`, `spec`, `bert` and `text` files of numbered shard directories."""
+
+    def __init__(self, output_dir, shard_size_mb, bert_dtype):
+        self.output_dir = output_dir
+        self.shard_size = shard_size_mb * 1024 * 1024
+        self.bert_dtype = bert_dtype
+        self.shard = -1
+        self.files = None
+        # widths of the (bert, ja_bert) features, taken from the first item
+        self.bert_dims = None
+        self._next_shard()
+
+    def _next_shard(self):
+        self.close()
+        self.shard += 1
+        shard_dir = os.path.join(self.output_dir, f"shard_{self.shard:05d}")
+        os.makedirs(shard_dir, exist_ok=True)
+        self.files = {name: open(os.path.join(shard_dir, f"{name}.bin"), "wb") for name in ("audio", "spec", "bert", "text")}
+        self.offsets = dict.fromkeys(self.files, 0)
+        self.bytes = 0
+
+    def _append(self, name, array):
+        # offsets are counted in elements of the file's dtype, not bytes
+        offset = self.offsets[name]
+        self.files[name].write(np.ascontiguousarray(array).tobytes())
+        self.offsets[name] += array.size
+        self.bytes += array.nbytes
+        return offset
+
+    def write(self, phones, spec, wav, sid, tone, language, bert, ja_bert):
+        if self.bytes >= self.shard_size:
+            self._next_shard()
+        if self.bert_dims is None:
+            self.bert_dims = [bert.size(0), ja_bert.size(0)]
+        if bert.abs().sum() > 0:
+            bert_kind, feature = BERT_ZH, bert
+        elif ja_bert.abs().sum() > 0:
+            bert_kind, feature = BERT_JA, ja_bert
+        else:
+            bert_kind, feature = BERT_NONE, None
+        text = torch.stack([phones, tone, language]).numpy().astype(np.int16)
+        row = {
+            "shard": self.shard,
+            "audio_offset": self._append("audio", wav.squeeze(0).numpy().astype(np.float32)),
+            "audio_len": wav.size(1),
+            "spec_offset": self._append("spec", spec.numpy().astype(np.float32)),
+            "spec_frames": spec.size(1),
+            "bert_offset": self._append("bert", feature.numpy().astype(self.bert_dtype)) if feature is not None else 0,
+            "bert_kind": bert_kind,
+            "text_offset": self._append("text", text),
+            "text_len": phones.size(0),
+            "sid": int(sid),
+        }
+        return [row[field] for field in PACK_INDEX_FIELDS]
+
+    def close(self):
+        if self.files:
+            for f in self.files.values():
+                f.close()
+        self.files = None
+
+
+def pack(dataset, output_dir, filelist, shard_size_mb=2048, num_workers=8, bert_dtype=np.float32):
+    """Write every item of `dataset` (a TextAudioSpeakerLoader) to shards in `output_dir`.
+
+    Returns the metadata also written to `meta.json`.
+    """
+    loader = DataLoader(dataset, batch_size=None, shuffle=False, num_workers=num_workers)
+    os.makedirs(output_dir, exist_ok=True)
+    writer = ShardWriter(output_dir, shard_size_mb, bert_dtype)
+    rows = []
+    try:
+        for item in tqdm(loader, total=len(dataset)):
+            rows.append(writer.write(*item))
+    finally:
+        writer.close()
+
+    index = np.asarray(rows, dtype=np.int64).reshape(-1, len(PACK_INDEX_FIELDS))
+    np.save(os.path.join(output_dir, "index.npy"), index)
+    spec_params = dataset.spec_cache_params()
+    meta = {
+        "version": PACK_FORMAT_VERSION,
+        "filelist": os.path.abspath(filelist),
+        "num_items": len(rows),
+        "num_shards": writer.shard + 1,
+        "spec_params": spec_params,
+        "spec_channels": spec_params["n_mel_channels"] if spec_params["mel"] else spec_params["filter_length"] // 2 + 1,
+        "bert_dtype": np.dtype(bert_dtype).name,
+        "bert_dims": writer.bert_dims,
+        "fields": list(PACK_INDEX_FIELDS),
+    }
+    with open(os.path.join(output_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+@click.command()
+@click.option("--config", "-c", "config_path", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--output_dir", "-o", required=True, type=str)
+@click.option("--filelist", default=None, help="Defaults to training_files from the config")
+@click.option("--shard_size_mb", default=2048, help="Start a new shard once this much data has been written")
+@click.option("--num_workers", default=8, help="DataLoader workers reading wavs and features")
+@click.option("--half_bert/--full_bert", default=False, help="Store BERT features as float16")
+def main(config_path, output_dir, filelist, shard_size_mb, num_workers, half_bert):
+    hps = utils.get_hparams_from_file(config_path)
+    filelist = filelist or hps.data.training_files
+    dataset = TextAudioSpeakerLoader(filelist, hps.data)
+    meta = pack(dataset, output_dir, filelist, shard_size_mb, num_workers, np.float16 if half_bert else np.float32)
+    print(f"Packed {meta['num_items']} utterances into {meta['num_shards']} shards at {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
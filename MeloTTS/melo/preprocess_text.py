@@ -1,3 +1,4 @@
+import hashlib
 import json
 from collections import defaultdict
 from random import shuffle
@@ -5,11 +6,191 @@ from typing import Optional
 
 from tqdm import tqdm
 import click
-from text.cleaner import clean_text_bert
 import os
+import threading
+import multiprocessing
 import torch
+from text.cleaner import clean_text_encoded
+from text import get_bert_batch
 from text.symbols import symbols, num_languages, num_tones
 
+
+def _init_g2p_worker():
+    # g2p is single threaded; keep torch (pulled in by some front-ends) from oversubscribing
+    torch.set_num_threads(1)
+
+
+def _g2p_line(item):
+    """Normalize and phonemize one metadata line in a worker; errors are returned, not raised."""
+    idx, line = item
+    try:
+        utt, spk, language, text = line.strip().split("|")
+        norm_text, phones, tones, word2ph, encoding = clean_text_encoded(text, language)
+        assert len(phones) == len(tones)
+        assert len(phones) == sum(word2ph)
+        return idx, line, (utt, spk, language, norm_text, phones, tones, word2ph, encoding), None
+    except Exception as error:
+        return idx, line, None, error
+
+
+def _bert_word2ph(word2ph):
+    # BERT features are aligned to the blank-interspersed phones used in training
+    word2ph = [i * 2 for i in word2ph]
+    word2ph[0] += 1
+    return word2ph
+
+
+def _metadata_fingerprint(lines):
+    return hashlib.sha1("".join(lines).encode("utf-8")).hexdigest()
+
+
+def _read_checkpoint(checkpoint_path, metadata, fingerprint):
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("metadata") != os.path.abspath(metadata):
+        return None
+    if checkpoint.get("fingerprint") != fingerprint:
+        # the metadata was edited since the checkpoint, its line numbers no longer apply
+        print(f"{metadata} changed since the last run, starting over")
+        return None
+    return checkpoint
+
+
+def _write_checkpoint(checkpoint_path, checkpoint):
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def clean_metadata(
+    metadata,
+    cleaned_path,
+    num_workers=None,
+    bert_batch_size=16,
+    max_pending=256,
+    device="cuda:0",
+    resume=True,
+):
+    """Write `cleaned_path` from `metadata`, saving a `.bert.pt` next to every wav.
+
+    Lines are normalized and phonemized by a pool of worker processes and their BERT features
+    are computed in batches in this process, at most `max_pending` lines apart. Output is
+    written in metadata order, and after every batch the number of finished lines is
+    checkpointed to `<cleaned_path>.progress` so an interrupted run resumes where it stopped.
+    The checkpoint records a hash of the metadata and is removed once the run completes.
+    """
+    with open(metadata, encoding="utf-8") as f:
+        lines = f.readlines()
+    fingerprint = _metadata_fingerprint(lines)
+    checkpoint_path = cleaned_path + ".progress"
+    checkpoint = _read_checkpoint(checkpoint_path, metadata, fingerprint) if resume else None
+    if checkpoint is None:
+        checkpoint = {
+            "metadata": os.path.abspath(metadata),
+            "fingerprint": fingerprint,
+            "done": 0,
+            "offset": 0,
+            "new_symbols": [],
+        }
+        out_file = open(cleaned_path, "wb")
+    else:
+        print(f"resuming from line {checkpoint['done']} of {len(lines)}")
+        # binary mode: the checkpointed offset is a byte count, which truncate() needs
+        out_file = open(cleaned_path, "r+b")
+        # drop anything written after the last checkpoint
+        out_file.truncate(checkpoint["offset"])
+        out_file.seek(checkpoint["offset"])
+    new_symbols = checkpoint["new_symbols"]
+
+    # the g2p pool pulls lines through this generator; the semaphore bounds how far it can run ahead.
+    # It must admit a full BERT batch plus one pool chunk or the pipeline would stall.
+    chunksize = 4
+    pending = threading.BoundedSemaphore(max(max_pending, bert_batch_size + chunksize))
+
+    def feed():
+        for idx in range(checkpoint["done"], len(lines)):
+            pending.acquire()
+            yield idx, lines[idx]
+
+    def flush(batch):
+        by_language = defaultdict(list)
+        for item in batch:
+            if item[2] is not None:
+                by_language[item[2][2]].append(item)
+        results = {}
+        for language, items in by_language.items():
+            norm_texts = [item[2][3] for item in items]
+            word2phs = [_bert_word2ph(item[2][6]) for item in items]
+            # the workers' tokenizer output, so BERT does not tokenize the texts again
+            encodings = [item[2][7] for item in items]
+            try:
+                berts = get_bert_batch(norm_texts, word2phs, language, device, use_cache=False, encodings=encodings)
+            except Exception:
+                # find the offending line(s) instead of failing the whole batch
+                berts = []
+                for norm_text, word2ph, encoding in zip(norm_texts, word2phs, encodings):
+                    try:
+                        berts += get_bert_batch([norm_text], [word2ph], language, device, use_cache=False, encodings=[encoding])
+                    except Exception as error:
+                        berts.append(error)
+            for item, bert in zip(items, berts):
+                results[item[0]] = bert
+
+        for idx, line, cleaned, error in batch:
+            bert = results.get(idx)
+            if isinstance(bert, Exception):
+                error = bert
+            if error is not None:
+                print("err!", line, error)
+                continue
+            utt, spk, language, norm_text, phones, tones, word2ph, _ = cleaned
+            for ph in phones:
+                if ph not in symbols and ph not in new_symbols:
+                    new_symbols.append(ph)
+                    print('update!, now symbols:')
+                    print(new_symbols)
+                    with open(f'{language}_symbol.txt', 'w') as f:
+                        f.write(f'{new_symbols}')
+            bert_path = utt.replace(".wav", ".bert.pt")
+            os.makedirs(os.path.dirname(bert_path), exist_ok=True)
+            torch.save(bert.cpu(), bert_path)
+            out_file.write(
+                "{}|{}|{}|{}|{}|{}|{}\n".format(
+                    utt,
+                    spk,
+                    language,
+                    norm_text,
+                    " ".join(phones),
+                    " ".join([str(i) for i in tones]),
+                    " ".join([str(i) for i in word2ph]),
+                ).encode("utf-8")
+            )
+        out_file.flush()
+        checkpoint["done"] = batch[-1][0] + 1
+        checkpoint["offset"] = out_file.tell()
+        _write_checkpoint(checkpoint_path, checkpoint)
+        for _ in batch:
+            pending.release()
+
+    num_workers = num_workers or os.cpu_count() or 1
+    try:
+        with multiprocessing.Pool(num_workers, initializer=_init_g2p_worker) as pool:
+            batch = []
+            for item in tqdm(pool.imap(_g2p_line, feed(), chunksize=chunksize), initial=checkpoint["done"], total=len(lines)):
+                batch.append(item)
+                if len(batch) >= bert_batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+    finally:
+        out_file.close()
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
 @click.command()
 @click.option(
     "--metadata",
@@ -27,6 +208,11 @@ from text.symbols import symbols, num_languages, num_tones
 @click.option("--val-per-spk", default=4)
 @click.option("--max-val-total", default=8)
 @click.option("--clean/--no-clean", default=True)
+@click.option("--num-workers", default=None, type=int, help="g2p worker processes, defaults to the CPU count")
+@click.option("--bert-batch-size", default=16)
+@click.option("--max-pending", default=256, help="Lines allowed between the g2p workers and the BERT stage")
+@click.option("--device", default=None, help="Device for BERT, defaults to cuda:0 when available")
+@click.option("--resume/--no-resume", default=True, help="Continue an interrupted run from its checkpoint")
 def main(
     metadata: str,
     cleaned_path: Optional[str],
@@ -36,6 +222,11 @@ def main(
     val_per_spk: int,
     max_val_total: int,
     clean: bool,
+    num_workers: Optional[int],
+    bert_batch_size: int,
+    max_pending: int,
+    device: Optional[str],
+    resume: bool,
 ):
     if train_path is None:
         train_path = os.path.join(os.path.dirname(metadata), 'train.list')
@@ -47,41 +238,16 @@ def main(
         cleaned_path = metadata + ".cleaned"
 
     if clean:
-        out_file = open(cleaned_path, "w", encoding="utf-8")
-        new_symbols = []
-        for line in tqdm(open(metadata, encoding="utf-8").readlines()):
-            try:
-                utt, spk, language, text = line.strip().split("|")
-                norm_text, phones, tones, word2ph, bert = clean_text_bert(text, language, device='cuda:0')
-                for ph in phones:
-                    if ph not in symbols and ph not in new_symbols:
-                        new_symbols.append(ph)
-                        print('update!, now symbols:')
-                        print(new_symbols)
-                        with open(f'{language}_symbol.txt', 'w') as f:
-                            f.write(f'{new_symbols}')
-
-                assert len(phones) == len(tones)
-                assert len(phones) == sum(word2ph)
-                out_file.write(
-                    "{}|{}|{}|{}|{}|{}|{}\n".format(
-                        utt,
-                        spk,
-                        language,
-                        norm_text,
-                        " ".join(phones),
-                        " ".join([str(i) for i in tones]),
-                        " ".join([str(i) for i in word2ph]),
-                    )
-                )
-                bert_path = utt.replace(".wav", ".bert.pt")
-                os.makedirs(os.path.dirname(bert_path), exist_ok=True)
-                torch.save(bert.cpu(), bert_path)
-            except Exception as error:
-                print("err!", line, error)
-
-        out_file.close()
-
+        device = device or ("cuda:0" if torch.cuda.is_available() else "cpu")
+        clean_metadata(
+            metadata,
+            cleaned_path,
+            num_workers=num_workers,
+            bert_batch_size=bert_batch_size,
+            max_pending=max_pending,
+            device=device,
+            resume=resume,
+        )
         metadata = cleaned_path
 
     spk_utt_map = defaultdict(list)
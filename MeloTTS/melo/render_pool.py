@@ -0,0 +1,75 @@
+import os
+import multiprocessing
+
+# TTS instances owned by this process, one per language; filled lazily by `_render_job`
+_worker_models = {}
+_worker_config = {}
+
+
+def _configure(tts_kwargs, synth_kwargs):
+    _worker_config['tts_kwargs'] = tts_kwargs or {}
+    _worker_config['synth_kwargs'] = synth_kwargs or {}
+
+
+def _init_worker(threads, tts_kwargs, synth_kwargs):
+    # pool initializer; runs in spawned workers only, before torch spins up its thread pools
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    _configure(tts_kwargs, synth_kwargs)
+
+
+def _render_job(job):
+    """Render one (lang_code, language, text, out_path) job; returns (out_path, error or None)."""
+    lang_code, language, text, out_path = job
+    try:
+        if language not in _worker_models:
+            from .api import TTS
+            _worker_models[language] = TTS(language=language, **_worker_config['tts_kwargs'])
+        tts = _worker_models[language]
+        os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+        # write to a temp name so an interrupted job never leaves a file that resume would skip
+        tmp_path = out_path + '.part'
+        tts.tts_to_file(text, output_path=tmp_path, quiet=True, format='wav', **_worker_config['synth_kwargs'])
+        os.replace(tmp_path, out_path)
+        return out_path, None
+    except Exception as e:
+        return out_path, f'{type(e).__name__}: {e}'
+
+
+def render_jobs(jobs, workers=1, threads_per_worker=None, resume=False, tts_kwargs=None, synth_kwargs=None):
+    """Synthesize (lang_code, language, text, out_path) jobs across a pool of worker processes.
+
+    Every worker holds its own `TTS` per language and pins torch to `threads_per_worker` intra-op
+    threads (by default the cores split evenly between workers). Results are yielded in job order
+    as (out_path, error) pairs; with `resume` jobs whose output already exists are skipped and
+    reported with error 'skipped'.
+
+    `synth_kwargs` is passed to `TTS.tts_to_file` and must include `speaker_id`.
+    """
+    if threads_per_worker is None:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // max(1, workers))
+    jobs = list(jobs)
+    skipped = [resume and os.path.exists(job[3]) for job in jobs]
+    pending = [job for job, skip in zip(jobs, skipped) if not skip]
+    if workers <= 1 or not pending:
+        # in this process: leave the caller's environment alone and restore its torch thread count
+        import torch
+        _configure(tts_kwargs, synth_kwargs)
+        num_threads = torch.get_num_threads()
+        torch.set_num_threads(threads_per_worker)
+        try:
+            results = map(_render_job, pending)
+            for job, skip in zip(jobs, skipped):
+                yield (job[3], 'skipped') if skip else next(results)
+        finally:
+            torch.set_num_threads(num_threads)
+        return
+    # keep a language's lines together so each worker tends to load only the models it needs
+    chunksize = max(1, len(pending) // (workers * 4))
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(threads_per_worker, tts_kwargs, synth_kwargs)) as pool:
+        results = pool.imap(_render_job, pending, chunksize=chunksize)
+        for job, skip in zip(jobs, skipped):
+            yield (job[3], 'skipped') if skip else next(results)
@@ -0,0 +1,372 @@
+# Headless multi-model HTTP server for MeloTTS.
+#
+#   melo-server --model EN --model KR=/path/to/KR/checkpoint.pth --memory-budget-mb 4096
+#
+# POST /tts   {"text": ..., "language": "EN", "speaker": "EN-US", "speed": 1.0, "format": "wav"}
+# GET  /models
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+import torch
+
+from .api import TTS
+from .text import bert_encoder, lang_bert_model_id_map, release_bert
+from .stream_utils import float_to_pcm16, wav_header
+
+
+def model_memory_bytes(model):
+    return sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+
+
+class ModelRegistry:
+    """Loads `TTS` models on first use and evicts the least recently used ones over a memory budget.
+
+    `model_specs` maps a language to a (config_path, ckpt_path) pair; languages without an entry
+    fall back to the published checkpoints. BERT encoders are shared by every loaded language
+    with the same BERT model id and are only released when the last of them is evicted. They
+    count against the budget once each, from the time they are first loaded.
+    `tts_class` builds the models and is only replaced in tests.
+    """
+
+    def __init__(self, model_specs=None, device='auto', memory_budget_mb=None, use_hf=True, tts_class=TTS):
+        self.model_specs = model_specs or {}
+        self.device = device
+        self.memory_budget = memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+        self.use_hf = use_hf
+        self.tts_class = tts_class
+        self._models = OrderedDict()
+        self._sizes = {}
+        # BERT model id -> size of the shared encoder, once it has been loaded
+        self._bert_sizes = {}
+        self._in_use = {}
+        # language -> Event set once a load in progress finishes (successfully or not)
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def acquire(self, language):
+        # models are loaded outside the lock so a cold load only blocks requests for its own language
+        while True:
+            with self._lock:
+                if language in self._models:
+                    self._models.move_to_end(language)
+                    self._in_use[language] += 1
+                    self._evict()
+                    return self._models[language]
+                loading = self._loading.get(language)
+                if loading is None:
+                    loading = self._loading[language] = threading.Event()
+                    break
+            loading.wait()
+
+        try:
+            config_path, ckpt_path = self.model_specs.get(language, (None, None))
+            tts = self.tts_class(language=language, device=self.device, use_hf=self.use_hf,
+                                 config_path=config_path, ckpt_path=ckpt_path)
+            with self._lock:
+                self._models[language] = tts
+                self._sizes[language] = model_memory_bytes(tts.model)
+                self._in_use[language] = 1
+                self.loads += 1
+                self._track_bert(language)
+                self._evict()
+            return tts
+        finally:
+            with self._lock:
+                del self._loading[language]
+            loading.set()
+
+    def release(self, language):
+        with self._lock:
+            self._in_use[language] -= 1
+            # the BERT encoder is loaded by the first synthesis, not by TTS()
+            self._track_bert(language)
+            self._evict()
+
+    def _track_bert(self, language):
+        bert_id = lang_bert_model_id_map.get(language)
+        if bert_id is None or bert_id in self._bert_sizes:
+            return
+        encoder = bert_encoder(language)
+        if encoder is not None:
+            self._bert_sizes[bert_id] = model_memory_bytes(encoder)
+
+    def memory_bytes(self):
+        """Bytes held by the loaded models plus the BERT encoders they use."""
+        bert_ids = {lang_bert_model_id_map.get(tts.language) for tts in self._models.values()}
+        return sum(self._sizes.values()) + sum(self._bert_sizes.get(bert_id, 0) for bert_id in bert_ids)
+
+    def _evict(self):
+        if self.memory_budget is None:
+            return
+        for language in list(self._models.keys()):
+            if self.memory_bytes() <= self.memory_budget:
+                break
+            if self._in_use[language] > 0:
+                continue
+            tts = self._models.pop(language)
+            del self._sizes[language], self._in_use[language]
+            bert_id = lang_bert_model_id_map.get(tts.language)
+            if all(lang_bert_model_id_map.get(other.language) != bert_id for other in self._models.values()):
+                release_bert(tts.language)
+                self._bert_sizes.pop(bert_id, None)
+            del tts
+            self.evictions += 1
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': list(self._models.keys()),
+                'memory_mb': self.memory_bytes() / 1024 / 1024,
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
+
+
+class ModelWorker:
+    """Per-language request queue that micro-batches requests arriving within `max_wait_ms`.
+
+    Requests with the same speaker and sampling parameters are synthesized together: their
+    sentences are pooled, bucketed by length and run through `TTS.infer_batch`.
+    """
+
+    def __init__(self, registry, language, max_batch_size=8, max_wait_ms=10):
+        self.registry = registry
+        self.language = language
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        # one thread per model keeps its forward passes serialized
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, request):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            groups = {}
+            for request, future in batch:
+                try:
+                    groups.setdefault(request_params(request), []).append((request, future))
+                except Exception as e:
+                    # never let one malformed request take the worker down
+                    if not future.done():
+                        future.set_exception(e)
+            for items in groups.values():
+                try:
+                    audios = await loop.run_in_executor(self.executor, self._synthesize, [r for r, _ in items])
+                except Exception as e:
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, future), audio in zip(items, audios):
+                    if not future.done():
+                        future.set_result(audio)
+
+    def _synthesize(self, requests):
+        tts = self.registry.acquire(self.language)
+        try:
+            params = requests[0]
+            texts = [tts.split_sentences_into_pieces(r['text'], tts.language, quiet=True) for r in requests]
+            flat = [t for sentences in texts for t in sentences]
+            inputs = []
+            for i in range(0, len(flat), self.max_batch_size):
+                inputs += tts.get_text_inputs_batch(flat[i:i + self.max_batch_size])
+            lengths = [phones.size(0) for _, _, phones, _, _ in inputs]
+            outputs = [None] * len(flat)
+            for bucket in tts.length_buckets(lengths, self.max_batch_size):
+                audios = tts.infer_batch(
+                    [inputs[i] for i in bucket],
+                    resolve_speaker(tts, params.get('speaker')),
+                    sdp_ratio=params.get('sdp_ratio', 0.2),
+                    noise_scale=params.get('noise_scale', 0.6),
+                    noise_scale_w=params.get('noise_scale_w', 0.8),
+                    speed=params.get('speed', 1.0),
+                )
+                for i, audio in zip(bucket, audios):
+                    outputs[i] = audio
+            sr = tts.hps.data.sampling_rate
+            results, offset = [], 0
+            for sentences in texts:
+                segments = outputs[offset:offset + len(sentences)]
+                offset += len(sentences)
+                results.append((TTS.audio_numpy_concat(segments, sr=sr, speed=params.get('speed', 1.0)), sr))
+            return results
+        finally:
+            self.registry.release(self.language)
+
+
+def request_params(request):
+    return tuple(request.get(k) for k in ('speaker', 'speed', 'sdp_ratio', 'noise_scale', 'noise_scale_w'))
+
+
+def normalize_request(request):
+    """Validate a request dict and coerce its synthesis parameters; raises ValueError on bad input."""
+    if not isinstance(request, dict):
+        raise ValueError('request must be a JSON object')
+    request = dict(request)
+    if not isinstance(request.get('text'), str) or not request['text'].strip():
+        raise ValueError('"text" must be a non-empty string')
+    if not isinstance(request.get('language', 'EN'), str):
+        raise ValueError('"language" must be a string')
+    speaker = request.get('speaker')
+    if speaker is not None and (isinstance(speaker, bool) or not isinstance(speaker, (str, int))):
+        raise ValueError('"speaker" must be a speaker name or id')
+    for key in ('speed', 'sdp_ratio', 'noise_scale', 'noise_scale_w'):
+        if request.get(key) is not None:
+            try:
+                request[key] = float(request[key])
+            except (TypeError, ValueError):
+                raise ValueError(f'"{key}" must be a number')
+    return request
+
+
+def resolve_speaker(tts, speaker):
+    spk2id = tts.hps.data.spk2id
+    if speaker is None:
+        return spk2id[list(spk2id.keys())[0]]
+    if isinstance(speaker, int):
+        return speaker
+    if speaker not in spk2id:
+        raise ValueError(f'Unknown speaker {speaker!r}, expected one of {list(spk2id.keys())}')
+    return spk2id[speaker]
+
+
+class TTSServer:
+    def __init__(self, registry, max_batch_size=8, max_wait_ms=10, request_timeout=300):
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.request_timeout = request_timeout
+        self.workers = {}
+        self.loop = None
+
+    async def synthesize(self, request):
+        """Return (float32 audio, sampling rate) for a request dict; usable without the HTTP layer."""
+        request = normalize_request(request)
+        language = request.get('language', 'EN').upper()
+        if language not in self.workers:
+            self.workers[language] = ModelWorker(self.registry, language, self.max_batch_size, self.max_wait_ms)
+        return await self.workers[language].submit(request)
+
+    def start_loop(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        return self.loop
+
+    def make_http_server(self, host='127.0.0.1', port=8888):
+        """Bind the HTTP front end (port 0 picks a free one) without serving it yet."""
+        loop = self.loop or self.start_loop()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, code, body, content_type='application/json'):
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/models':
+                    self._send(200, json.dumps(server.registry.stats()).encode())
+                elif self.path == '/health':
+                    self._send(200, b'{"status": "ok"}')
+                else:
+                    self._send(404, b'{"error": "not found"}')
+
+            def do_POST(self):
+                if self.path != '/tts':
+                    self._send(404, b'{"error": "not found"}')
+                    return
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                    start = time.time()
+                    future = asyncio.run_coroutine_threadsafe(server.synthesize(request), loop)
+                    audio, sr = future.result(timeout=server.request_timeout)
+                except FutureTimeoutError:
+                    future.cancel()
+                    self._send(504, json.dumps({'error': 'synthesis timed out'}).encode())
+                    return
+                except ValueError as e:
+                    # malformed JSON, invalid fields, unknown speaker
+                    self._send(400, json.dumps({'error': str(e)}).encode())
+                    return
+                except Exception as e:
+                    self._send(500, json.dumps({'error': str(e)}).encode())
+                    return
+                pcm = float_to_pcm16(audio)
+                if request.get('format', 'wav') == 'raw':
+                    body, content_type = pcm, 'application/octet-stream'
+                else:
+                    body, content_type = wav_header(sr, len(pcm) // 2) + pcm, 'audio/wav'
+                self.log_message('synthesized %d samples in %.2fs', len(audio), time.time() - start)
+                self._send(200, body, content_type)
+
+        return ThreadingHTTPServer((host, port), Handler)
+
+    def serve(self, host='127.0.0.1', port=8888):
+        httpd = self.make_http_server(host, port)
+        print(f'MeloTTS server listening on http://{host}:{port}')
+        try:
+            httpd.serve_forever()
+        finally:
+            httpd.server_close()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def parse_model_spec(spec):
+    """`EN` or `EN=/path/to/checkpoint.pth` (config.json is read from the checkpoint directory)."""
+    if '=' not in spec:
+        return spec.upper(), (None, None)
+    language, ckpt_path = spec.split('=', 1)
+    return language.upper(), (os.path.join(os.path.dirname(ckpt_path), 'config.json'), ckpt_path)
+
+
+@click.command()
+@click.option('--model', '-m', 'models', multiple=True, help='Language to serve, optionally LANG=path/to/checkpoint.pth for a local checkpoint')
+@click.option('--host', '-h', default='127.0.0.1')
+@click.option('--port', '-p', type=int, default=8888)
+@click.option('--device', '-d', default='auto', help='Device, defaults to auto')
+@click.option('--memory-budget-mb', type=int, default=None, help='Evict least recently used models above this size')
+@click.option('--max-batch-size', type=int, default=8)
+@click.option('--max-wait-ms', type=int, default=10, help='How long a queue waits to fill a micro-batch')
+@click.option('--preload', is_flag=True, default=False, help='Load every --model at startup instead of on first request')
+@click.option('--request-timeout', type=float, default=300, help='Seconds before a request is answered with 504')
+def main(models, host, port, device, memory_budget_mb, max_batch_size, max_wait_ms, preload, request_timeout):
+    registry = ModelRegistry(dict(parse_model_spec(m) for m in models), device=device, memory_budget_mb=memory_budget_mb)
+    if preload:
+        for language in registry.model_specs:
+            registry.acquire(language)
+            registry.release(language)
+    TTSServer(registry, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+              request_timeout=request_timeout).serve(host, port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def tensor_hash(tensors):
+    h = hashlib.sha1()
+    for t in tensors:
+        h.update(t.detach().float().cpu().numpy().tobytes())
+    return h.hexdigest()
+
+
+class SpeakerEmbeddingCache:
+    """Speaker embeddings (`ref_enc` outputs) kept in memory and, optionally, as `.pt` files on disk.
+
+    Keys are built by the caller from the reference file content hash and the encoder weights,
+    so the same voice is embedded once no matter how many lines are cloned with it. At most
+    `max_items` embeddings stay in memory, least recently used first out.
+    """
+
+    def __init__(self, cache_dir=None, max_items=256):
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.max_items = max_items
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.pt')
+
+    def get_or_compute(self, key, compute_fn, device='cpu'):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return self._mem[key].to(device)
+        if self.cache_dir is not None and os.path.exists(self._path(key)):
+            g = torch.load(self._path(key), map_location='cpu')
+            with self._lock:
+                self.hits += 1
+                self._insert(key, g)
+            return g.to(device)
+        g = compute_fn().detach().cpu()
+        with self._lock:
+            self.misses += 1
+            self._insert(key, g)
+        if self.cache_dir is not None:
+            tmp_path = f'{self._path(key)}.{os.getpid()}.tmp'
+            torch.save(g, tmp_path)
+            os.replace(tmp_path, self._path(key))
+        return g.to(device)
+
+    def _insert(self, key, g):
+        self._mem[key] = g
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._mem)}
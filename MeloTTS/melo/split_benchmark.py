@@ -0,0 +1,34 @@
+# Padding waste of batched inference with the default splitter vs. the phone-count splitter:
+#
+#   python -m melo.split_benchmark --language EN --text-file article.txt --batch-size 8
+import click
+
+from .split_utils import split_sentence, split_sentence_by_phones, count_phones, length_buckets, padding_ratio
+
+
+def describe(name, counts, batch_size):
+    buckets = length_buckets(counts, batch_size)
+    print(f'{name:<14} segments: {len(counts):4d}  phones min/mean/max: '
+          f'{min(counts)}/{sum(counts) / len(counts):.1f}/{max(counts)}  '
+          f'padding: {padding_ratio(counts, buckets):.1%}')
+
+
+@click.command()
+@click.option('--language', '-l', default='EN')
+@click.option('--text-file', '-f', required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', '-b', default=8)
+@click.option('--min-phones', default=40)
+@click.option('--max-phones', default=160)
+def main(language, text_file, batch_size, min_phones, max_phones):
+    with open(text_file, encoding='utf-8') as f:
+        text = f.read()
+    baseline = [count_phones(s, language) for s in split_sentence(text, language_str=language)]
+    segments, _ = split_sentence_by_phones(text, language, min_phones=min_phones, max_phones=max_phones)
+    # the splitter only estimates phone counts; measure both with the real front-end
+    smart = [count_phones(s, language) for s in segments]
+    describe('split_sentence', baseline, batch_size)
+    describe('by phones', smart, batch_size)
+
+
+if __name__ == '__main__':
+    main()
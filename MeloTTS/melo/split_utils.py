@@ -102,6 +102,100 @@ def merge_short_sentences_zh(sens):
 
 
 
+def count_phones(text, language_str):
+    """Number of phones the text front-end produces for `text` (without the start/end pads)."""
+    from .text.cleaner import clean_text
+    _, phones, _, _ = clean_text(text, language_str)
+    return max(len(phones) - 2, 0)
+
+
+_HAN = re.compile(r'[\u4e00-\u9fff]')
+_KANA = re.compile(r'[\u3040-\u30ff]')
+_HANGUL = re.compile(r'[\uac00-\ud7a3]')
+_LETTER = re.compile(r'[^\W\d_]')
+_DIGIT = re.compile(r'\d')
+_PUNCT = re.compile(r'[^\w\s]')
+
+
+def estimate_phones(text, language_str):
+    """Rough `count_phones` from character classes, without running g2p.
+
+    Good enough to size segments: a han character is an initial and a final in Chinese but
+    about two morae in Japanese, a kana mora a consonant and a vowel, a hangul syllable two or
+    three jamo, a latin letter a little under one phone, and a digit is read out as a word.
+    """
+    han = len(_HAN.findall(text))
+    kana = len(_KANA.findall(text))
+    hangul = len(_HANGUL.findall(text))
+    letters = len(_LETTER.findall(text)) - han - kana - hangul
+    estimate = (
+        han * (3.5 if language_str == 'JP' else 2)
+        + kana * 2
+        + hangul * 2.5
+        + letters * 0.9
+        + len(_DIGIT.findall(text)) * 3
+        + len(_PUNCT.findall(text))
+    )
+    return int(round(estimate))
+
+
+def split_clauses(sentence):
+    # break after clause punctuation; the punctuation stays with the clause it ends
+    return [c.strip() for c in re.split(r'(?<=[,.!?;:…])\s+', sentence) if c.strip()]
+
+
+def split_sentence_by_phones(text, language_str='EN', min_phones=40, max_phones=160, count_fn=estimate_phones):
+    """Split `text` into segments of roughly `min_phones`..`max_phones` phones.
+
+    Sentences come from `split_sentence`, so punctuation is handled exactly as before; they are
+    then cut into clauses at punctuation and the clauses greedily re-merged until a segment
+    would exceed `max_phones`. A trailing segment under `min_phones` is folded into the previous
+    one when that still fits. A single clause longer than `max_phones` is kept whole.
+
+    Clauses are measured with `count_fn(clause, language_str)`. The default `estimate_phones`
+    skips g2p, which the segments go through again for synthesis anyway; pass `count_phones`
+    for exact counts.
+
+    Returns (segments, phone_counts).
+    """
+    clauses, counts = [], []
+    for sentence in split_sentence(text, language_str=language_str):
+        for clause in split_clauses(sentence):
+            clauses.append(clause)
+            counts.append(count_fn(clause, language_str))
+
+    segments, segment_counts = [], []
+    current, current_count = [], 0
+    for clause, count in zip(clauses, counts):
+        if current and current_count + count > max_phones:
+            segments.append(' '.join(current))
+            segment_counts.append(current_count)
+            current, current_count = [], 0
+        current.append(clause)
+        current_count += count
+    if current:
+        # a short tail is folded into the previous segment when it fits
+        if segments and current_count < min_phones and segment_counts[-1] + current_count <= max_phones:
+            segments[-1] = segments[-1] + ' ' + ' '.join(current)
+            segment_counts[-1] += current_count
+        else:
+            segments.append(' '.join(current))
+            segment_counts.append(current_count)
+    return segments, segment_counts
+
+
+def length_buckets(lengths, batch_size):
+    """Group item indices into batches of similar length so padding stays small."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def padding_ratio(lengths, buckets):
+    """Fraction of the padded batch positions that are padding."""
+    padded = sum(max(lengths[i] for i in bucket) * len(bucket) for bucket in buckets)
+    return 1 - sum(lengths) / padded if padded else 0.0
+
+
 def txtsplit(text, desired_length=100, max_length=200):
     """Split text it into chunks of a desired length trying to keep sentences intact."""
     text = re.sub(r'\n\n+', '\n', text)
@@ -0,0 +1,70 @@
+import struct
+import numpy as np
+
+# a RIFF/data size of 0xFFFFFFFF is the de-facto marker for "length unknown" in streamed wav files
+_STREAMING_SIZE = 0xFFFFFFFF
+
+
+def float_to_pcm16(audio):
+    audio = np.clip(np.asarray(audio, dtype=np.float32), -1.0, 1.0)
+    return (audio * 32767).astype('<i2').tobytes()
+
+
+def wav_header(sr, num_samples=None, channels=1, sample_width=2):
+    """RIFF header for 16 bit PCM; leave `num_samples` as None when the length is not known yet."""
+    if num_samples is None:
+        data_size = riff_size = _STREAMING_SIZE
+    else:
+        data_size = num_samples * channels * sample_width
+        riff_size = 36 + data_size
+    byte_rate = sr * channels * sample_width
+    return (
+        b'RIFF' + struct.pack('<I', riff_size) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sr, byte_rate, channels * sample_width, sample_width * 8)
+        + b'data' + struct.pack('<I', data_size)
+    )
+
+
+def iter_pcm_bytes(chunks, sr, format='wav'):
+    """Convert float32 audio chunks into bytes ready to be sent over a socket/pipe.
+
+    `format='wav'` prefixes a streaming wav header, `format='raw'` yields bare 16 bit little-endian PCM.
+    """
+    if format not in ('wav', 'raw'):
+        raise ValueError(f'Unsupported stream format: {format}')
+    if format == 'wav':
+        yield wav_header(sr)
+    for chunk in chunks:
+        yield float_to_pcm16(chunk)
+
+
+def write_stream(chunks, output, sr, format='wav'):
+    """Write audio chunks to `output` (a path or binary file object) as they arrive.
+
+    Every chunk is flushed immediately so readers can start playback before synthesis finishes.
+    If the target is seekable, the wav header is patched with the real length at the end.
+    Returns the number of samples written.
+    """
+    if format not in ('wav', 'raw'):
+        raise ValueError(f'Unsupported stream format: {format}')
+    own_file = isinstance(output, str)
+    f = open(output, 'wb') if own_file else output
+    num_samples = 0
+    try:
+        start = f.tell() if format == 'wav' and f.seekable() else None
+        if format == 'wav':
+            f.write(wav_header(sr))
+        for chunk in chunks:
+            data = float_to_pcm16(chunk)
+            f.write(data)
+            f.flush()
+            num_samples += len(data) // 2
+        if start is not None:
+            end = f.tell()
+            f.seek(start)
+            f.write(wav_header(sr, num_samples))
+            f.seek(end)
+    finally:
+        if own_file:
+            f.close()
+    return num_samples
@@ -20,16 +20,98 @@ def cleaned_text_to_sequence(cleaned_text, tones, language, symbol_to_id=None):
     return phones, tones, lang_ids
 
 
-def get_bert(norm_text, word2ph, language, device):
-    from .chinese_bert import get_bert_feature as zh_bert
-    from .english_bert import get_bert_feature as en_bert
-    from .japanese_bert import get_bert_feature as jp_bert
-    from .chinese_mix import get_bert_feature as zh_mix_en_bert
-    from .spanish_bert import get_bert_feature as sp_bert
-    from .french_bert import get_bert_feature as fr_bert
-    from .korean import get_bert_feature as kr_bert
-
-    lang_bert_func_map = {"ZH": zh_bert, "EN": en_bert, "JP": jp_bert, 'ZH_MIX_EN': zh_mix_en_bert, 
-                          'FR': fr_bert, 'SP': sp_bert, 'ES': sp_bert, "KR": kr_bert}
-    bert = lang_bert_func_map[language](norm_text, word2ph, device)
-    return bert
+lang_bert_model_id_map = {
+    "ZH": 'hfl/chinese-roberta-wwm-ext-large',
+    "ZH_MIX_EN": 'bert-base-multilingual-uncased',
+    "EN": 'bert-base-uncased',
+    "JP": 'tohoku-nlp/bert-base-japanese-v3',
+    "KR": 'kykim/bert-kor-base',
+    "FR": 'dbmdz/bert-base-french-europeana-cased',
+    "SP": 'dccuchile/bert-base-spanish-wwm-uncased',
+    "ES": 'dccuchile/bert-base-spanish-wwm-uncased',
+}
+
+
+# module providing `get_bert_features_batch` for each language, imported on first use so a
+# single-language worker never loads the other tokenizers
+lang_bert_module_map = {
+    "ZH": 'chinese_bert',
+    "ZH_MIX_EN": 'chinese_bert',
+    "EN": 'english_bert',
+    "JP": 'japanese_bert',
+    "KR": 'japanese_bert',
+    "FR": 'french_bert',
+    "SP": 'spanish_bert',
+    "ES": 'spanish_bert',
+}
+
+
+def get_bert(norm_text, word2ph, language, device, use_cache=True, encoding=None):
+    return get_bert_batch([norm_text], [word2ph], language, device, use_cache=use_cache, encodings=[encoding])[0]
+
+
+def get_bert_batch(norm_texts, word2phs, language, device, use_cache=True, encodings=None):
+    """Batched `get_bert`: one padded BERT forward pass for every sentence not already cached.
+
+    `encodings` are the tokenizer outputs g2p already computed for `norm_texts` (see
+    `cleaner.clean_text_encoded`); sentences without one are tokenized again.
+    """
+    import importlib
+
+    model_id = lang_bert_model_id_map.get(language)
+    module_name = lang_bert_module_map[language]
+    bert_module = importlib.import_module(f'.{module_name}', __name__)
+    # chinese_bert/japanese_bert serve several checkpoints and take the model id explicitly
+    kwargs = {'model_id': model_id} if module_name in ['chinese_bert', 'japanese_bert'] else {}
+
+    berts = [None] * len(norm_texts)
+    keys = [None] * len(norm_texts)
+    if use_cache:
+        from . import bert_cache
+        cache = bert_cache.default_cache
+        for i, (norm_text, word2ph) in enumerate(zip(norm_texts, word2phs)):
+            keys[i] = cache.make_key(language, model_id, norm_text, word2ph)
+            berts[i] = cache.get(keys[i])
+    missing = [i for i, bert in enumerate(berts) if bert is None]
+    if missing:
+        if encodings is not None:
+            kwargs['encodings'] = [encodings[i] for i in missing]
+        computed = bert_module.get_bert_features_batch(
+            [norm_texts[i] for i in missing], [word2phs[i] for i in missing], device, **kwargs
+        )
+        for i, bert in zip(missing, computed):
+            berts[i] = bert
+            if use_cache:
+                cache.put(keys[i], bert)
+    return berts
+
+
+def release_bert(language):
+    """Drop the BERT encoder used by `language` so its memory can be reclaimed.
+
+    Encoders are shared process-wide by model id; callers must make sure no other loaded
+    language still uses the same `lang_bert_model_id_map` entry.
+    """
+    import sys
+
+    module = sys.modules.get(f'{__name__}.{lang_bert_module_map[language]}')
+    if module is None:
+        return
+    if hasattr(module, 'models'):
+        module.models.pop(lang_bert_model_id_map[language], None)
+        if hasattr(module, 'tokenizers'):
+            module.tokenizers.pop(lang_bert_model_id_map[language], None)
+    if getattr(module, 'model', None) is not None:
+        module.model = None
+
+
+def bert_encoder(language):
+    """The BERT encoder `language` uses if it has been loaded in this process, else None."""
+    import sys
+
+    module = sys.modules.get(f'{__name__}.{lang_bert_module_map[language]}')
+    if module is None:
+        return None
+    if hasattr(module, 'models'):
+        return module.models.get(lang_bert_model_id_map[language])
+    return getattr(module, 'model', None)
@@ -0,0 +1,99 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+
+class BertFeatureCache:
+    """Content-addressed cache for phone-level BERT features.
+
+    Entries are keyed on (language, model_id, norm_text, word2ph) so a repeated sentence
+    skips the BERT forward pass entirely. Lookups go through an in-memory LRU tier first and
+    then, if `cache_dir` is set, an on-disk tier of `.npy` files that are memory-mapped on load.
+    Returned tensors are shared with the cache and must be treated as read-only.
+    """
+
+    def __init__(self, max_items=128, cache_dir=None):
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(language, model_id, norm_text, word2ph):
+        payload = json.dumps([language, model_id, norm_text, list(word2ph)], ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.npy')
+
+    def get(self, key):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return self._mem[key]
+        if self.cache_dir is not None and os.path.exists(self._path(key)):
+            # copy-on-write mapping: pages are read lazily and the array is writable for torch
+            feature = torch.from_numpy(np.load(self._path(key), mmap_mode='c'))
+            with self._lock:
+                self.disk_hits += 1
+                self._insert(key, feature)
+            return feature
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, feature):
+        feature = feature.detach().cpu()
+        with self._lock:
+            self._insert(key, feature)
+        if self.cache_dir is not None:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write to a temp file first so concurrent readers never see a partial array
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, feature.float().numpy())
+            os.replace(tmp_path, path)
+
+    def _insert(self, key, feature):
+        self._mem[key] = feature
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'size': len(self._mem),
+            }
+
+
+default_cache = BertFeatureCache()
+
+
+def configure(max_items=128, cache_dir=None):
+    """Replace the process-wide cache, e.g. to enable the on-disk tier."""
+    global default_cache
+    default_cache = BertFeatureCache(max_items=max_items, cache_dir=cache_dir)
+    return default_cache
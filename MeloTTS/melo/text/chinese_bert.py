@@ -1,23 +1,23 @@
 import torch
 import sys
-from transformers import AutoTokenizer, AutoModelForMaskedLM
+from transformers import AutoModelForMaskedLM
+
+from .tokenization import encode_batch
 
 
 # model_id = 'hfl/chinese-roberta-wwm-ext-large'
 local_path = "./bert/chinese-roberta-wwm-ext-large"
 
 
-tokenizers = {}
 models = {}
 
-def get_bert_feature(text, word2ph, device=None, model_id='hfl/chinese-roberta-wwm-ext-large'):
+def get_bert_features_batch(texts, word2phs, device=None, model_id='hfl/chinese-roberta-wwm-ext-large', encodings=None):
+    """Phone-level features for several sentences with a single padded forward pass."""
     if model_id not in models:
         models[model_id] = AutoModelForMaskedLM.from_pretrained(
             model_id
         ).to(device)
-        tokenizers[model_id] = AutoTokenizer.from_pretrained(model_id)
     model = models[model_id]
-    tokenizer = tokenizers[model_id]
 
     if (
         sys.platform == "darwin"
@@ -29,21 +29,22 @@ def get_bert_feature(text, word2ph, device=None, model_id='hfl/chinese-roberta-w
         device = "cuda"
 
     with torch.no_grad():
-        inputs = tokenizer(text, return_tensors="pt")
+        inputs = encode_batch(texts, model_id, encodings)
         for i in inputs:
             inputs[i] = inputs[i].to(device)
         res = model(**inputs, output_hidden_states=True)
-        res = torch.cat(res["hidden_states"][-3:-2], -1)[0].cpu()
+        res = torch.cat(res["hidden_states"][-3:-2], -1).cpu()
     # import pdb; pdb.set_trace()
     # assert len(word2ph) == len(text) + 2
-    word2phone = word2ph
-    phone_level_feature = []
-    for i in range(len(word2phone)):
-        repeat_feature = res[i].repeat(word2phone[i], 1)
-        phone_level_feature.append(repeat_feature)
+    phone_level_features = []
+    for i, word2ph in enumerate(word2phs):
+        repeats = torch.tensor(word2ph, dtype=torch.long)
+        phone_level_features.append(res[i, :len(word2ph)].repeat_interleave(repeats, dim=0).T)
+    return phone_level_features
 
-    phone_level_feature = torch.cat(phone_level_feature, dim=0)
-    return phone_level_feature.T
+
+def get_bert_feature(text, word2ph, device=None, model_id='hfl/chinese-roberta-wwm-ext-large'):
+    return get_bert_features_batch([text], [word2ph], device=device, model_id=model_id)[0]
 
 
 if __name__ == "__main__":
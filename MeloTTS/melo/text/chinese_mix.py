@@ -8,7 +8,7 @@ from pypinyin import lazy_pinyin, Style
 from .symbols import language_tone_start_map
 from .tone_sandhi import ToneSandhi
 from .english import g2p as g2p_en
-from transformers import AutoTokenizer
+from .tokenization import get_tokenizer
 
 punctuation = ["!", "?", "…", ",", ".", "'", "-"]
 current_file_path = os.path.dirname(__file__)
@@ -97,7 +97,7 @@ def _get_initials_finals(word):
     return initials, finals
 
 model_id = 'bert-base-multilingual-uncased'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
+tokenizer = get_tokenizer(model_id)
 def _g2p(segments):
     phones_list = []
     tones_list = []
@@ -1,9 +1,36 @@
-from . import chinese, japanese, english, chinese_mix, korean, french, spanish
 from . import cleaned_text_to_sequence
 import copy
+import importlib
 
-language_module_map = {"ZH": chinese, "JP": japanese, "EN": english, 'ZH_MIX_EN': chinese_mix, 'KR': korean,
-                    'FR': french, 'SP': spanish, 'ES': spanish}
+language_module_names = {"ZH": 'chinese', "JP": 'japanese', "EN": 'english', 'ZH_MIX_EN': 'chinese_mix', 'KR': 'korean',
+                    'FR': 'french', 'SP': 'spanish', 'ES': 'spanish'}
+
+
+class LazyLanguageModuleMap(dict):
+    """language -> front-end module, imported on first lookup.
+
+    Several front-ends load tokenizers and dictionaries at import time, so importing all of
+    them up front makes every worker pay for languages it never serves.
+    """
+
+    def __missing__(self, language):
+        module = importlib.import_module(f'.{language_module_names[language]}', __package__)
+        self[language] = module
+        return module
+
+
+language_module_map = LazyLanguageModuleMap()
+
+
+def preload(languages=None):
+    """Import the front-ends for `languages` (all of them by default) ahead of the first request."""
+    if languages is None:
+        languages = language_module_names.keys()
+    return [language_module_map[language] for language in languages]
+
+
+# front-ends whose g2p walks the tokens of their BERT model (`model_id`) and accepts them as `tokenized`
+tokenized_g2p_languages = {'EN', 'JP', 'KR', 'FR', 'SP', 'ES'}
 
 
 def clean_text(text, language):
@@ -13,6 +40,23 @@ def clean_text(text, language):
     return norm_text, phones, tones, word2ph
 
 
+def clean_text_encoded(text, language):
+    """`clean_text` plus the `tokenization.Encoding` g2p used, or None for front-ends that do not tokenize.
+
+    Pass the encoding to `get_bert_batch` so the normalized text is tokenized only once.
+    """
+    from .tokenization import encode
+
+    language_module = language_module_map[language]
+    norm_text = language_module.text_normalize(text)
+    if language not in tokenized_g2p_languages:
+        phones, tones, word2ph = language_module.g2p(norm_text)
+        return norm_text, phones, tones, word2ph, None
+    encoding = encode(norm_text, language_module.model_id)
+    phones, tones, word2ph = language_module.g2p(norm_text, tokenized=encoding.tokens)
+    return norm_text, phones, tones, word2ph, encoding
+
+
 def clean_text_bert(text, language, device=None):
     language_module = language_module_map[language]
     norm_text = language_module.text_normalize(text)
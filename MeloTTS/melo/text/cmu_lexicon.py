@@ -0,0 +1,144 @@
+import os
+import sys
+import mmap
+import struct
+from array import array
+
+# Binary lexicon layout (native-endian uint32 arrays, every section 4-byte aligned):
+#   header       magic, version, byte-order mark, n_words, keys_len, n_phones, symbols_len
+#   key_offsets  uint32[n_words + 1] into keys
+#   keys         utf-8 words sorted by their bytes
+#   phone_offsets uint32[n_words + 1] into phones/tones
+#   phones       uint8[n_phones], indices into the symbol table
+#   tones        uint8[n_phones]
+#   symbols      newline separated phone symbols
+MAGIC = b"MLEX"
+VERSION = 1
+_BOM = 0x01020304
+_HEADER = struct.Struct("=4sIIIIII")
+
+
+def _pad(n):
+    return (4 - n % 4) % 4
+
+
+def build(entries, path):
+    """Write `entries` (word -> (phones, tones), already refined) to `path` atomically."""
+    words = sorted(entries, key=lambda w: w.encode("utf-8"))
+    symbols = sorted({p for phones, _ in entries.values() for p in phones})
+    if len(symbols) > 255:
+        raise ValueError(f"too many phone symbols for a uint8 table: {len(symbols)}")
+    symbol_ids = {s: i for i, s in enumerate(symbols)}
+
+    key_offsets, keys = array("I", [0]), bytearray()
+    phone_offsets, phones, tones = array("I", [0]), bytearray(), bytearray()
+    for word in words:
+        keys += word.encode("utf-8")
+        key_offsets.append(len(keys))
+        word_phones, word_tones = entries[word]
+        phones += bytes(symbol_ids[p] for p in word_phones)
+        tones += bytes(word_tones)
+        phone_offsets.append(len(phones))
+    symbol_blob = "\n".join(symbols).encode("utf-8")
+
+    header = _HEADER.pack(MAGIC, VERSION, _BOM, len(words), len(keys), len(phones), len(symbol_blob))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        for section in (header, key_offsets.tobytes(), bytes(keys), phone_offsets.tobytes(),
+                        bytes(phones), bytes(tones), symbol_blob):
+            f.write(section)
+            f.write(b"\0" * _pad(len(section)))
+    os.replace(tmp_path, path)
+
+
+class CmuLexicon:
+    """Read-only view of a lexicon written by `build`.
+
+    The file is memory-mapped, so forked workers share its pages instead of each holding a
+    copy of the dictionary. Lookups binary search the sorted keys and return ready-made
+    (phones, tones) lists.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mm)
+        magic, version, bom, n_words, keys_len, n_phones, symbols_len = _HEADER.unpack_from(buf)
+        if magic != MAGIC or version != VERSION or bom != _BOM:
+            raise ValueError(f"{path} is not a version {VERSION} lexicon for this platform")
+        self.n_words = n_words
+
+        offset = _HEADER.size + _pad(_HEADER.size)
+
+        def take(nbytes):
+            nonlocal offset
+            section = buf[offset:offset + nbytes]
+            offset += nbytes + _pad(nbytes)
+            return section
+
+        self._key_offsets = take(4 * (n_words + 1)).cast("I")
+        self._keys = take(keys_len)
+        self._phone_offsets = take(4 * (n_words + 1)).cast("I")
+        self._phones = take(n_phones)
+        self._tones = take(n_phones)
+        self._symbols = bytes(take(symbols_len)).decode("utf-8").split("\n")
+
+    def _key(self, i):
+        return bytes(self._keys[self._key_offsets[i]:self._key_offsets[i + 1]])
+
+    def index(self, word):
+        target = word.encode("utf-8")
+        lo, hi = 0, self.n_words
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_words and self._key(lo) == target:
+            return lo
+        return -1
+
+    def get(self, word, default=None):
+        i = self.index(word)
+        if i < 0:
+            return default
+        start, end = self._phone_offsets[i], self._phone_offsets[i + 1]
+        return [self._symbols[p] for p in self._phones[start:end]], list(self._tones[start:end])
+
+    def __contains__(self, word):
+        return self.index(word) >= 0
+
+    def __len__(self):
+        return self.n_words
+
+
+def _open_if_fresh(path, source_path):
+    """The lexicon at `path` if it is at least as new as `source_path` and readable, else None."""
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(source_path):
+            return CmuLexicon(path)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def load_or_build(path, source_path, read_entries):
+    """Open the lexicon at `path`, (re)building it from `read_entries()` when it is missing,
+    older than `source_path` or from another format version.
+
+    When `path` cannot be written (read-only install) the lexicon lives in the temp dir and is
+    reused from there by later processes."""
+    import tempfile
+    fallback = os.path.join(tempfile.gettempdir(), f"melo_{os.path.basename(path)}.{sys.byteorder}")
+    lexicon = _open_if_fresh(path, source_path) or _open_if_fresh(fallback, source_path)
+    if lexicon is not None:
+        return lexicon
+    entries = read_entries()
+    try:
+        build(entries, path)
+        return CmuLexicon(path)
+    except OSError:
+        # read-only install: keep a private copy in the temp dir instead
+        build(entries, fallback)
+        return CmuLexicon(fallback)
@@ -1,21 +1,23 @@
-import pickle
 import os
 import re
 from g2p_en import G2p
 
 from . import symbols
+from . import cmu_lexicon
 
 from .english_utils.abbreviations import expand_abbreviations
 from .english_utils.time_norm import expand_time_english
 from .english_utils.number_norm import normalize_numbers
-from .japanese import distribute_phone
 
-from transformers import AutoTokenizer
+from .tokenization import get_tokenizer, encode
+from .g2p_memo import get_memo
 
 current_file_path = os.path.dirname(__file__)
 CMU_DICT_PATH = os.path.join(current_file_path, "cmudict.rep")
-CACHE_PATH = os.path.join(current_file_path, "cmudict_cache.pickle")
+LEXICON_PATH = os.path.join(current_file_path, "cmudict_lexicon.bin")
 _g2p = G2p()
+# out-of-vocabulary words go through the g2p_en network; remember its answers
+_memo = get_memo('EN')
 
 arpa = {
     "AH0",
@@ -139,23 +141,13 @@ def read_dict():
     return g2p_dict
 
 
-def cache_dict(g2p_dict, file_path):
-    with open(file_path, "wb") as pickle_file:
-        pickle.dump(g2p_dict, pickle_file)
+def read_refined_dict():
+    return {word: refine_syllables(syllables) for word, syllables in read_dict().items()}
 
 
 def get_dict():
-    if os.path.exists(CACHE_PATH):
-        with open(CACHE_PATH, "rb") as pickle_file:
-            g2p_dict = pickle.load(pickle_file)
-    else:
-        g2p_dict = read_dict()
-        cache_dict(g2p_dict, CACHE_PATH)
-
-    return g2p_dict
-
-
-eng_dict = get_dict()
+    # memory-mapped lexicon of ready (phones, tones) per word, built from cmudict.rep on first use
+    return cmu_lexicon.load_or_build(LEXICON_PATH, CMU_DICT_PATH, read_refined_dict)
 
 
 def refine_ph(phn):
@@ -178,6 +170,18 @@ def refine_syllables(syllables):
     return phonemes, tones
 
 
+eng_dict = get_dict()
+
+
+def distribute_phone(n_phone, n_word):
+    phones_per_word = [0] * n_word
+    for task in range(n_phone):
+        min_tasks = min(phones_per_word)
+        min_index = phones_per_word.index(min_tasks)
+        phones_per_word[min_index] += 1
+    return phones_per_word
+
+
 def text_normalize(text):
     text = text.lower()
     text = expand_time_english(text)
@@ -186,7 +190,7 @@ def text_normalize(text):
     return text
 
 model_id = 'bert-base-uncased'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
+tokenizer = get_tokenizer(model_id)
 def g2p_old(text):
     tokenized = tokenizer.tokenize(text)
     # import pdb; pdb.set_trace()
@@ -194,8 +198,9 @@ def g2p_old(text):
     tones = []
     words = re.split(r"([,;.\-\?\!\s+])", text)
     for w in words:
-        if w.upper() in eng_dict:
-            phns, tns = refine_syllables(eng_dict[w.upper()])
+        entry = eng_dict.get(w.upper())
+        if entry is not None:
+            phns, tns = entry
             phones += phns
             tones += tns
         else:
@@ -216,7 +221,7 @@ def g2p_old(text):
 
 def g2p(text, pad_start_end=True, tokenized=None):
     if tokenized is None:
-        tokenized = tokenizer.tokenize(text)
+        tokenized = encode(text, model_id).tokens
     # import pdb; pdb.set_trace()
     phs = []
     ph_groups = []
@@ -233,13 +238,14 @@ def g2p(text, pad_start_end=True, tokenized=None):
         w = "".join(group)
         phone_len = 0
         word_len = len(group)
-        if w.upper() in eng_dict:
-            phns, tns = refine_syllables(eng_dict[w.upper()])
+        entry = eng_dict.get(w.upper())
+        if entry is not None:
+            phns, tns = entry
             phones += phns
             tones += tns
             phone_len += len(phns)
         else:
-            phone_list = list(filter(lambda p: p != " ", _g2p(w)))
+            phone_list = _memo.get_or_compute((w,), lambda: tuple(p for p in _g2p(w) if p != " "))
             for ph in phone_list:
                 if ph in arpa:
                     ph, tn = refine_ph(ph)
@@ -0,0 +1,114 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+
+class G2PMemo:
+    """Bounded, thread-safe LRU memo of word-level G2P results for one language.
+
+    Keys are tuples of the word plus whatever flags change its pronunciation; values must be
+    immutable (strings or tuples) since they are shared between callers.
+    """
+
+    def __init__(self, max_items=200000):
+        self.max_items = max_items
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute_fn):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return self._mem[key]
+        value = compute_fn()
+        with self._lock:
+            self.misses += 1
+            self._insert(key, value)
+        return value
+
+    def _insert(self, key, value):
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+    def save(self, path):
+        with self._lock:
+            items = list(self._mem.items())
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(items, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            items = pickle.load(f)
+        with self._lock:
+            for key, value in items:
+                self._insert(key, value)
+        return len(items)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._mem),
+            }
+
+
+_memos = {}
+_memos_lock = threading.Lock()
+
+
+def get_memo(language):
+    with _memos_lock:
+        if language not in _memos:
+            _memos[language] = G2PMemo()
+        return _memos[language]
+
+
+def stats():
+    with _memos_lock:
+        memos = dict(_memos)
+    return {language: memo.stats() for language, memo in memos.items()}
+
+
+def save(cache_dir):
+    """Write every language's memo to `<cache_dir>/<language>.pkl`."""
+    with _memos_lock:
+        memos = dict(_memos)
+    for language, memo in memos.items():
+        memo.save(os.path.join(cache_dir, f'{language}.pkl'))
+
+
+def load(cache_dir, languages=None):
+    """Load memos saved by `save`; returns the number of entries read per language."""
+    loaded = {}
+    for name in sorted(os.listdir(cache_dir)):
+        language, ext = os.path.splitext(name)
+        if ext != '.pkl' or (languages is not None and language not in languages):
+            continue
+        loaded[language] = get_memo(language).load(os.path.join(cache_dir, name))
+    return loaded
+
+
+def warm(language, texts):
+    """Run the front-end over `texts` so the words they contain are memoized."""
+    from .cleaner import clean_text
+
+    for text in texts:
+        clean_text(text, language)
+    return get_memo(language).stats()
@@ -3,7 +3,8 @@
 import re
 import unicodedata
 
-from transformers import AutoTokenizer
+from .tokenization import get_tokenizer, encode
+from .g2p_memo import get_memo
 
 from . import symbols
 punctuation = ["!", "?", "…", ",", ".", "'", "-"]
@@ -328,6 +329,7 @@ def _makerulemap():
 
 
 _RULEMAP1, _RULEMAP2 = _makerulemap()
+_memo = get_memo('JP')
 
 
 def kata2phoneme(text: str) -> str:
@@ -567,10 +569,11 @@ def distribute_phone(n_phone, n_word):
 # tokenizer = AutoTokenizer.from_pretrained('cl-tohoku/bert-base-japanese-v3')
 
 model_id = 'tohoku-nlp/bert-base-japanese-v3'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
-def g2p(norm_text):
+tokenizer = get_tokenizer(model_id)
+def g2p(norm_text, tokenized=None):
 
-    tokenized = tokenizer.tokenize(norm_text)
+    if tokenized is None:
+        tokenized = encode(norm_text, model_id).tokens
     phs = []
     ph_groups = []
     for t in tokenized:
@@ -593,7 +596,7 @@ def g2p(norm_text):
             continue
         # import pdb; pdb.set_trace()
         # phonemes = japanese_text_to_phonemes(text)
-        phonemes = kata2phoneme(text)
+        phonemes = list(_memo.get_or_compute((text,), lambda: tuple(kata2phoneme(text))))
         # phonemes = [i for i in phonemes if i in symbols]
         for i in phonemes:
             assert i in symbols, (group, norm_text, tokenized, i)
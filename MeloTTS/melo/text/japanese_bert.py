@@ -1,13 +1,14 @@
 import torch
-from transformers import AutoTokenizer, AutoModelForMaskedLM
+from transformers import AutoModelForMaskedLM
 import sys
 
+from .tokenization import encode_batch
+
 
 models = {}
-tokenizers = {}
-def get_bert_feature(text, word2ph, device=None, model_id='tohoku-nlp/bert-base-japanese-v3'):
+def get_bert_features_batch(texts, word2phs, device=None, model_id='tohoku-nlp/bert-base-japanese-v3', encodings=None):
+    """Phone-level features for several sentences with a single padded forward pass."""
     global model
-    global tokenizer
 
     if (
         sys.platform == "darwin"
@@ -22,28 +23,25 @@ def get_bert_feature(text, word2ph, device=None, model_id='tohoku-nlp/bert-base-
             device
         )
         models[model_id] = model
-        tokenizer = AutoTokenizer.from_pretrained(model_id)
-        tokenizers[model_id] = tokenizer
     else:
         model = models[model_id]
-        tokenizer = tokenizers[model_id]
 
 
     with torch.no_grad():
-        inputs = tokenizer(text, return_tensors="pt")
-        tokenized = tokenizer.tokenize(text)
+        inputs = encode_batch(texts, model_id, encodings)
         for i in inputs:
             inputs[i] = inputs[i].to(device)
         res = model(**inputs, output_hidden_states=True)
-        res = torch.cat(res["hidden_states"][-3:-2], -1)[0].cpu()
+        res = torch.cat(res["hidden_states"][-3:-2], -1).cpu()
 
-    assert inputs["input_ids"].shape[-1] == len(word2ph), f"{inputs['input_ids'].shape[-1]}/{len(word2ph)}"
-    word2phone = word2ph
-    phone_level_feature = []
-    for i in range(len(word2phone)):
-        repeat_feature = res[i].repeat(word2phone[i], 1)
-        phone_level_feature.append(repeat_feature)
+    lengths = inputs["attention_mask"].sum(-1).tolist()
+    phone_level_features = []
+    for i, word2ph in enumerate(word2phs):
+        assert lengths[i] == len(word2ph), f"{lengths[i]}/{len(word2ph)}"
+        repeats = torch.tensor(word2ph, dtype=torch.long)
+        phone_level_features.append(res[i, :lengths[i]].repeat_interleave(repeats, dim=0).T)
+    return phone_level_features
 
-    phone_level_feature = torch.cat(phone_level_feature, dim=0)
 
-    return phone_level_feature.T
+def get_bert_feature(text, word2ph, device=None, model_id='tohoku-nlp/bert-base-japanese-v3'):
+    return get_bert_features_batch([text], [word2ph], device=device, model_id=model_id)[0]
@@ -3,7 +3,8 @@
 import re
 import unicodedata
 
-from transformers import AutoTokenizer
+from .tokenization import get_tokenizer, encode
+from .g2p_memo import get_memo
 
 from . import punctuation, symbols
 
@@ -41,6 +42,7 @@ def normalize_english(text):
 
 
 g2p_kr = None
+_memo = get_memo('KR')
 def korean_text_to_phonemes(text, character: str = "hangeul") -> str:
     """
 
@@ -92,10 +94,11 @@ def distribute_phone(n_phone, n_word):
 # tokenizer = AutoTokenizer.from_pretrained('cl-tohoku/bert-base-japanese-v3')
 
 model_id = 'kykim/bert-kor-base'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
+tokenizer = get_tokenizer(model_id)
 
-def g2p(norm_text):
-    tokenized = tokenizer.tokenize(norm_text)
+def g2p(norm_text, tokenized=None):
+    if tokenized is None:
+        tokenized = encode(norm_text, model_id).tokens
     phs = []
     ph_groups = []
     for t in tokenized:
@@ -119,7 +122,7 @@ def g2p(norm_text):
         # import pdb; pdb.set_trace()
         # phonemes = japanese_text_to_phonemes(text)
         # text = g2p_kr(text)
-        phonemes = korean_text_to_phonemes(text)
+        phonemes = _memo.get_or_compute((text, 'hangeul'), lambda: korean_text_to_phonemes(text))
         # import pdb; pdb.set_trace()
         # # phonemes = [i for i in phonemes if i in symbols]
         # for i in phonemes:
@@ -1,12 +1,14 @@
 import torch
-from transformers import AutoTokenizer, AutoModelForMaskedLM
+from transformers import AutoModelForMaskedLM
 import sys
 
+from .tokenization import encode_batch
+
 model_id = 'dccuchile/bert-base-spanish-wwm-uncased'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
 model = None
 
-def get_bert_feature(text, word2ph, device=None):
+def get_bert_features_batch(texts, word2phs, device=None, encodings=None):
+    """Phone-level features for several sentences with a single padded forward pass."""
     global model
     if (
         sys.platform == "darwin"
@@ -21,19 +23,20 @@ def get_bert_feature(text, word2ph, device=None):
             device
         )
     with torch.no_grad():
-        inputs = tokenizer(text, return_tensors="pt")
+        inputs = encode_batch(texts, model_id, encodings)
         for i in inputs:
             inputs[i] = inputs[i].to(device)
         res = model(**inputs, output_hidden_states=True)
-        res = torch.cat(res["hidden_states"][-3:-2], -1)[0].cpu()
-        
-    assert inputs["input_ids"].shape[-1] == len(word2ph)
-    word2phone = word2ph
-    phone_level_feature = []
-    for i in range(len(word2phone)):
-        repeat_feature = res[i].repeat(word2phone[i], 1)
-        phone_level_feature.append(repeat_feature)
+        res = torch.cat(res["hidden_states"][-3:-2], -1).cpu()
 
-    phone_level_feature = torch.cat(phone_level_feature, dim=0)
+    lengths = inputs["attention_mask"].sum(-1).tolist()
+    phone_level_features = []
+    for i, word2ph in enumerate(word2phs):
+        assert lengths[i] == len(word2ph)
+        repeats = torch.tensor(word2ph, dtype=torch.long)
+        phone_level_features.append(res[i, :lengths[i]].repeat_interleave(repeats, dim=0).T)
+    return phone_level_features
 
-    return phone_level_feature.T
+
+def get_bert_feature(text, word2ph, device=None):
+    return get_bert_features_batch([text], [word2ph], device=device)[0]
@@ -0,0 +1,67 @@
+import threading
+from collections import namedtuple
+
+import torch
+from transformers import AutoTokenizer
+
+# one tokenizer per model id for the whole process, shared by the g2p front-ends and the BERT modules
+_tokenizers = {}
+_lock = threading.Lock()
+
+# `tokens` is what `tokenizer.tokenize(text)` returns; `input_ids` and `token_type_ids` include
+# [CLS]/[SEP]; `offsets` are the character spans of `input_ids` in the text (None for slow tokenizers)
+Encoding = namedtuple('Encoding', ['tokens', 'input_ids', 'token_type_ids', 'offsets'])
+
+
+def get_tokenizer(model_id):
+    with _lock:
+        if model_id not in _tokenizers:
+            _tokenizers[model_id] = AutoTokenizer.from_pretrained(model_id)
+        return _tokenizers[model_id]
+
+
+def encode(text, model_id):
+    """Tokenize `text` in a single pass and return its `Encoding`.
+
+    g2p needs the tokens and BERT the ids of the same normalized text; callers that run both
+    (see `cleaner.clean_text_encoded`) keep the encoding and hand it to `encode_batch`.
+    """
+    tokenizer = get_tokenizer(model_id)
+    if not tokenizer.is_fast:
+        # python tokenizers (e.g. the Japanese BERT's) cannot report offsets
+        tokens = tokenizer.tokenize(text)
+        ids = tokenizer.convert_tokens_to_ids(tokens)
+        return Encoding(
+            tokens,
+            tokenizer.build_inputs_with_special_tokens(ids),
+            tokenizer.create_token_type_ids_from_sequences(ids),
+            None,
+        )
+    encoding = tokenizer(text, return_offsets_mapping=True)
+    return Encoding(
+        encoding.tokens()[1:-1],
+        encoding["input_ids"],
+        encoding.get("token_type_ids") or [0] * len(encoding["input_ids"]),
+        encoding["offset_mapping"],
+    )
+
+
+def encode_batch(texts, model_id, encodings=None):
+    """Right-padded `input_ids`/`token_type_ids`/`attention_mask` tensors for `texts`.
+
+    `encodings` holds `encode` results for the texts that were already tokenized (None for the
+    others); only the rest are tokenized here.
+    """
+    if encodings is None:
+        encodings = [None] * len(texts)
+    encodings = [encode(text, model_id) if e is None else e for text, e in zip(texts, encodings)]
+    pad_id = get_tokenizer(model_id).pad_token_id or 0
+    max_len = max(len(e.input_ids) for e in encodings)
+    input_ids = torch.full((len(encodings), max_len), pad_id, dtype=torch.long)
+    token_type_ids = torch.zeros((len(encodings), max_len), dtype=torch.long)
+    attention_mask = torch.zeros((len(encodings), max_len), dtype=torch.long)
+    for i, e in enumerate(encodings):
+        input_ids[i, : len(e.input_ids)] = torch.tensor(e.input_ids, dtype=torch.long)
+        token_type_ids[i, : len(e.token_type_ids)] = torch.tensor(e.token_type_ids, dtype=torch.long)
+        attention_mask[i, : len(e.input_ids)] = 1
+    return {"input_ids": input_ids, "token_type_ids": token_type_ids, "attention_mask": attention_mask}
@@ -17,6 +17,7 @@ import utils
 from data_utils import (
     TextAudioSpeakerLoader,
     TextAudioSpeakerCollate,
+    build_dataset,
     DistributedBucketSampler,
 )
 from models import (
@@ -66,7 +67,11 @@ def run():
         utils.check_git_hash(hps.model_dir)
         writer = SummaryWriter(log_dir=hps.model_dir)
         writer_eval = SummaryWriter(log_dir=os.path.join(hps.model_dir, "eval"))
-    train_dataset = TextAudioSpeakerLoader(hps.data.training_files, hps.data)
+    train_dataset = build_dataset(hps.data.training_files, hps.data)
+    if getattr(hps.data, "precompute_spec", False) and isinstance(train_dataset, TextAudioSpeakerLoader):
+        if rank == 0:
+            train_dataset.precompute_specs()
+        dist.barrier()
     train_sampler = DistributedBucketSampler(
         train_dataset,
         hps.train.batch_size,
@@ -9,8 +9,8 @@ from scipy.io.wavfile import read
 import torch
 import torchaudio
 import librosa
-from melo.text import cleaned_text_to_sequence, get_bert
-from melo.text.cleaner import clean_text
+from melo.text import cleaned_text_to_sequence, get_bert, get_bert_batch
+from melo.text.cleaner import clean_text_encoded
 from melo import commons
 
 MATPLOTLIB_FLAG = False
@@ -19,8 +19,8 @@ logger = logging.getLogger(__name__)
 
 
 
-def get_text_for_tts_infer(text, language_str, hps, device, symbol_to_id=None):
-    norm_text, phone, tone, word2ph = clean_text(text, language_str)
+def _get_text_phones(text, language_str, hps, symbol_to_id=None):
+    norm_text, phone, tone, word2ph, encoding = clean_text_encoded(text, language_str)
     phone, tone, language = cleaned_text_to_sequence(phone, tone, language_str, symbol_to_id)
 
     if hps.data.add_blank:
@@ -30,23 +30,20 @@ def get_text_for_tts_infer(text, language_str, hps, device, symbol_to_id=None):
         for i in range(len(word2ph)):
             word2ph[i] = word2ph[i] * 2
         word2ph[0] += 1
+    return norm_text, phone, tone, language, word2ph, encoding
 
-    if getattr(hps.data, "disable_bert", False):
-        bert = torch.zeros(1024, len(phone))
+
+def _split_bert(bert, phone, tone, language, language_str):
+    assert bert.shape[-1] == len(phone), phone
+
+    if language_str == "ZH":
+        bert = bert
         ja_bert = torch.zeros(768, len(phone))
+    elif language_str in ["JP", "EN", "ZH_MIX_EN", 'KR', 'SP', 'ES', 'FR', 'DE', 'RU']:
+        ja_bert = bert
+        bert = torch.zeros(1024, len(phone))
     else:
-        bert = get_bert(norm_text, word2ph, language_str, device)
-        del word2ph
-        assert bert.shape[-1] == len(phone), phone
-
-        if language_str == "ZH":
-            bert = bert
-            ja_bert = torch.zeros(768, len(phone))
-        elif language_str in ["JP", "EN", "ZH_MIX_EN", 'KR', 'SP', 'ES', 'FR', 'DE', 'RU']:
-            ja_bert = bert
-            bert = torch.zeros(1024, len(phone))
-        else:
-            raise NotImplementedError()
+        raise NotImplementedError()
 
     assert bert.shape[-1] == len(
         phone
@@ -57,6 +54,43 @@ def get_text_for_tts_infer(text, language_str, hps, device, symbol_to_id=None):
     language = torch.LongTensor(language)
     return bert, ja_bert, phone, tone, language
 
+
+def get_text_for_tts_infer(text, language_str, hps, device, symbol_to_id=None):
+    norm_text, phone, tone, language, word2ph, encoding = _get_text_phones(text, language_str, hps, symbol_to_id)
+
+    if getattr(hps.data, "disable_bert", False):
+        bert = torch.zeros(1024, len(phone))
+        ja_bert = torch.zeros(768, len(phone))
+        return bert, ja_bert, torch.LongTensor(phone), torch.LongTensor(tone), torch.LongTensor(language)
+
+    bert = get_bert(norm_text, word2ph, language_str, device, encoding=encoding)
+    del word2ph
+    return _split_bert(bert, phone, tone, language, language_str)
+
+
+def get_text_for_tts_infer_batch(texts, language_str, hps, device, symbol_to_id=None):
+    """Same as `get_text_for_tts_infer` for a list of sentences, with a single batched BERT pass."""
+    prepared = [_get_text_phones(text, language_str, hps, symbol_to_id) for text in texts]
+
+    if getattr(hps.data, "disable_bert", False):
+        return [
+            (torch.zeros(1024, len(phone)), torch.zeros(768, len(phone)),
+             torch.LongTensor(phone), torch.LongTensor(tone), torch.LongTensor(language))
+            for _, phone, tone, language, _, _ in prepared
+        ]
+
+    berts = get_bert_batch(
+        [norm_text for norm_text, _, _, _, _, _ in prepared],
+        [word2ph for _, _, _, _, word2ph, _ in prepared],
+        language_str,
+        device,
+        encodings=[encoding for _, _, _, _, _, encoding in prepared],
+    )
+    return [
+        _split_bert(bert, phone, tone, language, language_str)
+        for bert, (_, phone, tone, language, _, _) in zip(berts, prepared)
+    ]
+
 def load_checkpoint(checkpoint_path, model, optimizer=None, skip_optimizer=False):
     assert os.path.isfile(checkpoint_path)
     checkpoint_dict = torch.load(checkpoint_path, map_location="cpu")
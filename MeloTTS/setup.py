@@ -35,6 +35,8 @@ setup(
             "melotts = melo.main:main",
             "melo = melo.main:main",
             "melo-ui = melo.app:main",
+            "melo-server = melo.server:main",
+            "melo-export-onnx = melo.export_onnx:main",
         ],
     },
 )
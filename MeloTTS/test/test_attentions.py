@@ -0,0 +1,23 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from melo.attentions import MultiHeadAttention
+
+
+@pytest.mark.parametrize("heads_share", [True, False])
+@pytest.mark.parametrize("length", [1, 3, 5, 6, 37, 120])
+def test_cached_relative_attention_matches_reference(length, heads_share):
+    torch.manual_seed(0)
+    attn = MultiHeadAttention(192, 192, 2, p_dropout=0.1, window_size=4, heads_share=heads_share).eval()
+    x = torch.randn(2, 192, length)
+    x_mask = torch.ones(2, 1, length)
+    x_mask[1, :, (length + 1) // 2:] = 0
+    attn_mask = x_mask.unsqueeze(2) * x_mask.unsqueeze(-1)
+
+    with torch.no_grad():
+        attn.use_cached_relative = False
+        ref = attn(x, x, attn_mask)
+        attn.use_cached_relative = True
+        out = attn(x, x, attn_mask)
+    assert torch.allclose(ref, out, atol=1e-5)
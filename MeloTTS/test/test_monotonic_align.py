@@ -0,0 +1,45 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("numba")
+
+from melo.monotonic_align import maximum_path
+
+
+def random_batch(b=6, t_t_max=120, t_s_max=40, seed=0, square=False):
+    g = torch.Generator().manual_seed(seed)
+    t_s = torch.randint(5, t_s_max + 1, (b,), generator=g)
+    # MAS needs at least one frame per text position
+    t_t = torch.stack([torch.randint(int(s), t_t_max + 1, (1,), generator=g)[0] for s in t_s])
+    t_s[0], t_t[0] = t_s_max, t_t_max
+    # one frame per text position leaves a single (diagonal) path
+    t_t[1] = t_s[1]
+    if square:
+        t_t = t_s.clone()
+        t_t_max = t_s_max
+    neg_cent = torch.randn(b, t_t_max, t_s_max, generator=g) * 10
+    x_mask = (torch.arange(t_s_max)[None] < t_s[:, None]).float()
+    y_mask = (torch.arange(t_t_max)[None] < t_t[:, None]).float()
+    mask = y_mask.unsqueeze(-1) * x_mask.unsqueeze(1)
+    return neg_cent, mask
+
+
+@pytest.mark.parametrize("backend", ["numba", "torch"])
+@pytest.mark.parametrize("seed", [0, 1, 2, 3, 4])
+def test_backends_match_serial(backend, seed):
+    neg_cent, mask = random_batch(seed=seed)
+    ref = maximum_path(neg_cent, mask, backend="numba_serial")
+    out = maximum_path(neg_cent, mask, backend=backend)
+    assert torch.equal(ref, out)
+    # every frame is aligned to exactly one text position
+    assert torch.equal(out.sum(-1), mask[:, :, 0])
+
+
+@pytest.mark.parametrize("backend", ["numba_serial", "numba", "torch"])
+def test_square_alignment_is_diagonal(backend):
+    neg_cent, mask = random_batch(seed=5, square=True)
+    out = maximum_path(neg_cent, mask, backend=backend)
+    t_s = mask[:, 0].sum(-1).long()
+    for i, n in enumerate(t_s.tolist()):
+        assert torch.equal(out[i, :n, :n], torch.eye(n))
+        assert out[i].sum() == n
@@ -0,0 +1,43 @@
+import os
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+
+from melo import utils
+from melo.models import SynthesizerTrn
+from melo.text.symbols import symbols, num_tones, num_languages
+from melo.export_onnx import export
+from melo.onnx_backend import OnnxSynthesizer
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'melo', 'configs', 'config.json')
+
+
+def test_onnx_matches_eager_infer(tmp_path):
+    torch.manual_seed(0)
+    hps = utils.get_hparams_from_file(CONFIG_PATH)
+    model = SynthesizerTrn(
+        len(symbols),
+        hps.data.filter_length // 2 + 1,
+        hps.train.segment_size // hps.data.hop_length,
+        n_speakers=hps.data.n_speakers,
+        num_tones=num_tones,
+        num_languages=num_languages,
+        **hps.model,
+    ).eval()
+    export(model, str(tmp_path))
+
+    t = 30
+    x = torch.randint(1, len(symbols), (1, t))
+    inputs = (x, torch.LongTensor([t]), torch.LongTensor([3]), torch.zeros_like(x), torch.zeros_like(x),
+              torch.randn(1, 1024, t), torch.randn(1, 768, t))
+    # with both noise scales at zero the eager path is deterministic
+    kwargs = dict(noise_scale=0., noise_scale_w=0., sdp_ratio=0.2, length_scale=1.)
+    with torch.no_grad():
+        ref, _, ref_mask, _ = model.infer(*inputs, **kwargs)
+    out, _, out_mask, _ = OnnxSynthesizer(str(tmp_path)).infer(*inputs, **kwargs)
+
+    assert out_mask.shape == ref_mask.shape
+    assert out.shape == ref.shape
+    assert torch.allclose(out, ref, atol=1e-3)
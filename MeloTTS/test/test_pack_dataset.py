@@ -0,0 +1,82 @@
+import os
+import sys
+
+import pytest
+
+torch = pytest.importorskip("torch")
+np = pytest.importorskip("numpy")
+
+# data_utils and pack_dataset are scripts run from melo/ and import their siblings top-level
+MELO_DIR = os.path.join(os.path.dirname(__file__), '..', 'melo')
+sys.path.insert(0, os.path.abspath(MELO_DIR))
+
+import data_utils
+import pack_dataset
+from melo import utils
+
+CONFIG_PATH = os.path.join(MELO_DIR, 'configs', 'config.json')
+BERT_DIM, JA_BERT_DIM = 16, 8
+
+
+class FakeDataset(torch.utils.data.Dataset):
+    """Items shaped like TextAudioSpeakerLoader's, with small BERT widths."""
+
+    def __init__(self, hparams, num_items=5):
+        self.hparams = hparams
+        g = torch.Generator().manual_seed(0)
+        channels = hparams.filter_length // 2 + 1
+        self.items = []
+        for i in range(num_items):
+            text_len, frames = 3 + i, 10 + 2 * i
+            bert = torch.zeros(BERT_DIM, text_len)
+            ja_bert = torch.zeros(JA_BERT_DIM, text_len)
+            # one item per bert kind: chinese, other languages, none
+            if i % 3 == 0:
+                bert = torch.randn(BERT_DIM, text_len, generator=g)
+            elif i % 3 == 1:
+                ja_bert = torch.randn(JA_BERT_DIM, text_len, generator=g)
+            self.items.append((
+                torch.randint(0, 100, (text_len,), generator=g),
+                torch.randn(channels, frames, generator=g),
+                torch.randn(1, frames * hparams.hop_length, generator=g),
+                torch.LongTensor([i % 2]),
+                torch.randint(0, 10, (text_len,), generator=g),
+                torch.randint(0, 5, (text_len,), generator=g),
+                bert,
+                ja_bert,
+            ))
+
+    def spec_cache_params(self):
+        return data_utils.spec_params(self.hparams)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __len__(self):
+        return len(self.items)
+
+
+def test_pack_round_trip(tmp_path):
+    hps = utils.get_hparams_from_file(CONFIG_PATH)
+    dataset = FakeDataset(hps.data)
+    # a tiny shard size puts every item in its own shard
+    meta = pack_dataset.pack(dataset, str(tmp_path), 'filelist.txt', shard_size_mb=1e-6, num_workers=0)
+    assert meta['num_items'] == len(dataset) and meta['num_shards'] == len(dataset)
+
+    packed = data_utils.build_dataset(str(tmp_path), hps.data)
+    assert isinstance(packed, data_utils.PackedTextAudioSpeakerLoader)
+    assert len(packed) == len(dataset)
+    assert packed.lengths == [item[1].size(1) for item in dataset.items]
+    for expected, actual in zip(dataset.items, packed):
+        assert len(actual) == len(expected)
+        for e, a in zip(expected, actual):
+            assert a.shape == e.shape
+            assert torch.equal(a.to(e.dtype), e)
+
+
+def test_pack_rejects_other_spec_params(tmp_path):
+    hps = utils.get_hparams_from_file(CONFIG_PATH)
+    pack_dataset.pack(FakeDataset(hps.data, num_items=1), str(tmp_path), 'filelist.txt', num_workers=0)
+    hps.data.win_length = hps.data.win_length // 2
+    with pytest.raises(ValueError, match="spectrogram parameters"):
+        data_utils.PackedTextAudioSpeakerLoader(str(tmp_path), hps.data)
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+torch = pytest.importorskip("torch")
+np = pytest.importorskip("numpy")
+
+from melo import server
+from melo.api import TTS
+from melo.server import ModelRegistry, TTSServer, model_memory_bytes
+from melo.utils import HParams
+
+
+class StubTTS:
+    """Stands in for `TTS`: a small module for the memory accounting and a fake synthesizer whose
+    output has one sample per character, valued at the speaker id."""
+
+    def __init__(self, language, device, use_hf, config_path, ckpt_path):
+        self.language = language
+        self.model = torch.nn.Linear(256, 256)
+        self.hps = HParams(data={'spk2id': {'A': 0, 'B': 1}, 'sampling_rate': 100})
+        self.batches = []
+
+    @staticmethod
+    def split_sentences_into_pieces(text, language, quiet=False):
+        return text.split('|')
+
+    def get_text_inputs_batch(self, texts):
+        return [(None, None, torch.zeros(len(t)), None, None) for t in texts]
+
+    length_buckets = staticmethod(TTS.length_buckets)
+
+    def infer_batch(self, batch, speaker_id, sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8, speed=1.0):
+        self.batches.append(len(batch))
+        return [np.full(phones.size(0), speaker_id, dtype=np.float32) for _, _, phones, _, _ in batch]
+
+
+MODEL_MB = model_memory_bytes(torch.nn.Linear(256, 256)) / 1024 / 1024
+
+
+def make_registry(memory_budget_mb=None):
+    return ModelRegistry(device='cpu', memory_budget_mb=memory_budget_mb, tts_class=StubTTS)
+
+
+def use(registry, language):
+    registry.acquire(language)
+    registry.release(language)
+
+
+def test_registry_evicts_least_recently_used():
+    registry = make_registry(memory_budget_mb=2.5 * MODEL_MB)
+    use(registry, 'EN')
+    use(registry, 'FR')
+    use(registry, 'EN')
+    use(registry, 'SP')
+    stats = registry.stats()
+    assert stats['loaded'] == ['EN', 'SP']
+    assert stats['loads'] == 3 and stats['evictions'] == 1
+    # reloading an evicted language counts as a new load
+    use(registry, 'FR')
+    assert registry.stats()['loaded'] == ['SP', 'FR']
+    assert registry.stats()['loads'] == 4
+
+
+def test_registry_keeps_models_in_use():
+    registry = make_registry(memory_budget_mb=1.5 * MODEL_MB)
+    registry.acquire('EN')
+    registry.acquire('FR')
+    assert registry.stats()['loaded'] == ['EN', 'FR']
+    registry.release('EN')
+    assert registry.stats()['loaded'] == ['FR']
+    registry.release('FR')
+
+
+def test_registry_counts_shared_bert_once(monkeypatch):
+    bert = torch.nn.Linear(512, 512)
+    monkeypatch.setattr(server, 'bert_encoder', lambda language: bert if language in ('SP', 'ES') else None)
+    registry = make_registry()
+    use(registry, 'SP')
+    use(registry, 'ES')
+    use(registry, 'EN')
+    expected = 3 * model_memory_bytes(StubTTS('EN', 'cpu', True, None, None).model) + model_memory_bytes(bert)
+    assert registry.memory_bytes() == expected
+
+
+def test_registry_budget_includes_bert(monkeypatch):
+    bert = torch.nn.Linear(512, 512)
+    monkeypatch.setattr(server, 'bert_encoder', lambda language: bert)
+    registry = make_registry(memory_budget_mb=MODEL_MB + model_memory_bytes(bert) / 1024 / 1024 + 0.01)
+    use(registry, 'EN')
+    assert registry.stats()['loaded'] == ['EN']
+    # FR's model alone would fit next to EN's; its own BERT encoder does not
+    use(registry, 'FR')
+    assert registry.stats()['loaded'] == ['FR']
+
+
+def run_requests(requests, **kwargs):
+    tts_server = TTSServer(make_registry(), **kwargs)
+
+    async def main():
+        return await asyncio.gather(*(tts_server.synthesize(r) for r in requests), return_exceptions=True)
+
+    results = asyncio.run(main())
+    return tts_server, results
+
+
+def test_worker_micro_batches_requests():
+    requests = [{'text': 'ab|cde', 'speaker': 'B'}, {'text': 'f'}, {'text': 'gh', 'speaker': 'B'}, {'text': 'ijk'}]
+    tts_server, results = run_requests(requests, max_batch_size=8, max_wait_ms=50)
+    tts = tts_server.registry.acquire('EN')
+    # one group per speaker, each synthesized as a single batch
+    assert sorted(tts.batches) == [2, 3]
+    gap = int(100 * 0.05)
+    for request, (audio, sr) in zip(requests, results):
+        pieces = request['text'].split('|')
+        assert sr == 100
+        assert len(audio) == sum(len(p) for p in pieces) + gap * len(pieces)
+        assert audio[0] == (1 if request.get('speaker') == 'B' else 0)
+
+
+def test_worker_fails_only_bad_requests():
+    requests = [{'text': 'ok'}, {'text': 'bad', 'speaker': ['A']}, {'text': 'who', 'speaker': 'C'}, {'text': 'fine'}]
+    _, results = run_requests(requests, max_wait_ms=50)
+    assert len(results[0][0]) == 2 + 5 and len(results[3][0]) == 4 + 5
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[2], ValueError) and "['A', 'B']" in str(results[2])
+
+
+@pytest.fixture
+def http_server():
+    tts_server = TTSServer(make_registry(), max_wait_ms=1)
+    httpd = tts_server.make_http_server('127.0.0.1', 0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+    tts_server.loop.call_soon_threadsafe(tts_server.loop.stop)
+
+
+def post(url, payload):
+    request = urllib.request.Request(url + '/tts', data=json.dumps(payload).encode(), method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers['Content-Type'], response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers['Content-Type'], e.read()
+
+
+def test_http_synthesizes_wav_and_raw(http_server):
+    status, content_type, body = post(http_server, {'text': 'abc', 'speaker': 'B'})
+    assert status == 200 and content_type == 'audio/wav'
+    assert body[:4] == b'RIFF' and len(body) == 44 + 2 * (3 + 5)
+    status, content_type, body = post(http_server, {'text': 'abc', 'format': 'raw'})
+    assert status == 200 and content_type == 'application/octet-stream'
+    assert len(body) == 2 * (3 + 5)
+    with urllib.request.urlopen(http_server + '/models') as response:
+        assert json.loads(response.read())['loaded'] == ['EN']
+
+
+def test_http_rejects_bad_requests(http_server):
+    status, _, body = post(http_server, {'text': 'abc', 'speaker': 'nobody'})
+    assert status == 400 and "['A', 'B']" in json.loads(body)['error']
+    status, _, _ = post(http_server, {'speaker': 'A'})
+    assert status == 400
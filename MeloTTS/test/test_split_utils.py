@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip("torchaudio")
+pytest.importorskip("soundfile")
+
+from melo.split_utils import estimate_phones, split_sentence_by_phones
+
+
+def test_estimate_phones_scales_with_script():
+    assert estimate_phones('', 'EN') == 0
+    assert estimate_phones('hello world', 'EN') == 9
+    # one han character is an initial and a final in Chinese, about two morae in Japanese
+    assert estimate_phones('你好', 'ZH') == 4
+    assert estimate_phones('日本', 'JP') == 7
+    assert estimate_phones('안녕', 'KR') == 5
+
+
+def test_split_by_phones_respects_window():
+    text = 'One two three, four five six. Seven eight, nine ten eleven twelve. Thirteen.'
+    count = lambda clause, language: len(clause.split())
+    segments, counts = split_sentence_by_phones(text, 'EN', min_phones=3, max_phones=5, count_fn=count)
+    assert counts == [count(s, 'EN') for s in segments]
+    assert all(c <= 5 for c in counts)
+    # nothing is dropped or reordered
+    assert ' '.join(segments).split() == text.split()
@@ -161,3 +161,31 @@ def revert_audio_delay(
     result_BxTxC = torch.where(t_idx_BxTxC >= T_tensor, pad_tensor, gathered_BxTxC)  # Changed np.where to torch.where
 
     return result_BxTxC
+
+
+def revert_audio_delay_window(
+    audio_TxC: torch.Tensor,
+    delay_pattern: tp.List[int],
+    start: int,
+    end: int,
+) -> torch.Tensor:
+    """
+    Reverts the delay pattern for frames [start, end) of a single delayed sequence,
+    i.e. out[t - start, c] = in[t + delay[c], c].
+
+    Only rows up to `end + max(delay_pattern) - 1` of the input are read, so frames can be
+    recovered while later steps are still being generated.
+
+    Args:
+        audio_TxC: [T, C] delayed audio tokens
+        delay_pattern: per-channel delays
+        start, end: frame range to recover
+
+    Returns:
+        [end - start, C] reverted audio tokens
+    """
+    device = audio_TxC.device
+    delay_arr = torch.tensor(delay_pattern, dtype=torch.long, device=device)
+    t_idx_TxC = torch.arange(start, end, device=device).unsqueeze(1) + delay_arr.unsqueeze(0)
+    c_idx_TxC = torch.arange(audio_TxC.shape[1], device=device).unsqueeze(0).expand_as(t_idx_TxC)
+    return audio_TxC[t_idx_TxC, c_idx_TxC]
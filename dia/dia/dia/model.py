@@ -1,4 +1,6 @@
 import time
+from collections import OrderedDict, deque
+from collections.abc import Iterator
 from enum import Enum
 
 import numpy as np
@@ -6,14 +8,23 @@ import torch
 import torchaudio
 
 # Assuming these imports are relative to the package structure
-from .audio import apply_audio_delay, build_delay_indices, build_revert_indices, revert_audio_delay
+from .audio import (
+    apply_audio_delay,
+    build_delay_indices,
+    build_revert_indices,
+    revert_audio_delay,
+    revert_audio_delay_window,
+)
 from .config import DiaConfig
 from .layers import DiaModel
-from .state import DecoderInferenceState, DecoderOutput, EncoderInferenceState
+from .prompt_cache import PromptCache, file_hash, tensor_hash
+from .state import DecoderInferenceState, DecoderOutput, EncoderInferenceState, KVCachePool
 
 
 DEFAULT_SAMPLE_RATE = 44100
 SAMPLE_RATE_RATIO = 512
+# decoder self-attention caches grow by this many steps at a time (about 3 s of audio)
+DEFAULT_KV_GROWTH_STEP = 256
 
 
 def _get_default_device():
@@ -116,6 +127,15 @@ class Dia:
         self.dac_model = None
         self._compiled_step = None
         self.load_dac = load_dac
+        # growable decoder KV caches; set kv_growth_step to None to allocate max_tokens up front
+        self.kv_growth_step = DEFAULT_KV_GROWTH_STEP
+        self.kv_cache_pool = KVCachePool()
+        # DAC codes of prompt files; replace with PromptCache(cache_dir, max_kv_entries) to persist
+        # them or to also reuse the decoder prefill
+        self.prompt_cache: PromptCache | None = PromptCache()
+        # unconditional (CFG) encoder outputs by text padding mask; 0 disables sharing
+        self.uncond_cache_size = 16
+        self._uncond_enc_cache: OrderedDict[str, torch.Tensor] = OrderedDict()
 
         if not self.load_dac:
             print("Warning: DAC model will not be loaded. This is not recommended.")
@@ -340,6 +360,9 @@ class Dia:
         text: torch.Tensor,
         audio_prompts: list[torch.Tensor | None],
         max_tokens: int | None = None,
+        prefill_kv: list[tuple[torch.Tensor, torch.Tensor]] | None = None,
+        use_cfg: bool = True,
+        uncond_enc_out: torch.Tensor | None = None,
     ):
         """Initializes the model state for generation.
 
@@ -351,6 +374,12 @@ class Dia:
         Args:
             text: The padded text input tensor, shape [B, 1, T_text].
             audio_prompts: A list of prepared audio prompt tensors or None.
+            max_tokens: The maximum number of audio tokens to generate.
+            prefill_kv: Self-attention K/V of the prompt prefill from an earlier, identical
+                        request (see `_prepare_generation_cached`); skips the prefill forward.
+            use_cfg: If False, only the conditional rows are built (no classifier-free guidance).
+            uncond_enc_out: Precomputed unconditional encoder output, shape [B, T_text, E]
+                            (see `_uncond_encoder_out`); only the conditional text is encoded.
 
         Returns:
             A tuple containing:
@@ -359,14 +388,22 @@ class Dia:
                   containing the prefilled audio tokens.
         """
         batch_size = text.shape[0]
+        cfg_rows = 2 if use_cfg else 1
 
         enc_input_uncond = torch.zeros_like(text)
         enc_input_cond = text
-        stacked_inputs = torch.stack([enc_input_uncond, enc_input_cond], dim=1)
-        enc_input = stacked_inputs.view(2 * batch_size, -1)
 
-        enc_state = EncoderInferenceState.new(self.config, enc_input_cond)
-        encoder_out = self.model.encoder(enc_input, enc_state)
+        enc_state = EncoderInferenceState.new(self.config, enc_input_cond, cfg_rows=cfg_rows)
+        if not use_cfg:
+            encoder_out = self.model.encoder(enc_input_cond.view(batch_size, -1), enc_state)
+        elif uncond_enc_out is not None:
+            cond_state = EncoderInferenceState.new(self.config, enc_input_cond, cfg_rows=1)
+            cond_out = self.model.encoder(enc_input_cond.view(batch_size, -1), cond_state)
+            encoder_out = torch.stack([uncond_enc_out, cond_out], dim=1).view(2 * batch_size, *cond_out.shape[1:])
+        else:
+            stacked_inputs = torch.stack([enc_input_uncond, enc_input_cond], dim=1)
+            enc_input = stacked_inputs.view(2 * batch_size, -1)
+            encoder_out = self.model.encoder(enc_input, enc_state)
 
         dec_cross_attn_cache = self.model.decoder.precompute_cross_attn_cache(
             encoder_out, enc_state.positions, enc_state.padding_mask
@@ -378,20 +415,101 @@ class Dia:
             dec_cross_attn_cache,
             self.compute_dtype,
             max_generation_length=max_tokens,
+            growth_step=self.kv_growth_step,
+            pool=self.kv_cache_pool,
+            cfg_rows=cfg_rows,
         )
         prefill, prefill_steps = self._prepare_audio_prompt(audio_prompts)
 
-        dec_output = DecoderOutput.new(batch_size, self.config, self.device)
+        max_len = max(max_tokens or self.config.data.audio_length, prefill.shape[1])
+        dec_output = DecoderOutput.new(batch_size, self.config, self.device, max_len=max_len)
         dec_output.prefill(prefill, prefill_steps)
 
         dec_step = min(prefill_steps) - 1
         if dec_step > 0:
             dec_state.prepare_step(0, dec_step)
-            tokens_BxTxC = dec_output.get_tokens_at(0, dec_step).repeat_interleave(2, dim=0)
-            self.model.decoder.forward(tokens_BxTxC, dec_state)
+            if prefill_kv is not None:
+                dec_state.load_prefill(prefill_kv)
+            else:
+                tokens_BxTxC = dec_output.get_tokens_at(0, dec_step).repeat_interleave(cfg_rows, dim=0)
+                self.model.decoder.forward(tokens_BxTxC, dec_state)
+
+        return dec_state, dec_output
+
+    def _prepare_generation_cached(
+        self,
+        text: torch.Tensor,
+        audio_prompts: list[torch.Tensor | None],
+        max_tokens: int | None = None,
+        cfg_scale: float = 3.0,
+    ):
+        """`_prepare_generation` with the cached pieces looked up first.
+
+        - With `cfg_scale == 0` guidance is a no-op, so the unconditional rows are skipped.
+        - Otherwise the unconditional encoder output comes from `_uncond_encoder_out`.
+        - The prompt prefill K/V is reused from `prompt_cache` when enabled (single-prompt
+          batches only).
 
+        The lookups stay outside `_prepare_generation` so that it can still be compiled as a whole.
+        """
+        use_cfg = cfg_scale != 0.0
+        cfg_rows = 2 if use_cfg else 1
+        cache = self.prompt_cache
+        key = None
+        if cache is not None and cache.max_kv_entries > 0 and len(audio_prompts) == 1 and audio_prompts[0] is not None:
+            key = cache.kv_key(text, audio_prompts[0], self.compute_dtype, cfg_rows)
+        prefill_kv = cache.get_kv(key) if key is not None else None
+        uncond_enc_out = self._uncond_encoder_out(text) if use_cfg and self.uncond_cache_size > 0 else None
+
+        dec_state, dec_output = self._prepare_generation(
+            text,
+            audio_prompts,
+            max_tokens=max_tokens,
+            prefill_kv=prefill_kv,
+            use_cfg=use_cfg,
+            uncond_enc_out=uncond_enc_out,
+        )
+
+        dec_step = dec_output.prefill_steps[0] - 1
+        if key is not None and prefill_kv is None and dec_step > 0:
+            cache.put_kv(key, dec_state.export_prefill(dec_step))
         return dec_state, dec_output
 
+    def _uncond_encoder_out(self, text: torch.Tensor) -> torch.Tensor:
+        """Encoder output of the unconditional (all-zero) CFG input for each row of `text`.
+
+        The unconditional input is the same for every prompt; only its padding mask, taken from
+        the conditional text, differs. Outputs are therefore cached by padding mask, and rows
+        sharing a mask are encoded once.
+
+        Args:
+            text: The padded text input tensor, shape [B, 1, T_text].
+
+        Returns:
+            torch.Tensor: Shape [B, T_text, E].
+        """
+        masks_BxT = text[:, 0] != self.config.data.text_pad_value
+        keys = [tensor_hash(mask) for mask in masks_BxT]
+
+        missing = {}
+        for i, key in enumerate(keys):
+            if key not in self._uncond_enc_cache and key not in missing:
+                missing[key] = i
+        if missing:
+            rows = text[list(missing.values())]
+            enc_state = EncoderInferenceState.new(self.config, rows, cfg_rows=1)
+            enc_out = self.model.encoder(torch.zeros_like(rows).view(rows.shape[0], -1), enc_state)
+            for key, out in zip(missing, enc_out):
+                self._uncond_enc_cache[key] = out
+
+        outputs = []
+        for key in keys:
+            self._uncond_enc_cache.move_to_end(key)
+            outputs.append(self._uncond_enc_cache[key])
+        while len(self._uncond_enc_cache) > max(self.uncond_cache_size, len(set(keys))):
+            self._uncond_enc_cache.popitem(last=False)
+        return torch.stack(outputs)
+
     def _decoder_step(
         self,
         tokens_Bx1xC: torch.Tensor,
@@ -411,7 +529,8 @@ class Dia:
 
         Args:
             tokens_Bx1xC: The input tokens for the current step, shape [2*B, 1, C].
-                         Repeated for CFG (unconditional and conditional).
+                         Repeated for CFG (unconditional and conditional), unless
+                         `dec_state.cfg_rows` is 1.
             dec_state: The current state of the decoder (KV caches, etc.).
             cfg_scale: The scale factor for classifier-free guidance.
             temperature: The temperature for sampling.
@@ -423,17 +542,21 @@ class Dia:
             torch.Tensor: The sampled next tokens for each item in the batch,
                           shape [B, C].
         """
-        B = tokens_Bx1xC.shape[0] // 2
+        B = tokens_Bx1xC.shape[0] // dec_state.cfg_rows
 
         audio_eos_value = self.config.data.audio_eos_value
         logits_Bx1xCxV = self.model.decoder.decode_step(tokens_Bx1xC, dec_state, current_idx)
 
         logits_last_2BxCxV = logits_Bx1xCxV[:, -1]
-        logits_last_Bx2xCxV = logits_last_2BxCxV.view(B, 2, *logits_last_2BxCxV.shape[1:])
+        if dec_state.cfg_rows == 1:
+            # guidance disabled: only conditional rows were decoded
+            logits_BxCxV = logits_last_2BxCxV
+        else:
+            logits_last_Bx2xCxV = logits_last_2BxCxV.view(B, 2, *logits_last_2BxCxV.shape[1:])
 
-        uncond_logits_BxCxV = logits_last_Bx2xCxV[:, 0, :, :]  # Shape [B, C, V]
-        cond_logits_BxCxV = logits_last_Bx2xCxV[:, 1, :, :]  # Shape [B, C, V]
-        logits_BxCxV = cond_logits_BxCxV + cfg_scale * (cond_logits_BxCxV - uncond_logits_BxCxV)
+            uncond_logits_BxCxV = logits_last_Bx2xCxV[:, 0, :, :]  # Shape [B, C, V]
+            cond_logits_BxCxV = logits_last_Bx2xCxV[:, 1, :, :]  # Shape [B, C, V]
+            logits_BxCxV = cond_logits_BxCxV + cfg_scale * (cond_logits_BxCxV - uncond_logits_BxCxV)
 
         logits_BxCxV[:, :, audio_eos_value + 1 :] = torch.full_like(
             logits_BxCxV[:, :, audio_eos_value + 1 :],
@@ -458,6 +581,53 @@ class Dia:
         pred_BxC = pred_BC.view(B, self.config.data.channels)
         return pred_BxC
 
+    def _update_eos_state(
+        self,
+        pred_BxC: torch.Tensor,
+        step_Bx: torch.Tensor,
+        max_tokens: int,
+        eos_detected_Bx: torch.Tensor,
+        eos_countdown_Bx: torch.Tensor,
+        finished_step_Bx: torch.Tensor,
+    ) -> None:
+        """Tracks EOS for the tokens sampled at `step_Bx` and updates the state tensors in place.
+
+        Rows that sample EOS on channel 0 (or run out of room) start a countdown of
+        `max(delay_pattern)` steps, during which `pred_BxC` is overwritten with the delayed
+        EOS/PAD tokens so every channel ends cleanly.
+        """
+        audio_eos_value = self.config.data.audio_eos_value
+        audio_pad_value = self.config.data.audio_pad_value
+        delay_pattern = self.config.data.delay_pattern
+        max_delay_pattern = max(delay_pattern)
+
+        active_mask_Bx = eos_countdown_Bx != 0
+        eos_trigger_Bx = torch.zeros_like(active_mask_Bx)
+        if active_mask_Bx.any():
+            is_eos_token = (~eos_detected_Bx[active_mask_Bx]) & (pred_BxC[active_mask_Bx, 0] == audio_eos_value)
+            is_max_len = step_Bx[active_mask_Bx] >= max_tokens - max_delay_pattern
+            eos_trigger_Bx[active_mask_Bx] = is_eos_token | is_max_len
+        eos_detected_Bx |= eos_trigger_Bx
+        start_countdown_mask_Bx = eos_trigger_Bx & (eos_countdown_Bx < 0)
+        if start_countdown_mask_Bx.any():
+            eos_countdown_Bx[start_countdown_mask_Bx] = max_delay_pattern
+            finished_step_Bx[start_countdown_mask_Bx] = step_Bx[start_countdown_mask_Bx]
+
+        padding_mask_Bx = eos_countdown_Bx > 0
+        if padding_mask_Bx.any():
+            delay_pattern_Cx = torch.tensor(delay_pattern, device=self.device, dtype=torch.long)
+            pred_active_BxC = pred_BxC[padding_mask_Bx].clone()
+            countdown_active_Bx = eos_countdown_Bx[padding_mask_Bx]
+            step_after_eos_Bx = max_delay_pattern - countdown_active_Bx
+            step_after_eos_Bx_ = step_after_eos_Bx.unsqueeze(1)
+            delay_pattern_Cx_ = delay_pattern_Cx.unsqueeze(0)
+            eos_mask_NxC = step_after_eos_Bx_ == delay_pattern_Cx_
+            pad_mask_NxC = step_after_eos_Bx_ > delay_pattern_Cx_
+            pred_active_BxC[eos_mask_NxC] = audio_eos_value
+            pred_active_BxC[pad_mask_NxC] = audio_pad_value
+            pred_BxC[padding_mask_Bx] = pred_active_BxC
+            eos_countdown_Bx[padding_mask_Bx] -= 1
+
     def _generate_output(self, generated_codes: torch.Tensor, lengths_Bx: torch.Tensor) -> list[np.ndarray]:
         """Converts generated delayed codes into audio waveforms.
 
@@ -544,7 +714,8 @@ class Dia:
 
         Loads the audio file, resamples it to the target sample rate if necessary,
         preprocesses it using the DAC model's preprocessing, and encodes it into
-        DAC codebook indices.
+        DAC codebook indices. With a `prompt_cache` the codes are looked up by the file's
+        content hash first.
 
         Args:
             audio_path: Path to the audio file.
@@ -560,6 +731,13 @@ class Dia:
         """
         if self.dac_model is None:
             raise RuntimeError("DAC model is required for loading audio prompts but was not loaded.")
+        if self.prompt_cache is not None:
+            return self.prompt_cache.get_codes(
+                file_hash(audio_path), lambda: self._load_audio_uncached(audio_path), self.device
+            )
+        return self._load_audio_uncached(audio_path)
+
+    def _load_audio_uncached(self, audio_path: str) -> torch.Tensor:
         audio, sr = torchaudio.load(audio_path, channels_first=True)  # C, T
         if sr != DEFAULT_SAMPLE_RATE:
             audio = torchaudio.functional.resample(audio, sr, DEFAULT_SAMPLE_RATE)
@@ -582,6 +760,412 @@ class Dia:
 
         sf.write(path, audio, DEFAULT_SAMPLE_RATE)
 
+    def _compile_steps(self):
+        if not hasattr(self, "_compiled"):
+            # Compilation can take about a minute.
+            self._prepare_generation = torch.compile(self._prepare_generation, dynamic=True, fullgraph=True)
+            self._decoder_step = torch.compile(self._decoder_step, fullgraph=True, mode="max-autotune")
+            self._compiled = True
+
+    def _load_audio_prompts(
+        self,
+        audio_prompt: list[str | torch.Tensor | None] | str | torch.Tensor | None,
+        batch_size: int,
+    ) -> list[torch.Tensor | None]:
+        """Normalizes the `audio_prompt` argument of `generate` to one DAC code tensor (or None) per prompt."""
+        if isinstance(audio_prompt, list):
+            audio_prompt = [self.load_audio(p) if isinstance(p, str) else p for p in audio_prompt]
+        elif isinstance(audio_prompt, str):
+            audio_prompt = [self.load_audio(audio_prompt)]
+        elif isinstance(audio_prompt, torch.Tensor):
+            audio_prompt = [audio_prompt]
+        elif audio_prompt is None:
+            audio_prompt = [None] * batch_size
+
+        assert len(audio_prompt) == batch_size, "Number of audio prompts must match batch size"
+        return audio_prompt
+
+    def _decode_window(self, codes_TxC: torch.Tensor, start: int, end: int, context_frames: int) -> torch.Tensor:
+        """Decodes the delayed codes of frames [start, end) to a waveform.
+
+        Up to `context_frames` earlier frames are decoded along with the window so the DAC
+        decoder sees the same left context it would in a full decode; their samples are cut off.
+        """
+        window_start = max(0, start - context_frames)
+        codebook = revert_audio_delay_window(codes_TxC, self.config.data.delay_pattern, window_start, end)
+        codebook = torch.where((codebook < 0) | (codebook > 1023), torch.zeros_like(codebook), codebook)
+        audio = self._decode(codebook.long())
+        samples_per_frame = audio.shape[-1] // (end - window_start)
+        return audio[(start - window_start) * samples_per_frame :]
+
+    def _decode_steps(
+        self,
+        dec_state: DecoderInferenceState,
+        dec_output: DecoderOutput,
+        max_tokens: int,
+        cfg_scale: float,
+        temperature: float,
+        top_p: float,
+        top_k: int,
+        eos_detected_Bx: torch.Tensor,
+        eos_countdown_Bx: torch.Tensor,
+        finished_step_Bx: torch.Tensor,
+        verbose: bool = False,
+        log_prefix: str = "generate",
+    ) -> Iterator[int]:
+        """The decode loop shared by `generate` and `generate_stream`; all rows advance together.
+
+        Yields the step just written to `dec_output` after every decoder step. Stops at
+        `max_tokens` or once every row has finished its EOS countdown; the EOS state tensors
+        are updated in place.
+        """
+        batch_size = eos_countdown_Bx.shape[0]
+        max_delay_pattern = max(self.config.data.delay_pattern)
+        dec_step = min(dec_output.prefill_steps) - 1
+        current_idx = torch.tensor([dec_step], device=self.device)
+        bos_over = False
+
+        if verbose:
+            start_time = time.time()
+
+        while dec_step < max_tokens:
+            if (eos_countdown_Bx == 0).all():
+                break
+
+            current_step_idx = dec_step + 1
+            torch.compiler.cudagraph_mark_step_begin()
+            dec_state.prepare_step(dec_step)
+            # Repeat for CFG
+            tokens_Bx1xC = dec_output.get_tokens_at(dec_step).repeat_interleave(dec_state.cfg_rows, dim=0)
+
+            pred_BxC = self._decoder_step(
+                tokens_Bx1xC,
+                dec_state,
+                cfg_scale,
+                temperature,
+                top_p,
+                top_k,
+                current_idx,
+            )
+
+            current_idx += 1
+
+            step_Bx = torch.full((batch_size,), current_step_idx, dtype=torch.long, device=self.device)
+            self._update_eos_state(pred_BxC, step_Bx, max_tokens, eos_detected_Bx, eos_countdown_Bx, finished_step_Bx)
+
+            # --- Update BOS flag (Original) ---
+            if not bos_over:
+                bos_over = all(
+                    dec_step - prefill_step > max_delay_pattern for prefill_step in dec_output.prefill_steps
+                )
+
+            dec_output.update_one(pred_BxC, current_step_idx, not bos_over)
+
+            dec_step += 1
+            yield dec_step
+
+            if verbose and dec_step % 86 == 0:
+                duration = time.time() - start_time
+                if duration > 0:
+                    print(
+                        f"{log_prefix} step {dec_step}: speed={86 * batch_size / duration:.3f} tokens/s, realtime factor={batch_size / duration:.3f}x"
+                    )
+                start_time = time.time()
+
+    @torch.inference_mode()
+    def generate_stream(
+        self,
+        text: str,
+        max_tokens: int | None = None,
+        cfg_scale: float = 3.0,
+        temperature: float = 1.2,
+        top_p: float = 0.95,
+        use_torch_compile: bool = False,
+        cfg_filter_top_k: int = 45,
+        audio_prompt: str | torch.Tensor | None = None,
+        chunk_frames: int = 43,
+        context_frames: int = 16,
+        overlap_frames: int = 4,
+        verbose: bool = False,
+    ) -> Iterator[np.ndarray]:
+        """Generates audio for a single text prompt, yielding the waveform in chunks.
+
+        A frame can be decoded as soon as the last delayed channel has produced it, i.e.
+        `max(delay_pattern)` steps after it was started, so audio is available long before the
+        whole utterance is generated. Each chunk is decoded with `context_frames` of left
+        context; the last `overlap_frames` of a chunk are held back and cross-faded with the
+        start of the next one to hide the missing right context. Concatenating the yielded
+        chunks gives the full utterance.
+
+        Args:
+            text: The input text prompt.
+            max_tokens, cfg_scale, temperature, top_p, use_torch_compile, cfg_filter_top_k,
+            audio_prompt: As for `generate`.
+            chunk_frames: Number of new frames (about 86 per second) decoded per chunk.
+            context_frames: Frames of left context decoded with each chunk.
+            overlap_frames: Frames cross-faded between consecutive chunks.
+            verbose: If True, prints the first-chunk latency and generation speed.
+
+        Yields:
+            NumPy arrays with consecutive pieces of the waveform.
+
+        Raises:
+            RuntimeError: If the DAC model is not loaded.
+        """
+        if self.dac_model is None:
+            raise RuntimeError("DAC model is required for streaming generation but was not loaded.")
+        max_tokens = self.config.data.audio_length if max_tokens is None else max_tokens
+        max_delay_pattern = max(self.config.data.delay_pattern)
+        self.model.eval()
+
+        if verbose:
+            total_start_time = time.time()
+
+        if use_torch_compile:
+            self._compile_steps()
+
+        audio_prompt = self._load_audio_prompts(audio_prompt, 1)
+        text_tokens = self._pad_text_input([self._encode_text(text)])
+
+        dec_state, dec_output = self._prepare_generation_cached(
+            text_tokens, audio_prompt, max_tokens=max_tokens, cfg_scale=cfg_scale
+        )
+        prefill_step = dec_output.prefill_steps[0]
+        dec_step = prefill_step - 1
+        codes_TxC = dec_output.generated_tokens[0, prefill_step:]
+
+        eos_detected_Bx = torch.zeros((1,), dtype=torch.bool, device=self.device)
+        eos_countdown_Bx = torch.full((1,), -1, dtype=torch.long, device=self.device)
+        finished_step_Bx = torch.full((1,), -1, dtype=torch.long, device=self.device)
+
+        emitted = 0  # frames already yielded
+        tail = None  # decoded audio of frames [emitted, emitted + overlap_frames), pending cross-fade
+
+        def emit(end: int, final: bool) -> torch.Tensor:
+            nonlocal emitted, tail
+            audio = self._decode_window(codes_TxC, emitted, end, context_frames)
+            if tail is not None and tail.shape[-1] > 0:
+                fade_in = torch.linspace(0.0, 1.0, tail.shape[-1], device=audio.device, dtype=audio.dtype)
+                audio[: tail.shape[-1]] = audio[: tail.shape[-1]] * fade_in + tail * (1.0 - fade_in)
+            if final:
+                chunk, tail, emitted = audio, None, end
+            else:
+                cut = audio.shape[-1] * (end - overlap_frames - emitted) // (end - emitted)
+                chunk, tail, emitted = audio[:cut], audio[cut:], end - overlap_frames
+            return chunk
+
+        if verbose:
+            print("generate_stream: starting generation loop")
+            num_chunks = 0
+
+        steps = self._decode_steps(
+            dec_state,
+            dec_output,
+            max_tokens,
+            cfg_scale,
+            temperature,
+            top_p,
+            cfg_filter_top_k,
+            eos_detected_Bx,
+            eos_countdown_Bx,
+            finished_step_Bx,
+            verbose=verbose,
+            log_prefix="generate_stream",
+        )
+        # the KV buffers go back to the pool even if the consumer stops early or decoding fails
+        try:
+            for dec_step in steps:
+                # frame f is complete once step prefill_step + f + max_delay_pattern has been written
+                available = dec_step - prefill_step - max_delay_pattern + 1
+                if finished_step_Bx[0] >= 0:
+                    available = min(available, finished_step_Bx[0].item() - prefill_step)
+                if available - emitted >= chunk_frames + overlap_frames:
+                    chunk = emit(available, final=False)
+                    if verbose:
+                        if num_chunks == 0:
+                            print(f"generate_stream: first chunk after {time.time() - total_start_time:.3f}s")
+                        num_chunks += 1
+                    yield chunk.cpu().numpy()
+        finally:
+            steps.close()
+            dec_state.release()
+
+        finished_step = finished_step_Bx[0].item()
+        if finished_step < 0:
+            finished_step = dec_step + 1 - max_delay_pattern
+        length = max(finished_step - prefill_step, 0)
+        if length > emitted:
+            chunk = emit(length, final=True)
+            if verbose and num_chunks == 0:
+                print(f"generate_stream: first chunk after {time.time() - total_start_time:.3f}s")
+            yield chunk.cpu().numpy()
+        elif length == 0:
+            print("Warning: Nothing generated.")
+
+        if verbose:
+            print(f"generate_stream: {length} frames, total duration={time.time() - total_start_time:.3f}s")
+
+    def _generate_continuous(
+        self,
+        text_tokens: list[torch.Tensor],
+        audio_prompts: list[torch.Tensor | None],
+        max_tokens: int,
+        max_batch_size: int,
+        cfg_scale: float,
+        temperature: float,
+        top_p: float,
+        top_k: int,
+        verbose: bool = False,
+    ) -> list[np.ndarray | None]:
+        """Generates every prompt with an iteration-level scheduler.
+
+        Up to `max_batch_size` requests occupy the slots of one decoder batch, each at its own
+        step. A request that finishes its EOS countdown is decoded to audio right away and its
+        slot is handed to the next queued request, which gets its own encoder pass, cross-attention
+        cache and audio prompt prefill. Once the queue is empty finished slots are dropped from
+        the batch, so no decoder step is spent on a finished row.
+
+        Args:
+            text_tokens: Encoded (unpadded) text for each request.
+            audio_prompts: DAC codes of each request's audio prompt, or None.
+            max_tokens, cfg_scale, temperature, top_p, top_k: As for `generate`.
+            max_batch_size: Maximum number of requests decoded together.
+            verbose: Print throughput every 86 steps.
+
+        Returns:
+            The outputs in request order, as returned by `_generate_output`; None for a request
+            that produced no audio.
+
+        Raises:
+            ValueError: If an audio prompt leaves no room for new frames within `max_tokens`.
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be positive, got {max_batch_size}")
+        max_delay_pattern = max(self.config.data.delay_pattern)
+        prompt_lens = [p.shape[0] if p is not None else 0 for p in audio_prompts]
+        for request, prompt_len in enumerate(prompt_lens):
+            # the EOS countdown starts at max_tokens - max_delay at the latest and must not start at once
+            if prompt_len + 1 >= max_tokens - max_delay_pattern:
+                raise ValueError(
+                    f"Audio prompt {request} has {prompt_len} frames, no room to generate with max_tokens={max_tokens}"
+                )
+        # every slot must hold the longest prompt (with its delayed tail) as well as max_tokens steps
+        output_len = max(max_tokens, max(prompt_lens, default=0) + max_delay_pattern)
+        num_requests = len(text_tokens)
+        num_slots = min(max_batch_size, num_requests)
+        queue = deque(range(num_requests))
+        outputs: list[np.ndarray | None] = [None] * num_requests
+
+        dec_state: DecoderInferenceState | None = None
+        dec_output: DecoderOutput | None = None
+        slot_requests = [-1] * num_slots
+        step_Bx = torch.zeros((num_slots,), dtype=torch.long, device=self.device)
+        eos_detected_Bx = torch.zeros((num_slots,), dtype=torch.bool, device=self.device)
+        eos_countdown_Bx = torch.full((num_slots,), -1, dtype=torch.long, device=self.device)
+        finished_step_Bx = torch.full((num_slots,), -1, dtype=torch.long, device=self.device)
+
+        def admit(slot: int):
+            nonlocal dec_state, dec_output
+            request = queue.popleft()
+            text = self._pad_text_input([text_tokens[request]])
+            new_state, new_output = self._prepare_generation_cached(
+                text, [audio_prompts[request]], max_tokens=max_tokens, cfg_scale=cfg_scale
+            )
+            if dec_state is None:
+                dec_state = DecoderInferenceState.new_slots(new_state, num_slots)
+                dec_output = DecoderOutput.new_slots(new_output, num_slots, max_len=output_len)
+            dec_state.load_slot(slot, new_state)
+            dec_output.load_slot(slot, new_output)
+            new_state.release()
+            slot_requests[slot] = request
+            step_Bx[slot] = new_output.prefill_steps[0] - 1
+            eos_detected_Bx[slot] = False
+            eos_countdown_Bx[slot] = -1
+            finished_step_Bx[slot] = -1
+
+        def retire(slot: int):
+            prefill_step = dec_output.prefill_steps[slot]
+            finished_step = finished_step_Bx[slot].item()
+            if finished_step < 0:
+                finished_step = step_Bx[slot].item() + 1 - max_delay_pattern
+            length = max(finished_step - prefill_step, 0)
+            if length > 0:
+                codes = dec_output.generated_tokens[slot, prefill_step : prefill_step + length + max_delay_pattern]
+                lengths_Bx = torch.tensor([length], device=self.device)
+                outputs[slot_requests[slot]] = self._generate_output(codes.long().unsqueeze(0), lengths_Bx)[0]
+            else:
+                print(f"Warning: Nothing generated for prompt {slot_requests[slot]}.")
+
+        for slot in range(num_slots):
+            admit(slot)
+
+        if verbose:
+            print(f"generate: continuous batching of {num_requests} prompts in {num_slots} slots")
+            start_time = time.time()
+            tokens_since = 0
+            num_steps = 0
+
+        while slot_requests:
+            torch.compiler.cudagraph_mark_step_begin()
+            dec_state.prepare_rows(step_Bx)
+            # Repeat for CFG
+            tokens_Bx1xC = dec_output.get_tokens_per_row(step_Bx).repeat_interleave(dec_state.cfg_rows, dim=0)
+
+            pred_BxC = self._decoder_step(
+                tokens_Bx1xC,
+                dec_state,
+                cfg_scale,
+                temperature,
+                top_p,
+                top_k,
+                step_Bx.repeat_interleave(dec_state.cfg_rows),
+            )
+
+            step_Bx += 1
+            self._update_eos_state(pred_BxC, step_Bx, max_tokens, eos_detected_Bx, eos_countdown_Bx, finished_step_Bx)
+            dec_output.update_rows(pred_BxC, step_Bx)
+
+            if verbose:
+                num_steps += 1
+                tokens_since += len(slot_requests)
+                if num_steps % 86 == 0:
+                    duration = time.time() - start_time
+                    if duration > 0:
+                        print(
+                            f"generate step {num_steps}: active={len(slot_requests)}, queued={len(queue)}, "
+                            f"speed={tokens_since / duration:.3f} tokens/s, realtime factor={tokens_since / 86 / duration:.3f}x"
+                        )
+                    start_time = time.time()
+                    tokens_since = 0
+
+            # like the static loop, a row stops at max_tokens even if its countdown is still running
+            done = ((eos_countdown_Bx == 0) | (step_Bx >= max_tokens - 1)).nonzero().flatten().tolist()
+            if not done:
+                continue
+
+            dropped = []
+            for slot in done:
+                retire(slot)
+                if queue:
+                    admit(slot)
+                else:
+                    dropped.append(slot)
+
+            if dropped:
+                keep = [slot for slot in range(len(slot_requests)) if slot not in dropped]
+                slot_requests = [slot_requests[slot] for slot in keep]
+                if not keep:
+                    break
+                dec_state.select_slots(keep)
+                dec_output.select_slots(keep)
+                step_Bx = step_Bx[keep]
+                eos_detected_Bx = eos_detected_Bx[keep]
+                eos_countdown_Bx = eos_countdown_Bx[keep]
+                finished_step_Bx = finished_step_Bx[keep]
+
+        dec_state.release()
+        return outputs
+
     @torch.inference_mode()
     def generate(
         self,
@@ -596,6 +1180,7 @@ class Dia:
         audio_prompt_path: list[str | torch.Tensor | None] | str | torch.Tensor | None = None,
         use_cfg_filter: bool | None = None,
         verbose: bool = False,
+        max_batch_size: int | None = None,
     ) -> np.ndarray | list[np.ndarray]:
         """Generates audio corresponding to the input text.
 
@@ -604,7 +1189,8 @@ class Dia:
             max_tokens: The maximum number of audio tokens to generate per prompt.
                         Defaults to the model's configured audio length if None.
             cfg_scale: The scale factor for classifier-free guidance (CFG). Higher values
-                       lead to stronger guidance towards the text prompt.
+                       lead to stronger guidance towards the text prompt. 0 disables guidance
+                       and skips the unconditional pass, halving the decoder batch.
             temperature: The temperature for sampling. Higher values increase randomness.
             top_p: The cumulative probability threshold for nucleus (top-p) sampling.
             use_torch_compile: Whether to compile the generation steps using torch.compile.
@@ -620,6 +1206,10 @@ class Dia:
             use_cfg_filter: (Deprecated) This parameter is no longer used.
             verbose: If True, prints progress information during generation, including
                      speed metrics.
+            max_batch_size: If set, decode at most this many prompts at a time with continuous
+                            batching: a finished prompt's slot is immediately given to the next
+                            queued one instead of idling until the whole batch is done. Helps
+                            most when prompts or outputs differ a lot in length.
 
         Returns:
             If a single text prompt was provided, returns a NumPy array containing the
@@ -629,12 +1219,9 @@ class Dia:
             sequence if no audio was generated for it.
         """
         batch_size = len(text) if isinstance(text, list) else 1
-        audio_eos_value = self.config.data.audio_eos_value
-        audio_pad_value = self.config.data.audio_pad_value
         delay_pattern = self.config.data.delay_pattern
         max_tokens = self.config.data.audio_length if max_tokens is None else max_tokens
         max_delay_pattern = max(delay_pattern)
-        delay_pattern_Cx = torch.tensor(delay_pattern, device=self.device, dtype=torch.long)
         self.model.eval()
 
         if audio_prompt_path:
@@ -646,110 +1233,65 @@ class Dia:
         if verbose:
             total_start_time = time.time()
 
-        if use_torch_compile and not hasattr(self, "_compiled"):
-            # Compilation can take about a minute.
-            self._prepare_generation = torch.compile(self._prepare_generation, dynamic=True, fullgraph=True)
-            self._decoder_step = torch.compile(self._decoder_step, fullgraph=True, mode="max-autotune")
-            self._compiled = True
-
-        if isinstance(audio_prompt, list):
-            audio_prompt = [self.load_audio(p) if isinstance(p, str) else p for p in audio_prompt]
-        elif isinstance(audio_prompt, str):
-            audio_prompt = [self.load_audio(audio_prompt)]
-        elif isinstance(audio_prompt, torch.Tensor):
-            audio_prompt = [audio_prompt]
-        elif audio_prompt is None:
-            audio_prompt = [None] * batch_size
+        if use_torch_compile:
+            self._compile_steps()
 
-        assert len(audio_prompt) == batch_size, "Number of audio prompts must match batch size"
+        audio_prompt = self._load_audio_prompts(audio_prompt, batch_size)
 
         if isinstance(text, list):
             text = [self._encode_text(t) for t in text]
         else:
             text = [self._encode_text(text)]
+
+        if max_batch_size is not None:
+            outputs = self._generate_continuous(
+                text,
+                audio_prompt,
+                max_tokens,
+                max_batch_size,
+                cfg_scale,
+                temperature,
+                top_p,
+                cfg_filter_top_k,
+                verbose,
+            )
+            if verbose:
+                print(f"generate: {batch_size} prompts, total duration={time.time() - total_start_time:.3f}s")
+            return outputs if batch_size > 1 else outputs[0]
+
         text = self._pad_text_input(text)
 
-        dec_state, dec_output = self._prepare_generation(text, audio_prompt, max_tokens=max_tokens)
+        dec_state, dec_output = self._prepare_generation_cached(
+            text, audio_prompt, max_tokens=max_tokens, cfg_scale=cfg_scale
+        )
         dec_step = min(dec_output.prefill_steps) - 1
-        current_idx = torch.tensor([dec_step], device=self.device)
 
         eos_detected_Bx = torch.zeros((batch_size,), dtype=torch.bool, device=self.device)
         eos_countdown_Bx = torch.full((batch_size,), -1, dtype=torch.long, device=self.device)
         finished_step_Bx = torch.full((batch_size,), -1, dtype=torch.long, device=self.device)
 
-        bos_over = False
-
         if verbose:
             print("generate: starting generation loop")
             if use_torch_compile:
                 print("generate: using use_torch_compile=True, the first step may be slow")
-            start_time = time.time()
 
         # --- Generation Loop ---
-        while dec_step < max_tokens:
-            if (eos_countdown_Bx == 0).all():
-                break
-
-            current_step_idx = dec_step + 1
-            torch.compiler.cudagraph_mark_step_begin()
-            dec_state.prepare_step(dec_step)
-            tokens_Bx1xC = dec_output.get_tokens_at(dec_step).repeat_interleave(2, dim=0)  # Repeat for CFG
-
-            pred_BxC = self._decoder_step(
-                tokens_Bx1xC,
-                dec_state,
-                cfg_scale,
-                temperature,
-                top_p,
-                cfg_filter_top_k,
-                current_idx,
-            )
-
-            current_idx += 1
-
-            active_mask_Bx = eos_countdown_Bx != 0
-            eos_trigger_Bx = torch.zeros_like(active_mask_Bx)
-            if active_mask_Bx.any():
-                is_eos_token = (~eos_detected_Bx[active_mask_Bx]) & (pred_BxC[active_mask_Bx, 0] == audio_eos_value)
-                is_max_len = current_step_idx >= max_tokens - max_delay_pattern
-                eos_trigger_Bx[active_mask_Bx] = is_eos_token | is_max_len
-            eos_detected_Bx |= eos_trigger_Bx
-            start_countdown_mask_Bx = eos_trigger_Bx & (eos_countdown_Bx < 0)
-            if start_countdown_mask_Bx.any():
-                eos_countdown_Bx[start_countdown_mask_Bx] = max_delay_pattern
-                finished_step_Bx[start_countdown_mask_Bx] = current_step_idx
-
-            padding_mask_Bx = eos_countdown_Bx > 0
-            if padding_mask_Bx.any():
-                pred_active_BxC = pred_BxC[padding_mask_Bx].clone()
-                countdown_active_Bx = eos_countdown_Bx[padding_mask_Bx]
-                step_after_eos_Bx = max_delay_pattern - countdown_active_Bx
-                step_after_eos_Bx_ = step_after_eos_Bx.unsqueeze(1)
-                delay_pattern_Cx_ = delay_pattern_Cx.unsqueeze(0)
-                eos_mask_NxC = step_after_eos_Bx_ == delay_pattern_Cx_
-                pad_mask_NxC = step_after_eos_Bx_ > delay_pattern_Cx_
-                pred_active_BxC[eos_mask_NxC] = audio_eos_value
-                pred_active_BxC[pad_mask_NxC] = audio_pad_value
-                pred_BxC[padding_mask_Bx] = pred_active_BxC
-                eos_countdown_Bx[padding_mask_Bx] -= 1
-
-            # --- Update BOS flag (Original) ---
-            if not bos_over:
-                bos_over = all(
-                    dec_step - prefill_step > max_delay_pattern for prefill_step in dec_output.prefill_steps
-                )
-
-            dec_output.update_one(pred_BxC, current_step_idx, not bos_over)
-
-            dec_step += 1
-
-            if verbose and dec_step % 86 == 0:
-                duration = time.time() - start_time
-                if duration > 0:
-                    print(
-                        f"generate step {dec_step}: speed={86 * batch_size / duration:.3f} tokens/s, realtime factor={batch_size / duration:.3f}x"
-                    )
-                start_time = time.time()
+        for dec_step in self._decode_steps(
+            dec_state,
+            dec_output,
+            max_tokens,
+            cfg_scale,
+            temperature,
+            top_p,
+            cfg_filter_top_k,
+            eos_detected_Bx,
+            eos_countdown_Bx,
+            finished_step_Bx,
+            verbose=verbose,
+        ):
+            pass
+
+        dec_state.release()
 
         # --- Finalize and Extract Output ---
         final_step = dec_step + 1
@@ -785,8 +1327,6 @@ class Dia:
                 total_duration = time.time() - total_start_time
                 print(f"generate: avg steps={avg_steps:.1f}, total duration={total_duration:.3f}s")
 
-            del dec_state
-
             outputs = self._generate_output(generated_codes, lengths_Bx)
         else:
             print("Warning: Nothing generated for any sequence in the batch.")
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import torch
+
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-1 of a file's content."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def tensor_hash(*tensors: torch.Tensor) -> str:
+    """SHA-1 of the shapes and values of `tensors`."""
+    h = hashlib.sha1()
+    for t in tensors:
+        h.update(str(tuple(t.shape)).encode())
+        h.update(t.detach().cpu().numpy().tobytes())
+    return h.hexdigest()
+
+
+class PromptCache:
+    """Caches the work spent on repeated audio prompts.
+
+    - DAC codes of prompt files, keyed by the file's content hash. They are kept in memory and,
+      with `cache_dir`, also as `.pt` files, so a fixed set of voices is encoded only once.
+    - Optionally (`max_kv_entries > 0`) the decoder self-attention KV after the prompt prefill.
+      The prefill attends to the encoded text, so these entries are keyed by prompt *and* text
+      and pay off when the same line is rendered again (retries, several takes). The least
+      recently used entries are evicted first.
+    """
+
+    def __init__(self, cache_dir: str | None = None, max_kv_entries: int = 0):
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.max_kv_entries = max_kv_entries
+        self._codes: dict[str, torch.Tensor] = {}
+        self._kv: OrderedDict[str, list[tuple[torch.Tensor, torch.Tensor]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {"codes": 0, "kv": 0}
+        self.misses = {"codes": 0, "kv": 0}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".pt")
+
+    def get_codes(self, key: str, compute_fn: Callable[[], torch.Tensor], device: torch.device) -> torch.Tensor:
+        with self._lock:
+            if key in self._codes:
+                self.hits["codes"] += 1
+                return self._codes[key].to(device)
+        if self.cache_dir is not None and os.path.exists(self._path(key)):
+            codes = torch.load(self._path(key), map_location="cpu")
+            with self._lock:
+                self.hits["codes"] += 1
+                self._codes[key] = codes
+            return codes.to(device)
+        codes = compute_fn().detach().cpu()
+        with self._lock:
+            self.misses["codes"] += 1
+            self._codes[key] = codes
+        if self.cache_dir is not None:
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            torch.save(codes, tmp_path)
+            os.replace(tmp_path, self._path(key))
+        return codes.to(device)
+
+    def kv_key(self, text: torch.Tensor, audio_prompt: torch.Tensor, dtype: torch.dtype, cfg_rows: int = 2) -> str:
+        return f"{tensor_hash(text, audio_prompt)}-{dtype}-{cfg_rows}"
+
+    def get_kv(self, key: str) -> list[tuple[torch.Tensor, torch.Tensor]] | None:
+        with self._lock:
+            kv = self._kv.get(key)
+            if kv is None:
+                self.misses["kv"] += 1
+                return None
+            self._kv.move_to_end(key)
+            self.hits["kv"] += 1
+            return kv
+
+    def put_kv(self, key: str, kv: list[tuple[torch.Tensor, torch.Tensor]]) -> None:
+        if self.max_kv_entries <= 0:
+            return
+        with self._lock:
+            self._kv[key] = kv
+            self._kv.move_to_end(key)
+            while len(self._kv) > self.max_kv_entries:
+                self._kv.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._codes.clear()
+            self._kv.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "codes": len(self._codes),
+                "kv": len(self._kv),
+            }
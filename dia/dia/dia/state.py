@@ -50,12 +50,17 @@ class EncoderInferenceState:
     attn_mask: torch.Tensor
 
     @classmethod
-    def new(cls, config: DiaConfig, cond_src: torch.Tensor) -> "EncoderInferenceState":
-        """Creates EtorchrInferenceParams from DiaConfig and a device."""
+    def new(cls, config: DiaConfig, cond_src: torch.Tensor, cfg_rows: int = 2) -> "EncoderInferenceState":
+        """Creates EtorchrInferenceParams from DiaConfig and a device.
+
+        `cfg_rows` is the number of encoder rows per prompt: 2 (unconditional, conditional) with
+        classifier-free guidance, 1 without.
+        """
         device = cond_src.device
 
         positions = torch.arange(config.data.text_length, dtype=torch.float32, device=device).unsqueeze(0)
-        padding_mask = (cond_src.squeeze(1) != config.data.text_pad_value).to(device).repeat_interleave(2, dim=0)
+        padding_mask = (cond_src.squeeze(1) != config.data.text_pad_value).to(device)
+        padding_mask = padding_mask.repeat_interleave(cfg_rows, dim=0)
         attn_mask = create_attn_mask(padding_mask, padding_mask, device, is_causal=False)
 
         return cls(
@@ -67,6 +72,40 @@ class EncoderInferenceState:
         )
 
 
+class KVCachePool:
+    """Keeps released KV cache buffers for reuse by later requests.
+
+    Buffers are keyed by shape, dtype and device. Because growable caches only take capacities
+    that are multiples of their growth step, requests of similar length and batch size keep
+    hitting the same few shapes, so steady-state generation stops allocating. At most `max_free_bytes` of idle buffers are retained.
+    """
+
+    def __init__(self, max_free_bytes: int = 1 << 30):
+        self.max_free_bytes = max_free_bytes
+        self.free_bytes = 0
+        self._free: dict[tuple, list[torch.Tensor]] = {}
+
+    def take(self, shape: tuple[int, ...], dtype: torch.dtype, device: torch.device) -> torch.Tensor:
+        """Returns a zeroed buffer, recycled when one of the same shape is free."""
+        buffers = self._free.get((tuple(shape), dtype, torch.device(device)))
+        if buffers:
+            buffer = buffers.pop()
+            self.free_bytes -= buffer.numel() * buffer.element_size()
+            return buffer.zero_()
+        return torch.zeros(shape, dtype=dtype, device=device)
+
+    def give(self, buffer: torch.Tensor) -> None:
+        nbytes = buffer.numel() * buffer.element_size()
+        if self.free_bytes + nbytes > self.max_free_bytes:
+            return
+        self._free.setdefault((tuple(buffer.shape), buffer.dtype, buffer.device), []).append(buffer)
+        self.free_bytes += nbytes
+
+    def clear(self) -> None:
+        self._free.clear()
+        self.free_bytes = 0
+
+
 class KVCache(torch.nn.Module):
     k: torch.Tensor
     v: torch.Tensor
@@ -81,13 +120,31 @@ class KVCache(torch.nn.Module):
         device: torch.device,
         k: torch.Tensor | None = None,
         v: torch.Tensor | None = None,
+        growth_step: int | None = None,
+        pool: KVCachePool | None = None,
+        cfg_rows: int = 2,
     ):
-        k = torch.zeros((2 * batch_size, num_heads, max_len, head_dim), dtype=dtype, device=device) if k is None else k
-        v = torch.zeros((2 * batch_size, num_heads, max_len, head_dim), dtype=dtype, device=device) if v is None else v
+        """Holds `cfg_rows` rows per batch item (see `EncoderInferenceState.new`).
+
+        With `growth_step` set the cache is growable: it starts with room for `growth_step`
+        steps and is reallocated on demand (see `reserve`) up to `max_len`. This is not block
+        paging: K/V stay in one contiguous buffer, which the attention kernels need, and a
+        growth copies the old contents into a larger buffer. Buffers come from and go back to
+        `pool` when one is given."""
         super().__init__()
+        self.max_len = max_len
+        self.growth_step = growth_step
+        self.pool = pool
 
-        self.register_buffer("k", k)
-        self.register_buffer("v", v)
+        length = max_len if growth_step is None else min(max_len, growth_step)
+        shape = (cfg_rows * batch_size, num_heads, length, head_dim)
+        self.register_buffer("k", self._alloc(shape, dtype, device) if k is None else k)
+        self.register_buffer("v", self._alloc(shape, dtype, device) if v is None else v)
+
+    def _alloc(self, shape: tuple[int, ...], dtype: torch.dtype, device: torch.device) -> torch.Tensor:
+        if self.pool is not None:
+            return self.pool.take(shape, dtype, device)
+        return torch.zeros(shape, dtype=dtype, device=device)
 
     @classmethod
     def from_kv(cls, k: torch.Tensor, v: torch.Tensor) -> "KVCache":
@@ -102,10 +159,64 @@ class KVCache(torch.nn.Module):
             v=v,
         )
 
+    @classmethod
+    def empty_like(cls, cache: "KVCache", batch_size: int, cfg_rows: int = 2) -> "KVCache":
+        """A new, empty cache with the layout, growth step and pool of `cache` for `batch_size` requests."""
+        return cls(
+            batch_size=batch_size,
+            cfg_rows=cfg_rows,
+            num_heads=cache.k.shape[1],
+            max_len=cache.max_len,
+            head_dim=cache.k.shape[3],
+            dtype=cache.k.dtype,
+            device=cache.k.device,
+            growth_step=cache.growth_step,
+            pool=cache.pool,
+        )
+
+    def reserve(self, length: int) -> None:
+        """Makes room for positions [0, length), reallocating a growable cache.
+
+        The capacity at least doubles (rounded up to the growth step), so the copies made over
+        a whole generation add up to O(final length) rather than one full copy per step.
+        """
+        capacity = self.k.shape[2]
+        if length <= capacity:
+            return
+        if self.growth_step is None or length > self.max_len:
+            limit = self.max_len if self.growth_step is not None else capacity
+            raise ValueError(f"KV cache holds {limit} steps, {length} requested")
+        target = max(length, 2 * capacity)
+        new_capacity = min(self.max_len, -(-target // self.growth_step) * self.growth_step)
+        shape = (*self.k.shape[:2], new_capacity, self.k.shape[3])
+        k = self._alloc(shape, self.k.dtype, self.k.device)
+        v = self._alloc(shape, self.v.dtype, self.v.device)
+        k[:, :, :capacity] = self.k
+        v[:, :, :capacity] = self.v
+        self.release()
+        self.k, self.v = k, v
+
+    def select_rows(self, rows: torch.Tensor) -> None:
+        k, v = self.k[rows], self.v[rows]
+        self.release()
+        self.k, self.v = k, v
+
+    def release(self) -> None:
+        """Hands the buffers back to the pool; the cache must not be used afterwards."""
+        if self.pool is not None:
+            self.pool.give(self.k)
+            self.pool.give(self.v)
+
     def update(self, k: torch.Tensor, v: torch.Tensor, current_idx: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
         k_out, v_out = self.k, self.v
-        k_out[:, :, current_idx, :] = k
-        v_out[:, :, current_idx, :] = v
+        if current_idx.numel() > 1:
+            # one write position per row (continuous batching)
+            rows = torch.arange(k_out.shape[0], device=k_out.device)
+            k_out[rows, :, current_idx, :] = k[:, :, 0, :]
+            v_out[rows, :, current_idx, :] = v[:, :, 0, :]
+        else:
+            k_out[:, :, current_idx, :] = k
+            v_out[:, :, current_idx, :] = v
         return self.k, self.v
 
     def prefill(self, k: torch.Tensor, v: torch.Tensor):
@@ -125,8 +236,9 @@ class DecoderInferenceState:
     dec_positions: torch.Tensor
     self_attn_cache: list[KVCache]
     cross_attn_cache: list[KVCache]
-    casual_attn_mask: torch.Tensor
+    self_attn_mask: torch.Tensor | None
     cross_attn_mask: torch.Tensor
+    cfg_rows: int = 2
 
     @classmethod
     def new(
@@ -137,15 +249,21 @@ class DecoderInferenceState:
         dec_cross_attn_cache: list[KVCache],
         compute_dtype: torch.dtype,
         max_generation_length: Optional[int] = None,
+        growth_step: Optional[int] = None,
+        pool: Optional[KVCachePool] = None,
+        cfg_rows: int = 2,
     ) -> "DecoderInferenceState":
-        """Creates DecoderInferenceParams from DiaConfig and a device."""
+        """Creates DecoderInferenceParams from DiaConfig and a device.
+
+        With `growth_step` the self-attention caches are growable (see `KVCache`), so memory
+        follows the number of steps actually generated rather than `max_generation_length`.
+        """
         device = enc_out.device
         max_audio_len = max_generation_length or config.data.audio_length
-        batch_size = enc_out.shape[0] // 2
+        batch_size = enc_out.shape[0] // cfg_rows
 
-        dec_positions = torch.full((2 * batch_size, 1), fill_value=0, dtype=torch.int32, device=device)
-        causal_mask = torch.tril(torch.ones(max_audio_len, max_audio_len, dtype=torch.bool, device=device))
-        dec_mask = torch.ones((2 * batch_size, 1), dtype=torch.bool, device=device)
+        dec_positions = torch.full((cfg_rows * batch_size, 1), fill_value=0, dtype=torch.int32, device=device)
+        dec_mask = torch.ones((cfg_rows * batch_size, 1), dtype=torch.bool, device=device)
         cross_attn_mask = create_attn_mask(dec_mask, enc_state.padding_mask, device, is_causal=False)
 
         self_attn_cache = [
@@ -156,6 +274,9 @@ class DecoderInferenceState:
                 config.model.decoder.gqa_head_dim,
                 compute_dtype,
                 device,
+                growth_step=growth_step,
+                pool=pool,
+                cfg_rows=cfg_rows,
             )
             for _ in range(config.model.decoder.n_layer)
         ]
@@ -168,14 +289,97 @@ class DecoderInferenceState:
             dec_positions=dec_positions,
             self_attn_cache=self_attn_cache,
             cross_attn_cache=dec_cross_attn_cache,
-            casual_attn_mask=causal_mask,
+            self_attn_mask=None,
             cross_attn_mask=cross_attn_mask,
+            cfg_rows=cfg_rows,
         )
 
+    def _reserve(self, length: int) -> int:
+        for cache in self.self_attn_cache:
+            cache.reserve(length)
+        return self.self_attn_cache[0].k.shape[2]
+
     def prepare_step(self, step_from: int, step_to: int | None = None) -> None:
         if step_to is None:
             step_to = step_from + 1
         self.dec_positions = torch.arange(step_from, step_to, dtype=torch.int32, device=self.device).unsqueeze(0)
+        # single-step decode attends to every cached position up to step_from
+        cache_len = self._reserve(step_to)
+        self.self_attn_mask = (torch.arange(cache_len, device=self.device) <= step_from)[None, None, None, :]
+
+    @classmethod
+    def new_slots(cls, template: "DecoderInferenceState", num_slots: int) -> "DecoderInferenceState":
+        """Allocates room for `num_slots` requests shaped like the single-request `template`.
+
+        Slots are filled with `load_slot` and decoded at per-request steps (`prepare_rows`).
+        """
+
+        cfg_rows = template.cfg_rows
+        num_rows = cfg_rows * num_slots
+        return cls(
+            device=template.device,
+            dtype=template.dtype,
+            enc_out=template.enc_out.new_zeros((num_rows, *template.enc_out.shape[1:])),
+            enc_positions=template.enc_positions,
+            dec_positions=template.dec_positions.new_zeros((num_rows, 1)),
+            self_attn_cache=[KVCache.empty_like(cache, num_slots, cfg_rows) for cache in template.self_attn_cache],
+            cross_attn_cache=[KVCache.empty_like(cache, num_slots, cfg_rows) for cache in template.cross_attn_cache],
+            self_attn_mask=None,
+            # free slots attend to everything so they never produce NaNs
+            cross_attn_mask=template.cross_attn_mask.new_ones((num_rows, *template.cross_attn_mask.shape[1:])),
+            cfg_rows=cfg_rows,
+        )
+
+    def load_slot(self, slot: int, src: "DecoderInferenceState", src_slot: int = 0) -> None:
+        """Copies request `src_slot` of `src` (encoder output, KV caches, cross mask) into `slot`."""
+        r = self.cfg_rows
+        dst_rows = slice(r * slot, r * slot + r)
+        src_rows = slice(r * src_slot, r * src_slot + r)
+        self.enc_out[dst_rows] = src.enc_out[src_rows]
+        self.cross_attn_mask[dst_rows] = src.cross_attn_mask[src_rows]
+        caches = zip(self.self_attn_cache + self.cross_attn_cache, src.self_attn_cache + src.cross_attn_cache)
+        for cache, src_cache in caches:
+            cache.reserve(min(cache.max_len, src_cache.k.shape[2]))
+            length = min(cache.k.shape[2], src_cache.k.shape[2])
+            cache.k[dst_rows, :, :length] = src_cache.k[src_rows, :, :length]
+            cache.v[dst_rows, :, :length] = src_cache.v[src_rows, :, :length]
+
+    def select_slots(self, slots: list[int]) -> None:
+        """Keeps only `slots`, in the given order, dropping the rows of every other request."""
+        slots_Bx = torch.tensor(slots, dtype=torch.long, device=self.device)
+        offsets = torch.arange(self.cfg_rows, device=self.device)
+        rows = (self.cfg_rows * slots_Bx.unsqueeze(1) + offsets.unsqueeze(0)).flatten()
+        self.enc_out = self.enc_out[rows]
+        self.dec_positions = self.dec_positions[rows]
+        self.cross_attn_mask = self.cross_attn_mask[rows]
+        for cache in self.self_attn_cache + self.cross_attn_cache:
+            cache.select_rows(rows)
+
+    def prepare_rows(self, steps_Bx: torch.Tensor, max_step: int | None = None) -> None:
+        """Per-request `prepare_step`: request i decodes position `steps_Bx[i]`.
+
+        `max_step` (the largest entry of `steps_Bx`) saves a device sync when the caller knows it.
+        """
+        steps_2Bx = steps_Bx.repeat_interleave(self.cfg_rows)
+        self.dec_positions = steps_2Bx.to(torch.int32).unsqueeze(1)
+        max_step = int(steps_Bx.max()) if max_step is None else max_step
+        cache_len = self._reserve(max_step + 1)
+        positions = torch.arange(cache_len, device=self.device)
+        self.self_attn_mask = (positions[None, :] <= steps_2Bx[:, None])[:, None, None, :]
+
+    def export_prefill(self, length: int) -> list[tuple[torch.Tensor, torch.Tensor]]:
+        """Copies of the self-attention K/V for positions [0, length), one pair per layer."""
+        return [(cache.k[:, :, :length].clone(), cache.v[:, :, :length].clone()) for cache in self.self_attn_cache]
+
+    def load_prefill(self, kv: list[tuple[torch.Tensor, torch.Tensor]]) -> None:
+        """Writes K/V exported by `export_prefill` instead of running the prefill forward."""
+        for cache, (k, v) in zip(self.self_attn_cache, kv):
+            cache.prefill(k, v)
+
+    def release(self) -> None:
+        """Returns the self-attention cache buffers to their pool."""
+        for cache in self.self_attn_cache:
+            cache.release()
 
 
 @dataclass
@@ -184,8 +388,10 @@ class DecoderOutput:
     prefill_steps: list[int]
 
     @classmethod
-    def new(cls, batch_size: int, config: DiaConfig, device: torch.device) -> "DecoderOutput":
-        max_audio_len = config.data.audio_length
+    def new(
+        cls, batch_size: int, config: DiaConfig, device: torch.device, max_len: int | None = None
+    ) -> "DecoderOutput":
+        max_audio_len = max_len or config.data.audio_length
         return cls(
             generated_tokens=torch.full(
                 (batch_size, max_audio_len, config.data.channels),
@@ -213,3 +419,45 @@ class DecoderOutput:
         length = dec_out.shape[1]
         self.generated_tokens[:, :length, :] = dec_out
         self.prefill_steps = prefill_steps
+
+    @classmethod
+    def new_slots(cls, template: "DecoderOutput", num_slots: int, max_len: int | None = None) -> "DecoderOutput":
+        """Allocates room for `num_slots` requests shaped like the single-request `template`.
+
+        `max_len` overrides the template's number of steps, so that later requests with longer
+        prompts fit as well.
+        """
+        _, template_len, num_channels = template.generated_tokens.shape
+        return cls(
+            generated_tokens=torch.full(
+                (num_slots, max_len or template_len, num_channels),
+                fill_value=-1,
+                dtype=template.generated_tokens.dtype,
+                device=template.generated_tokens.device,
+            ),
+            prefill_steps=[0] * num_slots,
+        )
+
+    def load_slot(self, slot: int, src: "DecoderOutput", src_slot: int = 0):
+        length = src.generated_tokens.shape[1]
+        if length > self.generated_tokens.shape[1]:
+            raise ValueError(f"Slot holds {self.generated_tokens.shape[1]} steps, request needs {length}")
+        self.generated_tokens[slot] = -1
+        self.generated_tokens[slot, :length] = src.generated_tokens[src_slot, :length]
+        self.prefill_steps[slot] = src.prefill_steps[src_slot]
+
+    def select_slots(self, slots: list[int]):
+        self.generated_tokens = self.generated_tokens[slots]
+        self.prefill_steps = [self.prefill_steps[i] for i in slots]
+
+    def get_tokens_per_row(self, steps_Bx: torch.Tensor) -> torch.Tensor:
+        """Tokens of row i at `steps_Bx[i]`, shape [B, 1, C]."""
+        rows = torch.arange(steps_Bx.shape[0], device=steps_Bx.device)
+        return self.generated_tokens[rows, steps_Bx].unsqueeze(1)
+
+    def update_rows(self, dec_out: torch.Tensor, steps_Bx: torch.Tensor):
+        """Writes `dec_out[i]` at `steps_Bx[i]`, keeping prompt tokens already in place."""
+        rows = torch.arange(steps_Bx.shape[0], device=steps_Bx.device)
+        current = self.generated_tokens[rows, steps_Bx]
+        dec_out = dec_out.to(self.generated_tokens.dtype)
+        self.generated_tokens[rows, steps_Bx] = torch.where(current == -1, dec_out, current)
@@ -0,0 +1,16 @@
+from dia.model import Dia
+
+
+model = Dia.from_pretrained("nari-labs/Dia-1.6B", compute_dtype="float16")
+
+texts = [
+    "[S1] Dia is an open weights text to dialogue model.",
+    "[S1] Dia is an open weights text to dialogue model. [S2] You get full control over scripts and voices. [S1] Wow. Amazing. (laughs) [S2] Try it now on Git hub or Hugging Face.",
+    "[S1] Short line. [S2] Another short line.",
+] * 4
+
+# At most 4 prompts decode together; a finished prompt's slot goes straight to the next one.
+output = model.generate(texts, verbose=True, max_tokens=1500, max_batch_size=4)
+
+for i, o in enumerate(output):
+    model.save_audio(f"continuous_{i}.mp3", o)
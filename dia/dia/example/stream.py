@@ -0,0 +1,15 @@
+import numpy as np
+
+from dia.model import Dia
+
+
+model = Dia.from_pretrained("nari-labs/Dia-1.6B", compute_dtype="float16")
+
+text = "[S1] Dia is an open weights text to dialogue model. [S2] You get full control over scripts and voices. [S1] Wow. Amazing. (laughs) [S2] Try it now on Git hub or Hugging Face."
+
+chunks = []
+for chunk in model.generate_stream(text, verbose=True):
+    # hand each chunk to an audio sink here; it arrives long before generation is done
+    chunks.append(chunk)
+
+model.save_audio("stream.mp3", np.concatenate(chunks))
@@ -0,0 +1,37 @@
+import pytest
+
+
+@pytest.fixture
+def tiny_dia():
+    """A randomly initialized Dia with a tiny config, on CPU and without DAC (outputs are codes)."""
+    torch = pytest.importorskip("torch")
+    from dia.config import DataConfig, DecoderConfig, DiaConfig, EncoderConfig, ModelConfig
+    from dia.model import Dia
+
+    config = DiaConfig(
+        model=ModelConfig(
+            encoder=EncoderConfig(n_layer=1, n_embd=32, n_hidden=64, n_head=2, head_dim=16),
+            decoder=DecoderConfig(
+                n_layer=2,
+                n_embd=32,
+                n_hidden=64,
+                gqa_query_heads=2,
+                kv_heads=1,
+                gqa_head_dim=16,
+                cross_query_heads=2,
+                cross_head_dim=16,
+            ),
+            src_vocab_size=256,
+        ),
+        data=DataConfig(text_length=128, audio_length=128, channels=3, delay_pattern=[0, 1, 2]),
+    )
+    torch.manual_seed(0)
+    dia = Dia(config, compute_dtype="float32", device=torch.device("cpu"), load_dac=False)
+    with torch.no_grad():
+        # DenseGeneral weights are allocated uninitialized
+        for param in dia.model.parameters():
+            if param.dim() > 1:
+                torch.nn.init.normal_(param, std=0.2)
+            else:
+                torch.nn.init.ones_(param)
+    return dia
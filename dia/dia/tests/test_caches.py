@@ -0,0 +1,154 @@
+import numpy as np
+import pytest
+
+
+torch = pytest.importorskip("torch")
+
+from dia.prompt_cache import PromptCache  # noqa: E402
+from dia.state import KVCache, KVCachePool  # noqa: E402
+
+
+GREEDY = dict(max_tokens=24, temperature=0.0, cfg_filter_top_k=45)
+
+
+def make_cache(pool, max_len=32, growth_step=8, batch_size=1):
+    return KVCache(batch_size, 2, max_len, 4, torch.float32, torch.device("cpu"), growth_step=growth_step, pool=pool)
+
+
+def test_kv_cache_grows_and_keeps_contents():
+    cache = make_cache(None)
+    assert cache.k.shape[2] == 8
+    cache.k[:, :, :8] = 1.0
+    cache.reserve(9)
+    # capacity at least doubles, rounded to the growth step
+    assert cache.k.shape[2] == 16
+    assert torch.all(cache.k[:, :, :8] == 1.0) and torch.all(cache.k[:, :, 8:] == 0.0)
+    cache.reserve(17)
+    assert cache.k.shape[2] == 32
+    with pytest.raises(ValueError):
+        cache.reserve(33)
+
+
+def test_pool_recycles_released_buffers():
+    pool = KVCachePool()
+    cache = make_cache(pool)
+    k, v = cache.k, cache.v
+    cache.k.fill_(3.0)
+    cache.release()
+    assert pool.free_bytes == 2 * k.numel() * k.element_size()
+
+    reused = make_cache(pool)
+    assert {reused.k.data_ptr(), reused.v.data_ptr()} == {k.data_ptr(), v.data_ptr()}
+    # recycled buffers come back zeroed
+    assert torch.all(reused.k == 0.0)
+    assert pool.free_bytes == 0
+
+
+def test_pool_respects_byte_limit():
+    pool = KVCachePool(max_free_bytes=1)
+    make_cache(pool).release()
+    assert pool.free_bytes == 0
+
+
+def test_generate_returns_buffers_to_pool(tiny_dia):
+    tiny_dia.kv_growth_step = 8
+    pool = tiny_dia.kv_cache_pool
+    taken, recycled = [], []
+    take = pool.take
+
+    def spy(shape, dtype, device):
+        key = (tuple(shape), dtype, torch.device(device))
+        recycled.append(bool(pool._free.get(key)))
+        buffer = take(shape, dtype, device)
+        taken.append(buffer)
+        return buffer
+
+    pool.take = spy
+    tiny_dia.generate("[S1] Hello.", **GREEDY)
+    assert taken and not any(recycled)
+    assert pool.free_bytes > 0
+
+    taken.clear(), recycled.clear()
+    tiny_dia.generate("[S1] Hello.", **GREEDY)
+    # the second request runs entirely on recycled buffers
+    assert recycled and all(recycled)
+
+
+def test_abandoned_stream_returns_buffers(tiny_dia, monkeypatch):
+    tiny_dia.dac_model = object()  # generate_stream requires DAC; decoding is stubbed below
+    monkeypatch.setattr(tiny_dia, "_decode_window", lambda codes, start, end, context: torch.zeros((end - start) * 4))
+    stream = tiny_dia.generate_stream("[S1] Hello.", chunk_frames=2, overlap_frames=1, **GREEDY)
+    next(stream)
+    assert tiny_dia.kv_cache_pool.free_bytes == 0
+    stream.close()
+    assert tiny_dia.kv_cache_pool.free_bytes > 0
+
+
+def test_prompt_cache_codes(tmp_path):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return torch.arange(6).view(3, 2)
+
+    cache = PromptCache(cache_dir=str(tmp_path))
+    first = cache.get_codes("voice", compute, torch.device("cpu"))
+    second = cache.get_codes("voice", compute, torch.device("cpu"))
+    assert torch.equal(first, second) and len(calls) == 1
+    assert cache.stats()["hits"]["codes"] == 1 and cache.stats()["misses"]["codes"] == 1
+
+    # a new process finds the codes on disk
+    fresh = PromptCache(cache_dir=str(tmp_path))
+    assert torch.equal(fresh.get_codes("voice", compute, torch.device("cpu")), first)
+    assert len(calls) == 1 and fresh.stats()["hits"]["codes"] == 1
+
+
+def test_prompt_cache_kv_lru():
+    cache = PromptCache(max_kv_entries=1)
+    kv = [(torch.zeros(1), torch.ones(1))]
+    cache.put_kv("a", kv)
+    assert cache.get_kv("a") is kv
+    cache.put_kv("b", kv)
+    assert cache.get_kv("a") is None and cache.get_kv("b") is kv
+    assert cache.stats()["hits"]["kv"] == 2 and cache.stats()["misses"]["kv"] == 1
+    # disabled by default
+    disabled = PromptCache()
+    disabled.put_kv("a", kv)
+    assert disabled.get_kv("a") is None
+
+
+def test_prefill_kv_reuse_matches_full_prefill(tiny_dia):
+    prompt = torch.randint(0, 1024, (6, tiny_dia.config.data.channels))
+    tiny_dia.prompt_cache = PromptCache(max_kv_entries=4)
+    first = tiny_dia.generate("[S1] Hello.", audio_prompt=prompt, **GREEDY)
+    second = tiny_dia.generate("[S1] Hello.", audio_prompt=prompt, **GREEDY)
+    stats = tiny_dia.prompt_cache.stats()
+    assert stats["misses"]["kv"] == 1 and stats["hits"]["kv"] == 1
+    np.testing.assert_array_equal(first, second)
+
+
+def test_uncond_encoder_cache(tiny_dia):
+    calls = []
+    tiny_dia.model.encoder.register_forward_hook(lambda module, args, out: calls.append(out.shape[0]))
+    texts = ["[S1] Same length.", "[S2] Same length.", "[S1] Different length here."]
+    text = tiny_dia._pad_text_input([tiny_dia._encode_text(t) for t in texts])
+
+    out = tiny_dia._uncond_encoder_out(text)
+    # rows 0 and 1 share a padding mask and are encoded once
+    assert calls == [2]
+    assert torch.equal(out[0], out[1])
+    again = tiny_dia._uncond_encoder_out(text)
+    assert calls == [2] and torch.equal(out, again)
+
+    tiny_dia.uncond_cache_size = 1
+    tiny_dia._uncond_encoder_out(text[2:])
+    assert len(tiny_dia._uncond_enc_cache) == 1
+
+
+def test_uncond_encoder_cache_matches_uncached(tiny_dia):
+    texts = ["[S1] Hello.", "[S2] Hello there."]
+    cached = tiny_dia.generate(texts, **GREEDY)
+    tiny_dia.uncond_cache_size = 0
+    uncached = tiny_dia.generate(texts, **GREEDY)
+    for c, u in zip(cached, uncached):
+        np.testing.assert_array_equal(c, u)
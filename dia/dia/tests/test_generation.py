@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+
+torch = pytest.importorskip("torch")
+
+TEXTS = ["[S1] Hi.", "[S1] A somewhat longer line. [S2] Yes.", "[S2] Ok!", "[S1] Three."]
+# greedy sampling keeps every path deterministic, independent of batch composition
+GREEDY = dict(max_tokens=24, temperature=0.0, cfg_filter_top_k=45)
+
+
+def assert_rows_equal(expected, actual):
+    assert len(expected) == len(actual)
+    for e, a in zip(expected, actual):
+        np.testing.assert_array_equal(e, a)
+
+
+@pytest.mark.parametrize("max_batch_size", [1, 2, 8])
+def test_continuous_matches_static(tiny_dia, max_batch_size):
+    tiny_dia.kv_growth_step = 8
+    static = tiny_dia.generate(TEXTS, **GREEDY)
+    continuous = tiny_dia.generate(TEXTS, max_batch_size=max_batch_size, **GREEDY)
+    assert_rows_equal(static, continuous)
+
+
+def test_continuous_matches_static_with_audio_prompt(tiny_dia):
+    prompt = torch.randint(0, 1024, (5, tiny_dia.config.data.channels))
+    static = [tiny_dia.generate(text, audio_prompt=prompt, **GREEDY) for text in TEXTS[:2]]
+    continuous = tiny_dia.generate(TEXTS[:2], audio_prompt=[prompt, prompt], max_batch_size=1, **GREEDY)
+    assert_rows_equal(static, continuous)
+
+
+def test_continuous_rejects_prompt_without_room(tiny_dia):
+    prompt = torch.randint(0, 1024, (GREEDY["max_tokens"], tiny_dia.config.data.channels))
+    with pytest.raises(ValueError, match="no room"):
+        tiny_dia.generate(TEXTS[:2], audio_prompt=[None, prompt], max_batch_size=2, **GREEDY)
+
+
+def test_cfg_scale_zero_skips_uncond_rows(tiny_dia, monkeypatch):
+    rows = []
+    decode_step = tiny_dia.model.decoder.decode_step
+
+    def spy(tokens, state, current_idx):
+        rows.append(tokens.shape[0])
+        return decode_step(tokens, state, current_idx)
+
+    monkeypatch.setattr(tiny_dia.model.decoder, "decode_step", spy)
+    skipped = tiny_dia.generate(TEXTS[:2], cfg_scale=0.0, **GREEDY)
+    assert rows and set(rows) == {2}
+
+    rows.clear()
+    # a vanishing guidance scale decodes the uncond rows but samples the same tokens
+    guided = tiny_dia.generate(TEXTS[:2], cfg_scale=1e-30, **GREEDY)
+    assert set(rows) == {4}
+    assert_rows_equal(guided, skipped)
+
+
+def test_cfg_scale_zero_continuous(tiny_dia):
+    static = tiny_dia.generate(TEXTS, cfg_scale=0.0, **GREEDY)
+    continuous = tiny_dia.generate(TEXTS, cfg_scale=0.0, max_batch_size=2, **GREEDY)
+    assert_rows_equal(static, continuous)